@@ -15,9 +15,10 @@ class CustomUserAdmin(UserAdmin):
 
 @admin.register(DoctorProfile)
 class DoctorProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'specialization', 'license_number', 'experience_years', 'consultation_fee', 'is_approved', 'rating']
+    list_display = ['user', 'specialization', 'license_number', 'experience_years', 'consultation_fee', 'is_approved', 'rating', 'slot_capacity', 'auto_confirm_limit', 'overbooking_allowance']
     list_filter = ['specialization', 'is_approved', 'rating']
     search_fields = ['user__first_name', 'user__last_name', 'license_number']
+    list_editable = ['slot_capacity', 'auto_confirm_limit', 'overbooking_allowance']
 
 @admin.register(PatientProfile)
 class PatientProfileAdmin(admin.ModelAdmin):
@@ -1,5 +1,6 @@
 from datetime import time
 from decimal import Decimal
+from django.contrib.auth.hashers import make_password
 from django.db import migrations
 
 
@@ -319,7 +320,8 @@ def seed_doctors(apps, schema_editor):
         user.phone = entry['phone']
         user.role = 'doctor'
         user.is_verified = True
-        user.set_password('Doctor123!')
+        # Historical models have no custom methods such as set_password
+        user.password = make_password('Doctor123!')
         user.save()
         DoctorProfile.objects.update_or_create(
             user=user,
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_doctorprofile_slot_capacity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='overbooking_allowance',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_doctorprofile_overbooking_allowance'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='next_available_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
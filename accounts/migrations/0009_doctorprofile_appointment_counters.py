@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_doctorprofile_next_available_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='cancelled_appointments',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='doctorprofile',
+            name='completed_appointments',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -47,7 +47,16 @@ class DoctorProfile(models.Model):
     available_to = models.TimeField()
     is_approved = models.BooleanField(default=False)
     rating = models.FloatField(default=5.0)
+    # Maintained by dashboard.counters; repair drift with the reconcile_counters command.
+    # Signed like PlatformCounters so a drifted counter never fails the user's write.
     total_appointments= models.IntegerField(default=0)
+    completed_appointments = models.IntegerField(default=0)
+    cancelled_appointments = models.IntegerField(default=0)
+    slot_capacity = models.PositiveIntegerField(default=3)
+    auto_confirm_limit = models.PositiveIntegerField(default=2)
+    overbooking_allowance = models.PositiveIntegerField(default=0)
+    # Earliest open slot from the appointments OpenSlot index; blank when none is indexed
+    next_available_at = models.DateTimeField(blank=True, null=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     
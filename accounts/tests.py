@@ -1,3 +1,38 @@
-from django.test import TestCase
+from unittest import mock
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from medical_connect.ratelimit import parse_rate
+from .views import LOGIN_RATE_LIMIT
 
-# Create your tests here.
+
+@override_settings(RATELIMIT_ENABLED=True, RATELIMIT_TRUSTED_PROXY_COUNT=0)
+class LoginRateLimitTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        # Hold the bucket clock still so slow password hashing cannot refill tokens mid-test
+        clock = mock.patch('medical_connect.ratelimit.time', mock.Mock(**{'time.return_value': 1_000_000.0}))
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def attempt(self, url_name, username, ip):
+        return self.client.post(reverse(url_name), {'username': username, 'password': 'wrong'}, REMOTE_ADDR=ip)
+
+    def test_one_address_is_limited_across_usernames(self):
+        limit, _ = parse_rate(LOGIN_RATE_LIMIT['ip'])
+        for index in range(limit):
+            self.assertNotEqual(self.attempt('login', f'user{index}', '10.0.0.1').status_code, 429)
+        response = self.attempt('login', 'another', '10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+        self.assertNotEqual(self.attempt('login', 'another', '10.0.0.2').status_code, 429)
+
+    def test_one_username_is_limited_across_addresses_and_login_pages(self):
+        limit, _ = parse_rate(LOGIN_RATE_LIMIT['user'])
+        pages = ['login', 'doctor_login', 'admin_login']
+        for index in range(limit):
+            self.assertNotEqual(self.attempt(pages[index % len(pages)], 'victim', f'10.0.1.{index}').status_code, 429)
+        # Case and padding do not open a fresh bucket
+        self.assertEqual(self.attempt('login', ' Victim ', '10.0.2.1').status_code, 429)
+        self.assertNotEqual(self.attempt('login', 'someone', '10.0.2.1').status_code, 429)
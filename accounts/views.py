@@ -5,11 +5,15 @@ from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 from .forms import PatientSignUpForm, DoctorSignUpForm, CustomAuthenticationForm, UserProfileForm
 from .models import CustomUser
+from medical_connect.ratelimit import rate_limit
+
+LOGIN_RATE_LIMIT = {'ip': '20/m', 'user': '5/m', 'user_field': 'username'}
 
 def home(request):
     """Home page view"""
     return render(request, 'home.html')
 
+@rate_limit('login', **LOGIN_RATE_LIMIT)
 def login_view(request):
     """Login view"""
     if request.user.is_authenticated:
@@ -30,6 +34,7 @@ def login_view(request):
     
     return render(request, 'accounts/login.html', {'form': form})
 
+@rate_limit('login', **LOGIN_RATE_LIMIT)
 def admin_login(request):
     """Admin login view"""
     if request.user.is_authenticated:
@@ -52,6 +57,7 @@ def admin_login(request):
     return render(request, 'accounts/admin_login.html', {'form': form})
 
 
+@rate_limit('login', **LOGIN_RATE_LIMIT)
 def doctor_login(request):
     """Doctor login page"""
     if request.user.is_authenticated:
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Appointment, AvailabilitySlot, Prescription, PrescriptionItem, PrescriptionTemplate, PrescriptionTemplateItem, DoctorLeave, AppointmentReminder
+from .models import Appointment, AvailabilitySlot, Prescription, PrescriptionItem, PrescriptionTemplate, PrescriptionTemplateItem, DoctorLeave, AppointmentReminder, WaitlistEntry, AppointmentSeries
 
 @admin.register(Appointment)
 class AppointmentAdmin(admin.ModelAdmin):
@@ -10,7 +10,8 @@ class AppointmentAdmin(admin.ModelAdmin):
 
 @admin.register(AvailabilitySlot)
 class AvailabilitySlotAdmin(admin.ModelAdmin):
-    list_display = ['doctor', 'get_day_of_week_display', 'start_time', 'end_time', 'is_active']
+    list_display = ['doctor', 'get_day_of_week_display', 'start_time', 'end_time', 'is_active', 'capacity', 'auto_confirm_limit', 'overbooking_allowance']
+    list_editable = ['capacity', 'auto_confirm_limit', 'overbooking_allowance']
     list_filter = ['is_active', 'day_of_week']
     search_fields = ['doctor__first_name']
 
@@ -51,3 +52,18 @@ class AppointmentReminderAdmin(admin.ModelAdmin):
     list_display = ['appointment', 'reminder_type', 'sent_at', 'is_sent']
     list_filter = ['reminder_type', 'is_sent', 'sent_at']
     search_fields = ['appointment__patient__first_name', 'appointment__doctor__first_name']
+
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'patient', 'date', 'window_start', 'priority', 'status', 'created_at']
+    list_filter = ['status', 'date']
+    search_fields = ['doctor__first_name', 'patient__first_name']
+    list_editable = ['priority']
+
+
+@admin.register(AppointmentSeries)
+class AppointmentSeriesAdmin(admin.ModelAdmin):
+    list_display = ['doctor', 'patient', 'frequency', 'start_date', 'appointment_time', 'occurrences', 'created_at']
+    list_filter = ['frequency']
+    search_fields = ['doctor__first_name', 'patient__first_name']
@@ -0,0 +1,72 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils import timezone
+from accounts.models import DoctorProfile
+from .models import Appointment, AvailabilitySlot
+from .policy import slot_policy
+from .slots import ACTIVE_STATUSES, slot_interval_count
+from .blackout import get_blackout_calendar
+
+CALENDAR_DAYS = 30
+CALENDAR_CACHE_TIMEOUT = 60 * 60
+
+
+def _calendar_cache_key(doctor_id, start_date):
+    return f'availability_calendar:{doctor_id}:{start_date.isoformat()}'
+
+
+def build_availability_calendar(doctor_id, start_date, days=CALENDAR_DAYS):
+    """Per-day capacity for a doctor, from the weekly slot pattern and one grouped count.
+
+    Each interval counts the places its booking policy allows, overbooking
+    included, the same limit the slot counter enforces.
+    """
+    end_date = start_date + timedelta(days=days - 1)
+    profile = DoctorProfile.objects.filter(user_id=doctor_id).first()
+    weekly_capacity = defaultdict(int)
+    for slot in AvailabilitySlot.objects.filter(doctor_id=doctor_id, is_active=True):
+        weekly_capacity[slot.day_of_week] += slot_interval_count(slot) * slot_policy(profile, slot).max_bookings
+    if not weekly_capacity:
+        return []
+    booked_by_date = dict(
+        Appointment.objects.filter(
+            doctor_id=doctor_id,
+            appointment_date__gte=start_date,
+            appointment_date__lte=end_date,
+            status__in=ACTIVE_STATUSES
+        ).values('appointment_date').annotate(total=Count('id')).values_list('appointment_date', 'total')
+    )
+    blackout = get_blackout_calendar(doctor_id)
+
+    calendar_days = []
+    for offset in range(days):
+        date = start_date + timedelta(days=offset)
+        capacity = weekly_capacity.get(date.weekday(), 0)
+        if not capacity or blackout.is_blocked(date):
+            continue
+        booked = booked_by_date.get(date, 0)
+        remaining = max(capacity - booked, 0)
+        calendar_days.append({
+            'date': date,
+            'appointments': booked,
+            'capacity': capacity,
+            'remaining': remaining,
+            'slots_available': remaining > 0,
+        })
+    return calendar_days
+
+
+def get_availability_calendar(doctor_id):
+    today = timezone.localdate()
+    key = _calendar_cache_key(doctor_id, today)
+    calendar_days = cache.get(key)
+    if calendar_days is None:
+        calendar_days = build_availability_calendar(doctor_id, today)
+        cache.set(key, calendar_days, CALENDAR_CACHE_TIMEOUT)
+    return calendar_days
+
+
+def invalidate_availability_calendar(doctor_id):
+    cache.delete(_calendar_cache_key(doctor_id, timezone.localdate()))
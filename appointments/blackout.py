@@ -0,0 +1,83 @@
+from bisect import bisect_right
+from datetime import timedelta
+from django.core.cache import cache
+from django.utils import timezone
+from .models import DoctorLeave
+
+BLACKOUT_CACHE_TIMEOUT = 60 * 60 * 6
+
+
+class BlackoutCalendar:
+    """Sorted, merged leave ranges of one doctor answered with bisect"""
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self, ranges=()):
+        self.starts = []
+        self.ends = []
+        for start_date, end_date in sorted(ranges):
+            if self.ends and start_date <= self.ends[-1] + timedelta(days=1):
+                self.ends[-1] = max(self.ends[-1], end_date)
+            else:
+                self.starts.append(start_date)
+                self.ends.append(end_date)
+
+    def __bool__(self):
+        return bool(self.starts)
+
+    def is_blocked(self, date):
+        index = bisect_right(self.starts, date) - 1
+        return index >= 0 and date <= self.ends[index]
+
+    def ranges(self):
+        return list(zip(self.starts, self.ends))
+
+
+def _blackout_cache_key(doctor_id):
+    return f'doctor_blackout:{doctor_id}'
+
+
+def load_blackout_calendars(doctor_ids):
+    """BlackoutCalendar per doctor read straight from DoctorLeave in a single query.
+
+    Booking validation and index rebuilds use this: the cache is per process
+    with the default backend, so another worker's invalidation never reaches it.
+    """
+    ranges_by_doctor = {doctor_id: [] for doctor_id in doctor_ids}
+    if ranges_by_doctor:
+        leaves = DoctorLeave.objects.filter(
+            doctor_id__in=ranges_by_doctor,
+            status='approved',
+            end_date__gte=timezone.localdate()
+        ).values_list('doctor_id', 'start_date', 'end_date')
+        for doctor_id, start_date, end_date in leaves:
+            ranges_by_doctor[doctor_id].append((start_date, end_date))
+    return {doctor_id: BlackoutCalendar(ranges) for doctor_id, ranges in ranges_by_doctor.items()}
+
+
+def load_blackout_calendar(doctor_id):
+    return load_blackout_calendars([doctor_id])[doctor_id]
+
+
+def get_blackout_calendars(doctor_ids):
+    """Cached BlackoutCalendar per doctor for read-only views, loading every miss in a single query"""
+    doctor_ids = list(doctor_ids)
+    keys = {_blackout_cache_key(doctor_id): doctor_id for doctor_id in doctor_ids}
+    cached = cache.get_many(keys.keys())
+    calendars = {keys[key]: BlackoutCalendar(ranges) for key, ranges in cached.items()}
+    missing = [doctor_id for doctor_id in doctor_ids if doctor_id not in calendars]
+    if missing:
+        loaded = load_blackout_calendars(missing)
+        calendars.update(loaded)
+        cache.set_many(
+            {_blackout_cache_key(doctor_id): calendar.ranges() for doctor_id, calendar in loaded.items()},
+            BLACKOUT_CACHE_TIMEOUT
+        )
+    return calendars
+
+
+def get_blackout_calendar(doctor_id):
+    return get_blackout_calendars([doctor_id])[doctor_id]
+
+
+def invalidate_blackout_calendar(doctor_id):
+    cache.delete(_blackout_cache_key(doctor_id))
@@ -0,0 +1,142 @@
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from dashboard.counters import count_appointment_changes
+from .models import Appointment, DayOccupancy, SlotCapacity
+
+ACTIVE_STATUSES = ['pending', 'confirmed']
+
+
+class BookingConflict(ValueError):
+    """Raised when bookings cannot be made; ``errors`` lists every problem found and nothing is saved"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__(' '.join(self.errors))
+
+
+def _active_bookings(doctor_id, date, start_time):
+    return Appointment.objects.filter(
+        doctor_id=doctor_id,
+        appointment_date=date,
+        appointment_time=start_time,
+        status__in=ACTIVE_STATUSES
+    )
+
+
+def reserve_slot(doctor_id, date, start_time, capacity):
+    """Take one place in a slot with a conditional UPDATE.
+
+    Returns the booking's position in the slot (1 for the first booking),
+    or None when the slot is already at capacity. Must run inside a transaction so the row lock is held until the appointment
+    is saved.
+    """
+    counter, created = SlotCapacity.objects.get_or_create(
+        doctor_id=doctor_id,
+        date=date,
+        start_time=start_time,
+        defaults={
+            'capacity': capacity,
+            'booked': _active_bookings(doctor_id, date, start_time).count(),
+        }
+    )
+    if not created and counter.capacity != capacity:
+        SlotCapacity.objects.filter(pk=counter.pk).update(capacity=capacity)
+    updated = SlotCapacity.objects.filter(pk=counter.pk, booked__lt=F('capacity')).update(booked=F('booked') + 1)
+    if not updated:
+        return None
+    return SlotCapacity.objects.filter(pk=counter.pk).values_list('booked', flat=True).get()
+
+
+def book_appointment_slot(appointment, policy):
+    """Atomically reserve the appointment's slot under a BookingPolicy and save it.
+
+    The status follows the policy for the booking's position in the slot.
+    Returns the position, or None, saving nothing, when the slot is full
+    including any overbooking allowance.
+    """
+    with transaction.atomic():
+        position = reserve_slot(
+            appointment.doctor_id,
+            appointment.appointment_date,
+            appointment.appointment_time,
+            policy.max_bookings
+        )
+        if position is None:
+            return None
+        appointment.status = policy.status_for(position)
+        appointment._slot_counted = True
+        appointment.save()
+    return position
+
+
+def sync_slot_counter(doctor_id, date, start_time):
+    """Recount a slot's active bookings, e.g. after a cancellation"""
+    active = Appointment.objects.filter(
+        doctor_id=OuterRef('doctor_id'),
+        appointment_date=OuterRef('date'),
+        appointment_time=OuterRef('start_time'),
+        status__in=ACTIVE_STATUSES
+    ).order_by().values('doctor_id').annotate(total=Count('id')).values('total')
+    SlotCapacity.objects.filter(doctor_id=doctor_id, date=date, start_time=start_time).update(
+        booked=Coalesce(Subquery(active), Value(0))
+    )
+
+
+def _slot_filter(keys, date_field, time_field):
+    return reduce(or_, (Q(doctor_id=doctor_id, **{date_field: date, time_field: start_time}) for doctor_id, date, start_time in keys))
+
+
+def book_in_bulk(appointments, policies, occupancy, taken_message):
+    """Take the slot counters of unsaved appointments and insert them with bulk writes.
+
+    ``policies`` holds each appointment's BookingPolicy and ``occupancy``
+    maps (doctor_id, date) to the day's Occupancy including the new
+    bookings. The counters are upserted and taken with one conditional
+    UPDATE, each status follows the booking's position in its slot, and
+    the appointment counters and stored day occupancy are patched because
+    bulk_create skips the Appointment signals. Must run inside a
+    transaction; raises BookingConflict with ``taken_message`` when another
+    booking won one of the slots.
+    """
+    keys = [(appointment.doctor_id, appointment.appointment_date, appointment.appointment_time) for appointment in appointments]
+    booked = {
+        (row['doctor_id'], row['appointment_date'], row['appointment_time']): row['total']
+        for row in Appointment.objects.filter(
+            _slot_filter(keys, 'appointment_date', 'appointment_time'),
+            status__in=ACTIVE_STATUSES
+        ).values('doctor_id', 'appointment_date', 'appointment_time').annotate(total=Count('id')).order_by()
+    }
+    SlotCapacity.objects.bulk_create(
+        [
+            SlotCapacity(
+                doctor_id=doctor_id, date=date, start_time=start_time,
+                capacity=policy.max_bookings, booked=booked.get((doctor_id, date, start_time), 0)
+            )
+            for policy, (doctor_id, date, start_time) in zip(policies, keys)
+        ],
+        update_conflicts=True,
+        unique_fields=['doctor', 'date', 'start_time'],
+        update_fields=['capacity']
+    )
+    taken = SlotCapacity.objects.filter(_slot_filter(keys, 'date', 'start_time'), booked__lt=F('capacity')).update(
+        booked=F('booked') + 1
+    )
+    if taken != len(keys):
+        # Raising rolls the counters back with the caller's transaction
+        raise BookingConflict([taken_message])
+
+    for appointment, policy, key in zip(appointments, policies, keys):
+        appointment.status = policy.status_for(booked.get(key, 0) + 1)
+    Appointment.objects.bulk_create(appointments)
+    count_appointment_changes([(appointment.doctor_id, appointment.status, 1) for appointment in appointments])
+    days = {(doctor_id, date) for doctor_id, date, _ in keys}
+    DayOccupancy.objects.bulk_create(
+        [DayOccupancy(doctor_id=doctor_id, date=date, layers=occupancy[(doctor_id, date)].to_bytes()) for doctor_id, date in days],
+        update_conflicts=True,
+        unique_fields=['doctor', 'date'],
+        update_fields=['layers', 'updated_at']
+    )
+    return appointments
@@ -2,9 +2,24 @@ from django import forms
 from django.forms import inlineformset_factory
 from django.utils import timezone
 from django.db.models import Q
-from .models import Appointment, AvailabilitySlot, Prescription, DoctorLeave, PrescriptionItem, PrescriptionTemplate, PrescriptionTemplateItem
+from .models import Appointment, AppointmentSeries, AvailabilitySlot, Prescription, DoctorLeave, PrescriptionItem, PrescriptionTemplate, PrescriptionTemplateItem
+from .series import MAX_OCCURRENCES
 
 class AppointmentBookingForm(forms.ModelForm):
+    REPEAT_NONE = 'none'
+
+    repeat = forms.ChoiceField(
+        choices=[(REPEAT_NONE, 'Does not repeat')] + AppointmentSeries.FREQUENCY_CHOICES,
+        required=False,
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    occurrences = forms.IntegerField(
+        required=False,
+        min_value=2,
+        max_value=MAX_OCCURRENCES,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Number of visits'})
+    )
+
     class Meta:
         model = Appointment
         fields = ['appointment_date', 'appointment_time', 'reason']
@@ -41,6 +56,10 @@ class AppointmentBookingForm(forms.ModelForm):
             now = timezone.localtime()
             if appointment_date == now.date() and appointment_time <= now.time():
                 self.add_error('appointment_time', 'Select a time in the future.')
+        repeat = cleaned_data.get('repeat') or self.REPEAT_NONE
+        cleaned_data['repeat'] = repeat
+        if repeat != self.REPEAT_NONE and not cleaned_data.get('occurrences'):
+            self.add_error('occurrences', 'Enter how many visits to book.')
         return cleaned_data
 
 
@@ -0,0 +1,62 @@
+from collections import Counter
+from datetime import timedelta
+from django.conf import settings
+from django.utils import timezone
+from .models import SlotHold
+
+
+def get_hold_seconds():
+    return getattr(settings, 'SLOT_HOLD_SECONDS', 300)
+
+
+def sweep_expired_holds():
+    return SlotHold.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def holds_blocking(user):
+    """Active holds that keep a slot away from user (every hold for anonymous visitors)"""
+    holds = SlotHold.objects.filter(expires_at__gt=timezone.now())
+    if user is not None and user.is_authenticated:
+        holds = holds.exclude(user=user)
+    return holds
+
+
+def held_places(user, **filters):
+    """Counter of places held away from user, keyed by (doctor_id, date, start_time)"""
+    return Counter(holds_blocking(user).filter(**filters).values_list('doctor_id', 'date', 'start_time'))
+
+
+def holds_fill_slot(doctor_id, date, start_time, user, free_places):
+    """True when other patients' holds take every place still free in a slot.
+
+    Each hold takes one place, so a slot with room left over is still
+    bookable; a full slot is left to the capacity check.
+    """
+    if free_places <= 0:
+        return False
+    return holds_blocking(user).filter(doctor_id=doctor_id, date=date, start_time=start_time).count() >= free_places
+
+
+def place_holds(user, slots):
+    """Hold the given (doctor_id, date, start_time) slots for user, replacing earlier holds.
+
+    Each hold takes one place of its slot; the caller only offers slots
+    that still had a place free of other holds when they were searched.
+    Only patients can book, so nobody else may take slots out of search.
+    """
+    if not user.is_authenticated or user.role != 'patient':
+        return
+    sweep_expired_holds()
+    SlotHold.objects.filter(user=user).delete()
+    expires_at = timezone.now() + timedelta(seconds=get_hold_seconds())
+    SlotHold.objects.bulk_create(
+        [
+            SlotHold(doctor_id=doctor_id, user=user, date=date, start_time=start_time, expires_at=expires_at)
+            for doctor_id, date, start_time in slots
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def release_holds(user):
+    SlotHold.objects.filter(user=user).delete()
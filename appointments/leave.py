@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.utils import timezone
+from dashboard.counters import count_appointment_changes
+from messaging.models import Notification
+from .models import Appointment, DayOccupancy, SlotCapacity, WaitlistEntry
+
+ACTIVE_STATUSES = ['pending', 'confirmed']
+
+
+def affected_appointments(leave):
+    """Active appointments of the doctor inside the leave range, in one range query"""
+    return Appointment.objects.filter(
+        doctor_id=leave.doctor_id,
+        appointment_date__gte=leave.start_date,
+        appointment_date__lte=leave.end_date,
+        status__in=ACTIVE_STATUSES
+    ).select_related('patient').order_by('appointment_date', 'appointment_time')
+
+
+def approve_leave(leave):
+    """Approve a leave request and cancel every appointment it displaces.
+
+    The affected appointments are cancelled with one UPDATE and their
+    patients notified with one bulk insert. Because the bulk UPDATE skips
+    the Appointment signals, the day occupancy, slot counters and
+    appointment counters of the range are patched directly; saving the leave then refreshes the
+    open-slot index and caches through its own signal. Returns the
+    cancelled appointments.
+    """
+    with transaction.atomic():
+        appointments = list(affected_appointments(leave).select_for_update(of=('self',)))
+        range_filter = {
+            'doctor_id': leave.doctor_id,
+            'date__gte': leave.start_date,
+            'date__lte': leave.end_date,
+        }
+        if appointments:
+            Appointment.objects.filter(id__in=[appointment.id for appointment in appointments]).update(
+                status='cancelled',
+                displaced_by=leave,
+                updated_at=timezone.now()
+            )
+            count_appointment_changes(
+                [(appointment.doctor_id, appointment.status, -1) for appointment in appointments]
+                + [(appointment.doctor_id, 'cancelled', 1) for appointment in appointments]
+            )
+            # Every active booking in the range is gone, so the derived rows are empty
+            DayOccupancy.objects.filter(**range_filter).delete()
+            SlotCapacity.objects.filter(**range_filter).update(booked=0)
+        WaitlistEntry.objects.filter(status='waiting', **range_filter).update(
+            status='cancelled',
+            updated_at=timezone.now()
+        )
+        leave.status = 'approved'
+        leave.save()
+        doctor_name = leave.doctor.get_full_name()
+        notifications = [
+            Notification(
+                user_id=appointment.patient_id,
+                notification_type='appointment_cancelled',
+                title='Appointment Cancelled',
+                description=(
+                    f'Your appointment with Dr. {doctor_name} on {appointment.appointment_date} at '
+                    f'{appointment.appointment_time.strftime("%H:%M")} was cancelled because the doctor is on leave.'
+                ),
+                related_appointment=appointment
+            )
+            for appointment in appointments
+        ]
+        notifications.append(Notification(
+            user_id=leave.doctor_id,
+            notification_type='doctor_approved',
+            title='Leave Request Approved',
+            description=(
+                f'Your leave request from {leave.start_date} to {leave.end_date} has been approved. '
+                f'{len(appointments)} appointment(s) in this period were cancelled.'
+            ),
+        ))
+        Notification.objects.bulk_create(notifications)
+    for appointment in appointments:
+        appointment.status = 'cancelled'
+    return appointments
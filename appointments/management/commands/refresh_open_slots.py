@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from appointments.slots import get_horizon_days, roll_forward
+
+
+class Command(BaseCommand):
+    help = 'Roll the open-slot index forward over the booking horizon (run nightly)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Number of days ahead to index (defaults to OPEN_SLOT_HORIZON_DAYS)'
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] or get_horizon_days()
+        self.stdout.write(f'Refreshing open slots for the next {days} days')
+        doctor_count = roll_forward(days)
+        self.stdout.write(f'Open slots refreshed for {doctor_count} doctors.')
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('appointments', '0006_doctorprofile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpenSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('capacity', models.IntegerField(default=1)),
+                ('remaining', models.IntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='open_slots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['date', 'start_time'],
+                'indexes': [models.Index(condition=models.Q(('remaining__gt', 0)), fields=['date', 'start_time'], name='openslot_free_idx')],
+                'unique_together': {('doctor', 'date', 'start_time')},
+            },
+        ),
+    ]
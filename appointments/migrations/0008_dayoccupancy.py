@@ -0,0 +1,80 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Frozen copies of the bitmap rules in appointments.occupancy at the time of
+# this migration, so later changes to that module cannot alter the backfill
+OCCUPANCY_STATUSES = ('pending', 'confirmed')
+QUANTUM_MINUTES = 5
+LAYER_BYTES = 24 * 60 // QUANTUM_MINUTES // 8
+
+
+def interval_mask(start_time, end_time):
+    first = (start_time.hour * 60 + start_time.minute) // QUANTUM_MINUTES
+    end_minutes = end_time.hour * 60 + end_time.minute
+    if end_time <= start_time:
+        end_minutes = 24 * 60
+    last = -(-end_minutes // QUANTUM_MINUTES)
+    return ((1 << (last - first)) - 1) << first
+
+
+def occupancy_bytes(intervals):
+    """Stacked layers: bit q of layers[n] is set when quantum q holds more than n bookings"""
+    layers = []
+    for start_time, end_time in intervals:
+        mask = interval_mask(start_time, end_time)
+        for index, layer in enumerate(layers):
+            carry = layer & mask
+            layers[index] = layer | mask
+            mask = carry
+            if not mask:
+                break
+        if mask:
+            layers.append(mask)
+    return b''.join(layer.to_bytes(LAYER_BYTES, 'little') for layer in layers if layer)
+
+
+def backfill_occupancy(apps, schema_editor):
+    from django.utils import timezone
+
+    Appointment = apps.get_model('appointments', 'Appointment')
+    DayOccupancy = apps.get_model('appointments', 'DayOccupancy')
+    intervals = {}
+    rows = Appointment.objects.filter(
+        appointment_date__gte=timezone.localdate(),
+        status__in=OCCUPANCY_STATUSES
+    ).values_list('doctor_id', 'appointment_date', 'appointment_time', 'end_time')
+    for doctor_id, date, start_time, end_time in rows:
+        intervals.setdefault((doctor_id, date), []).append((start_time, end_time))
+    DayOccupancy.objects.bulk_create([
+        DayOccupancy(doctor_id=doctor_id, date=date, layers=occupancy_bytes(day_intervals))
+        for (doctor_id, date), day_intervals in intervals.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('appointments', '0007_openslot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DayOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('layers', models.BinaryField(default=bytes)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='day_occupancy', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('doctor', 'date')},
+            },
+        ),
+        migrations.RunPython(backfill_occupancy, migrations.RunPython.noop),
+    ]
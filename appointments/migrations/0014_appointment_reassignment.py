@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0013_availabilityslot_policy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='appointment',
+            name='displaced_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='displaced_appointments', to='appointments.doctorleave'),
+        ),
+        migrations.AddField(
+            model_name='appointment',
+            name='reassigned_from',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reassignments', to='appointments.appointment'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:56
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('appointments', '0014_appointment_reassignment'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='slothold',
+            unique_together={('user', 'doctor', 'date', 'start_time')},
+        ),
+    ]
@@ -23,6 +23,10 @@ class AvailabilitySlot(models.Model):
     end_time = models.TimeField()
     slot_duration = models.IntegerField(default=30)
     is_active = models.BooleanField(default=True)
+    # Booking policy overrides; blank falls back to the doctor's profile
+    capacity = models.PositiveIntegerField(blank=True, null=True)
+    auto_confirm_limit = models.PositiveIntegerField(blank=True, null=True)
+    overbooking_allowance = models.PositiveIntegerField(blank=True, null=True)
     
     class Meta:
         unique_together = ['doctor', 'day_of_week', 'start_time']
@@ -31,6 +35,29 @@ class AvailabilitySlot(models.Model):
         return f"{self.get_day_of_week_display()} {self.start_time}-{self.end_time}"
 
 
+class AppointmentSeries(models.Model):
+    FREQUENCY_CHOICES = [
+        ('weekly', 'Weekly'),
+        ('biweekly', 'Every 2 weeks'),
+        ('monthly', 'Monthly'),
+    ]
+    
+    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='doctor_series')
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='patient_series')
+    frequency = models.CharField(max_length=20, choices=FREQUENCY_CHOICES)
+    start_date = models.DateField()
+    appointment_time = models.TimeField()
+    occurrences = models.PositiveIntegerField()
+    reason = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.get_frequency_display()} series: {self.patient.get_full_name()} with Dr. {self.doctor.get_full_name()}"
+
+
 class Appointment(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -47,12 +74,17 @@ class Appointment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     reason = models.TextField(blank=True)
     notes = models.TextField(blank=True)
+    series = models.ForeignKey(AppointmentSeries, on_delete=models.SET_NULL, related_name='appointments', blank=True, null=True)
+    displaced_by = models.ForeignKey('DoctorLeave', on_delete=models.SET_NULL, related_name='displaced_appointments', blank=True, null=True)
+    reassigned_from = models.ForeignKey('self', on_delete=models.SET_NULL, related_name='reassignments', blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        unique_together = ['doctor', 'appointment_date', 'appointment_time']
         ordering = ['-appointment_date', '-appointment_time']
+        indexes = [
+            models.Index(fields=['doctor', 'appointment_date', 'appointment_time'], name='appointment_doctor_slot_idx'),
+        ]
     
     def __str__(self):
         return f"Appointment: {self.patient.get_full_name()} with Dr. {self.doctor.get_full_name()}"
@@ -169,3 +201,102 @@ class PrescriptionTemplateItem(models.Model):
 
     def __str__(self):
         return f"{self.medicine_name} in {self.template.name}"
+
+
+class OpenSlot(models.Model):
+    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='open_slots')
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    capacity = models.IntegerField(default=1)
+    remaining = models.IntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['doctor', 'date', 'start_time']
+        ordering = ['date', 'start_time']
+        indexes = [
+            models.Index(
+                fields=['date', 'start_time'],
+                condition=models.Q(remaining__gt=0),
+                name='openslot_free_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Open slot {self.date} {self.start_time} for {self.doctor.get_full_name()}"
+
+
+class DayOccupancy(models.Model):
+    """Booked time of one doctor on one day as stacked 5-minute bitmaps"""
+    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='day_occupancy')
+    date = models.DateField()
+    layers = models.BinaryField(default=bytes)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['doctor', 'date']
+
+    def __str__(self):
+        return f"Occupancy {self.date} for {self.doctor.get_full_name()}"
+
+
+class SlotCapacity(models.Model):
+    """Booking counter for one doctor start time, bumped with a conditional UPDATE"""
+    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='slot_capacities')
+    date = models.DateField()
+    start_time = models.TimeField()
+    capacity = models.PositiveIntegerField()
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ['doctor', 'date', 'start_time']
+
+    def __str__(self):
+        return f"{self.booked}/{self.capacity} booked {self.date} {self.start_time}"
+
+
+class SlotHold(models.Model):
+    """Short reservation of a suggested slot while a patient completes booking"""
+    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='held_slots')
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='slot_holds')
+    date = models.DateField()
+    start_time = models.TimeField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # One place per hold; several patients may hold the same slot
+        unique_together = ['user', 'doctor', 'date', 'start_time']
+
+    def __str__(self):
+        return f"Hold {self.date} {self.start_time} for {self.user.get_full_name()}"
+
+
+class WaitlistEntry(models.Model):
+    STATUS_CHOICES = [
+        ('waiting', 'Waiting'),
+        ('promoted', 'Promoted'),
+        ('cancelled', 'Cancelled'),
+    ]
+
+    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='waitlist_entries')
+    patient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='waitlist_requests')
+    date = models.DateField()
+    window_start = models.TimeField()
+    window_end = models.TimeField()
+    reason = models.TextField(blank=True)
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='waiting')
+    appointment = models.OneToOneField(Appointment, on_delete=models.SET_NULL, related_name='waitlist_entry', blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-priority', 'created_at']
+        indexes = [
+            models.Index(fields=['doctor', 'date', 'status'], name='waitlist_doctor_date_idx'),
+        ]
+
+    def __str__(self):
+        return f"Waitlist {self.date} {self.window_start} for {self.patient.get_full_name()}"
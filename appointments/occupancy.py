@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+from .models import Appointment, AvailabilitySlot, DayOccupancy
+from .blackout import load_blackout_calendar
+
+QUANTUM_MINUTES = 5
+QUANTA_PER_DAY = 24 * 60 // QUANTUM_MINUTES
+LAYER_BYTES = QUANTA_PER_DAY // 8
+DEFAULT_DURATION_MINUTES = 30
+OCCUPANCY_STATUSES = ['pending', 'confirmed']
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def interval_mask(start_time, end_time):
+    """Bitmask of the 5-minute quanta covered by [start_time, end_time)"""
+    first = _minutes(start_time) // QUANTUM_MINUTES
+    end_minutes = _minutes(end_time)
+    if end_time <= start_time:
+        # An interval ending at or after midnight occupies the rest of the day
+        end_minutes = 24 * 60
+    last = -(-end_minutes // QUANTUM_MINUTES)
+    return ((1 << (last - first)) - 1) << first
+
+
+def add_minutes(start_time, minutes):
+    return (datetime.combine(datetime.today(), start_time) + timedelta(minutes=minutes)).time()
+
+
+class Occupancy:
+    """Stacked bitmaps: bit q of layers[n] is set when quantum q holds more than n bookings"""
+    __slots__ = ('layers',)
+
+    def __init__(self, layers=None):
+        self.layers = list(layers or [])
+
+    @classmethod
+    def from_bytes(cls, data):
+        data = bytes(data or b'')
+        return cls(
+            int.from_bytes(data[index:index + LAYER_BYTES], 'little')
+            for index in range(0, len(data), LAYER_BYTES)
+        )
+
+    def to_bytes(self):
+        return b''.join(layer.to_bytes(LAYER_BYTES, 'little') for layer in self.layers if layer)
+
+    def add(self, mask):
+        for index, layer in enumerate(self.layers):
+            carry = layer & mask
+            self.layers[index] = layer | mask
+            mask = carry
+            if not mask:
+                return
+        self.layers.append(mask)
+
+    def remove(self, mask):
+        # Layers are nested, so clearing from the top removes one booking per quantum
+        for index in range(len(self.layers) - 1, -1, -1):
+            cleared = self.layers[index] & mask
+            self.layers[index] ^= cleared
+            mask ^= cleared
+        while self.layers and not self.layers[-1]:
+            self.layers.pop()
+
+    def depth(self, mask):
+        """Highest number of overlapping bookings anywhere inside mask"""
+        for index in range(len(self.layers) - 1, -1, -1):
+            if self.layers[index] & mask:
+                return index + 1
+        return 0
+
+    def conflicts(self, mask, capacity=1):
+        """True when adding mask would exceed capacity in any quantum"""
+        return capacity <= len(self.layers) and bool(self.layers[capacity - 1] & mask)
+
+
+def build_occupancy(intervals):
+    occupancy = Occupancy()
+    for start_time, end_time in intervals:
+        occupancy.add(interval_mask(start_time, end_time))
+    return occupancy
+
+
+def rebuild_day_occupancy(doctor_id, date):
+    """Recompute the stored occupancy of a doctor's day from its appointments"""
+    intervals = Appointment.objects.filter(
+        doctor_id=doctor_id,
+        appointment_date=date,
+        status__in=OCCUPANCY_STATUSES
+    ).values_list('appointment_time', 'end_time')
+    layers = build_occupancy(intervals).to_bytes()
+    if layers:
+        DayOccupancy.objects.update_or_create(doctor_id=doctor_id, date=date, defaults={'layers': layers})
+    else:
+        DayOccupancy.objects.filter(doctor_id=doctor_id, date=date).delete()
+
+
+def load_day_occupancy(doctor_id, date):
+    data = DayOccupancy.objects.filter(doctor_id=doctor_id, date=date).values_list('layers', flat=True).first()
+    return Occupancy.from_bytes(data)
+
+
+class BookingWindow:
+    """Outcome of fitting a requested start time into a doctor's day"""
+    __slots__ = ('end_time', 'mask', 'fits_schedule', 'on_leave', 'occupancy')
+
+    def __init__(self, end_time, mask, fits_schedule, on_leave, occupancy):
+        self.end_time = end_time
+        self.mask = mask
+        self.fits_schedule = fits_schedule
+        self.on_leave = on_leave
+        self.occupancy = occupancy
+
+    def conflicts(self, capacity=1):
+        return self.occupancy.conflicts(self.mask, capacity)
+
+    def overlapping(self):
+        return self.occupancy.depth(self.mask)
+
+
+def load_schedule(doctor_id):
+    """Active availability slots of a doctor, fetched once for any number of dates"""
+    return list(AvailabilitySlot.objects.filter(doctor_id=doctor_id, is_active=True).only(
+        'day_of_week', 'start_time', 'end_time', 'slot_duration',
+        'capacity', 'auto_confirm_limit', 'overbooking_allowance'
+    ))
+
+
+def schedule_window(schedule, date, start_time):
+    """(end_time, mask, fits_schedule) for a start time against loaded slots.
+
+    Doctors without any active availability slots keep accepting free-form
+    times with the default length, as before.
+    """
+    duration = DEFAULT_DURATION_MINUTES
+    schedule_mask = 0
+    for slot in schedule:
+        if slot.day_of_week != date.weekday():
+            continue
+        schedule_mask |= interval_mask(slot.start_time, slot.end_time)
+        if slot.start_time <= start_time < slot.end_time and slot.slot_duration and slot.slot_duration > 0:
+            duration = slot.slot_duration
+    end_time = add_minutes(start_time, duration)
+    mask = interval_mask(start_time, end_time)
+    fits_schedule = not schedule or not (mask & ~schedule_mask)
+    return end_time, mask, fits_schedule
+
+
+def check_booking_window(doctor_id, date, start_time):
+    """Resolve the appointment length from the covering availability slot and test it bitwise"""
+    end_time, mask, fits_schedule = schedule_window(load_schedule(doctor_id), date, start_time)
+    on_leave = load_blackout_calendar(doctor_id).is_blocked(date)
+    return BookingWindow(end_time, mask, fits_schedule, on_leave, load_day_occupancy(doctor_id, date))
@@ -0,0 +1,89 @@
+from django.db.models import OuterRef, Subquery
+from accounts.models import DoctorProfile
+from .models import AvailabilitySlot
+
+DEFAULT_SLOT_CAPACITY = 3
+DEFAULT_AUTO_CONFIRM_LIMIT = 2
+DEFAULT_OVERBOOKING_ALLOWANCE = 0
+POLICY_FIELDS = ('capacity', 'auto_confirm_limit', 'overbooking_allowance')
+PROFILE_POLICY_FIELDS = ('slot_capacity', 'auto_confirm_limit', 'overbooking_allowance')
+
+
+class BookingPolicy:
+    """How many patients a slot takes and which of them are confirmed straight away.
+
+    Positions up to auto_confirm_limit are confirmed, the rest up to
+    capacity wait for approval, and up to overbooking_allowance further
+    bookings are accepted as pending overbookings.
+    """
+    __slots__ = POLICY_FIELDS
+
+    def __init__(self, capacity, auto_confirm_limit, overbooking_allowance=0):
+        self.capacity = capacity
+        self.auto_confirm_limit = min(auto_confirm_limit, capacity)
+        self.overbooking_allowance = overbooking_allowance
+
+    @property
+    def max_bookings(self):
+        return self.capacity + self.overbooking_allowance
+
+    def status_for(self, position):
+        return 'confirmed' if position <= self.auto_confirm_limit else 'pending'
+
+    def is_overbooked(self, position):
+        return position > self.capacity
+
+
+DEFAULT_POLICY = BookingPolicy(DEFAULT_SLOT_CAPACITY, DEFAULT_AUTO_CONFIRM_LIMIT, DEFAULT_OVERBOOKING_ALLOWANCE)
+
+
+def _merge(profile_values, slot_values):
+    values = [
+        slot_values.get(field) if slot_values.get(field) is not None else profile_values.get(field)
+        for field in POLICY_FIELDS
+    ]
+    defaults = (DEFAULT_SLOT_CAPACITY, DEFAULT_AUTO_CONFIRM_LIMIT, DEFAULT_OVERBOOKING_ALLOWANCE)
+    return BookingPolicy(*(default if value is None else value for value, default in zip(values, defaults)))
+
+
+def _profile_values(profile):
+    if profile is None:
+        return {}
+    return {
+        'capacity': profile.slot_capacity,
+        'auto_confirm_limit': profile.auto_confirm_limit,
+        'overbooking_allowance': profile.overbooking_allowance,
+    }
+
+
+def slot_policy(profile, slot):
+    """Policy of one availability slot under an already loaded profile (no queries)"""
+    return _merge(_profile_values(profile), {field: getattr(slot, field) for field in POLICY_FIELDS})
+
+
+def policy_for(profile, schedule, date, start_time):
+    """Policy from an already loaded profile and availability slots (no queries)"""
+    for slot in schedule:
+        if slot.day_of_week == date.weekday() and slot.start_time <= start_time < slot.end_time:
+            return slot_policy(profile, slot)
+    return _merge(_profile_values(profile), {})
+
+
+def resolve_policy(doctor_id, date, start_time):
+    """Doctor policy with the covering availability slot's overrides, in one query"""
+    covering = AvailabilitySlot.objects.filter(
+        doctor_id=OuterRef('user_id'),
+        is_active=True,
+        day_of_week=date.weekday(),
+        start_time__lte=start_time,
+        end_time__gt=start_time
+    ).order_by('start_time')
+    row = DoctorProfile.objects.filter(user_id=doctor_id).annotate(
+        **{f'override_{field}': Subquery(covering.values(field)[:1]) for field in POLICY_FIELDS}
+    ).values(*PROFILE_POLICY_FIELDS, *(f'override_{field}' for field in POLICY_FIELDS)).first()
+    if row is None:
+        return DEFAULT_POLICY
+    return _merge(
+        {'capacity': row['slot_capacity'], 'auto_confirm_limit': row['auto_confirm_limit'], 'overbooking_allowance': row['overbooking_allowance']},
+        {field: row[f'override_{field}'] for field in POLICY_FIELDS}
+    )
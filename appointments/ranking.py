@@ -0,0 +1,90 @@
+import heapq
+from datetime import datetime, time, timedelta
+from django.db.models import Sum
+from .models import OpenSlot
+from .slots import open_slots_between
+
+# Relative importance of each signal; every component is scaled to [0, 1]
+WEIGHTS = {
+    'time': 0.45,
+    'rating': 0.25,
+    'fee': 0.15,
+    'load': 0.15,
+}
+MAX_RATING = 5.0
+# Hours away from the preferred time at which the time score halves
+TIME_HALF_LIFE_HOURS = 12
+TIME_OF_DAY = {
+    'morning': (9, 0),
+    'afternoon': (14, 0),
+    'evening': (18, 0),
+}
+# Hours either side of a requested time searched for candidates, and how many to take
+PREFERRED_BAND_HOURS = 3
+PREFERRED_CANDIDATES = 30
+
+
+def doctor_utilization(doctor_ids, start_date, end_date):
+    """Share of each doctor's indexed capacity already booked in the window, in one query"""
+    totals = OpenSlot.objects.filter(
+        doctor_id__in=doctor_ids,
+        date__gte=start_date,
+        date__lte=end_date
+    ).values('doctor_id').annotate(capacity=Sum('capacity'), remaining=Sum('remaining')).order_by()
+    return {
+        row['doctor_id']: 1 - row['remaining'] / row['capacity']
+        for row in totals if row['capacity']
+    }
+
+
+def slots_near(doctor_ids, preferred_at, end_date, user=None, limit=PREFERRED_CANDIDATES):
+    """Open slots within PREFERRED_BAND_HOURS of the preferred time of day, from the preferred date on.
+
+    The earliest slots alone can all fall in the morning, leaving nothing
+    near an evening request for rank_slots to score.
+    """
+    day_start = datetime.combine(preferred_at.date(), time.min)
+    band = timedelta(hours=PREFERRED_BAND_HOURS)
+    band_start = max(preferred_at - band, day_start).time()
+    band_end = min(preferred_at + band, datetime.combine(preferred_at.date(), time.max)).time()
+    slots = open_slots_between(doctor_ids, preferred_at.date(), end_date, user).filter(
+        start_time__gte=band_start,
+        start_time__lte=band_end
+    )
+    return list(slots[:limit])
+
+
+def rank_slots(candidates, profile_map, preferred_at, utilization, limit=3):
+    """Score every candidate in one pass and return the top ``limit``.
+
+    candidates carry doctor_id, date and start_time; preferred_at is the
+    datetime the patient asked for. The best slot of each doctor is taken
+    first so suggestions stay spread across doctors, then the remaining
+    places go to the next best slots overall.
+    """
+    if not candidates:
+        return []
+    fees = [float(profile.consultation_fee) for profile in profile_map.values()]
+    min_fee, fee_span = min(fees), (max(fees) - min(fees)) or 1.0
+    scored = []
+    for index, slot in enumerate(candidates):
+        profile = profile_map[slot.doctor_id]
+        hours = abs((datetime.combine(slot.date, slot.start_time) - preferred_at).total_seconds()) / 3600
+        score = (
+            WEIGHTS['time'] * TIME_HALF_LIFE_HOURS / (TIME_HALF_LIFE_HOURS + hours)
+            + WEIGHTS['rating'] * min(max(profile.rating or 0, 0), MAX_RATING) / MAX_RATING
+            + WEIGHTS['fee'] * (1 - (float(profile.consultation_fee) - min_fee) / fee_span)
+            + WEIGHTS['load'] * (1 - utilization.get(slot.doctor_id, 0))
+        )
+        # The index breaks ties in favour of the earlier slot
+        scored.append((score, -index, slot))
+    best_per_doctor = {}
+    for entry in scored:
+        doctor_id = entry[2].doctor_id
+        if doctor_id not in best_per_doctor or entry > best_per_doctor[doctor_id]:
+            best_per_doctor[doctor_id] = entry
+    top = heapq.nlargest(limit, best_per_doctor.values())
+    if len(top) < limit:
+        chosen = {id(entry[2]) for entry in top}
+        top += heapq.nlargest(limit - len(top), (entry for entry in scored if id(entry[2]) not in chosen))
+    return [entry[2] for entry in top]
@@ -0,0 +1,229 @@
+import heapq
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import reduce
+from operator import or_
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from accounts.models import DoctorProfile
+from messaging.models import Notification
+from .models import Appointment, AvailabilitySlot, DayOccupancy
+from .availability import invalidate_availability_calendar
+from .suggestions import invalidate_slot_suggestions
+from .booking import ACTIVE_STATUSES, BookingConflict, book_in_bulk
+from .occupancy import Occupancy, interval_mask
+from .policy import policy_for
+from . import slots
+
+# How many days either side of the original date a replacement may fall
+REASSIGN_WINDOW_DAYS = 3
+
+
+class Reassignment:
+    """A proposed replacement slot for one displaced appointment"""
+    __slots__ = ('appointment', 'doctor_id', 'date', 'start_time', 'end_time', 'cost', 'doctor')
+
+    def __init__(self, appointment, doctor_id, date, start_time, end_time, cost):
+        self.appointment = appointment
+        self.doctor_id = doctor_id
+        self.date = date
+        self.start_time = start_time
+        self.end_time = end_time
+        self.cost = cost
+        self.doctor = None
+
+    @property
+    def key(self):
+        """Identifies the proposed slot in forms, so a proposal that changed is never applied"""
+        return f'{self.doctor_id}:{self.date.isoformat()}:{self.start_time.strftime("%H:%M")}'
+
+
+def displaced_appointments(leave):
+    """Appointments cancelled by the leave that have not been moved to another doctor yet"""
+    return leave.displaced_appointments.filter(status='cancelled').exclude(
+        Exists(Appointment.objects.filter(reassigned_from=OuterRef('pk')))
+    ).select_related('patient').order_by('appointment_date', 'appointment_time')
+
+
+def _minutes_apart(first_date, first_time, second_date, second_time):
+    delta = datetime.combine(second_date, second_time) - datetime.combine(first_date, first_time)
+    return abs(delta.total_seconds()) // 60
+
+
+def _overlaps(intervals, start_time, end_time):
+    return any(start_time < other_end and other_start < end_time for other_start, other_end in intervals)
+
+
+def propose_reassignments(leave, appointments=None, window_days=REASSIGN_WINDOW_DAYS):
+    """Propose a same-specialty replacement slot for every displaced appointment in one pass.
+
+    The open-slot index of every other approved doctor with the leave
+    doctor's specialization is read once for the whole date window. Each
+    appointment's candidates are sorted by distance from the original
+    time, and a priority queue holding every appointment's current best
+    candidate is drained greedily: the closest pair overall is assigned
+    first, and an appointment whose candidate was taken re-enters the
+    queue with its next one. Patients are never given two overlapping
+    visits. Returns (proposals, unmatched appointments).
+    """
+    appointments = list(displaced_appointments(leave) if appointments is None else appointments)
+    if not appointments:
+        return [], []
+    specialization = DoctorProfile.objects.filter(user_id=leave.doctor_id).values_list('specialization', flat=True).first()
+    doctor_ids = list(
+        DoctorProfile.objects.filter(specialization=specialization, is_approved=True)
+        .exclude(user_id=leave.doctor_id)
+        .values_list('user_id', flat=True)
+    )
+    window = timedelta(days=window_days)
+    start_date = min(appointment.appointment_date for appointment in appointments) - window
+    end_date = min(
+        max(appointment.appointment_date for appointment in appointments) + window,
+        slots.get_horizon_end()
+    )
+    if not doctor_ids or end_date < start_date:
+        return [], appointments
+    open_slots = list(
+        slots.open_slots_between(doctor_ids, start_date, end_date)
+        .values_list('doctor_id', 'date', 'start_time', 'end_time')
+    )
+    slot_dates = [slot[1] for slot in open_slots]
+
+    busy = defaultdict(list)
+    for patient_id, date, start_time, end_time in Appointment.objects.filter(
+        patient_id__in={appointment.patient_id for appointment in appointments},
+        appointment_date__gte=start_date,
+        appointment_date__lte=end_date,
+        status__in=ACTIVE_STATUSES
+    ).values_list('patient_id', 'appointment_date', 'appointment_time', 'end_time'):
+        busy[(patient_id, date)].append((start_time, end_time))
+
+    candidates = []
+    queue = []
+    for index, appointment in enumerate(appointments):
+        original_date = appointment.appointment_date
+        low = bisect_left(slot_dates, original_date - window)
+        high = bisect_right(slot_dates, original_date + window)
+        ranked = sorted(
+            (_minutes_apart(original_date, appointment.appointment_time, slot_dates[position], open_slots[position][2]), position)
+            for position in range(low, high)
+        )
+        candidates.append(ranked)
+        if ranked:
+            heapq.heappush(queue, (ranked[0][0], index, 0))
+
+    taken = set()
+    assigned = {}
+    while queue:
+        cost, index, pointer = heapq.heappop(queue)
+        appointment = appointments[index]
+        position = candidates[index][pointer][1]
+        doctor_id, date, start_time, end_time = open_slots[position]
+        key = (appointment.patient_id, date)
+        if position in taken or _overlaps(busy[key], start_time, end_time):
+            if pointer + 1 < len(candidates[index]):
+                heapq.heappush(queue, (candidates[index][pointer + 1][0], index, pointer + 1))
+            continue
+        taken.add(position)
+        busy[key].append((start_time, end_time))
+        assigned[index] = Reassignment(appointment, doctor_id, date, start_time, end_time, cost)
+
+    proposals = [assigned[index] for index in sorted(assigned)]
+    unmatched = [appointment for index, appointment in enumerate(appointments) if index not in assigned]
+    return proposals, unmatched
+
+
+def apply_reassignments(proposals):
+    """Book accepted proposals with bulk writes in one transaction.
+
+    The target doctors' day occupancy is checked for every proposal at
+    once, the appointments are booked through book_in_bulk, the patient
+    and doctor notifications are bulk inserted, and the derived
+    open-slot rows and caches are refreshed afterwards. Raises
+    BookingConflict when any proposal no longer fits.
+    """
+    if not proposals:
+        return []
+    doctor_ids = {proposal.doctor_id for proposal in proposals}
+    profiles = {profile.user_id: profile for profile in DoctorProfile.objects.filter(user_id__in=doctor_ids).select_related('user')}
+    schedules = defaultdict(list)
+    for slot in AvailabilitySlot.objects.filter(doctor_id__in=doctor_ids, is_active=True):
+        schedules[slot.doctor_id].append(slot)
+    policies = {
+        id(proposal): policy_for(profiles.get(proposal.doctor_id), schedules[proposal.doctor_id], proposal.date, proposal.start_time)
+        for proposal in proposals
+    }
+    keys = [(proposal.doctor_id, proposal.date, proposal.start_time) for proposal in proposals]
+    if len(set(keys)) != len(keys):
+        raise BookingConflict(['Two proposals use the same slot.'])
+    days = {(proposal.doctor_id, proposal.date) for proposal in proposals}
+
+    with transaction.atomic():
+        occupancy = {
+            (doctor_id, date): Occupancy.from_bytes(layers)
+            for doctor_id, date, layers in DayOccupancy.objects.filter(
+                reduce(or_, (Q(doctor_id=doctor_id, date=date) for doctor_id, date in days))
+            ).values_list('doctor_id', 'date', 'layers')
+        }
+        errors = []
+        for proposal in proposals:
+            day = occupancy.setdefault((proposal.doctor_id, proposal.date), Occupancy())
+            mask = interval_mask(proposal.start_time, proposal.end_time)
+            if day.conflicts(mask, policies[id(proposal)].max_bookings):
+                errors.append(f'{proposal.date} {proposal.start_time.strftime("%H:%M")}: the slot was booked in the meantime.')
+            else:
+                day.add(mask)
+        if errors:
+            raise BookingConflict(errors)
+
+        appointments = book_in_bulk(
+            [
+                Appointment(
+                    doctor_id=proposal.doctor_id,
+                    patient_id=proposal.appointment.patient_id,
+                    appointment_date=proposal.date,
+                    appointment_time=proposal.start_time,
+                    end_time=proposal.end_time,
+                    reason=proposal.appointment.reason,
+                    notes=proposal.appointment.notes,
+                    reassigned_from=proposal.appointment
+                )
+                for proposal in proposals
+            ],
+            [policies[id(proposal)] for proposal in proposals],
+            occupancy,
+            'One or more slots were just booked by someone else. Please try again.'
+        )
+        notifications = []
+        for proposal, appointment in zip(proposals, appointments):
+            doctor = profiles[proposal.doctor_id].user
+            original = proposal.appointment
+            when = f'{appointment.appointment_date} at {appointment.appointment_time.strftime("%H:%M")}'
+            notifications.append(Notification(
+                user_id=appointment.patient_id,
+                notification_type='appointment_confirmed' if appointment.status == 'confirmed' else 'appointment_request',
+                title='Appointment Reassigned',
+                description=(
+                    f'Your cancelled appointment on {original.appointment_date} was moved to '
+                    f'Dr. {doctor.get_full_name()} on {when} ({appointment.get_status_display().lower()}).'
+                ),
+                related_appointment=appointment
+            ))
+            notifications.append(Notification(
+                user_id=proposal.doctor_id,
+                notification_type='appointment_confirmed' if appointment.status == 'confirmed' else 'appointment_request',
+                title='Reassigned Appointment',
+                description=f'{original.patient.get_full_name()} was reassigned to you on {when} because their doctor is on leave.',
+                related_appointment=appointment
+            ))
+        Notification.objects.bulk_create(notifications)
+
+    dates = [proposal.date for proposal in proposals]
+    horizon_end = slots.get_horizon_end()
+    if min(dates) <= horizon_end:
+        slots.rebuild_open_slots(doctor_ids, min(dates), min(max(dates), horizon_end))
+    for doctor_id in doctor_ids:
+        invalidate_availability_calendar(doctor_id)
+        invalidate_slot_suggestions(doctor_id)
+    return appointments
@@ -0,0 +1,206 @@
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from django.db import transaction
+from django.db.models import Q
+from .models import AvailabilitySlot
+from .availability import invalidate_availability_calendar
+from .suggestions import invalidate_slot_suggestions
+from .slots import refresh_doctor_horizon
+
+UPSERT_BATCH_SIZE = 500
+DAY_NAMES = dict(AvailabilitySlot.DAYS_OF_WEEK)
+POLICY_FIELDS = ('capacity', 'auto_confirm_limit', 'overbooking_allowance')
+
+_bulk_write = threading.local()
+
+
+class ScheduleError(ValueError):
+    """Raised when a weekly template cannot be saved; ``errors`` lists every problem found"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        super().__init__(' '.join(self.errors))
+
+
+def _parse_time(value):
+    if hasattr(value, 'hour'):
+        return value
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(str(value), fmt).time()
+        except ValueError:
+            continue
+    return None
+
+
+def parse_weekly_template(entries):
+    """Turn a list of slot dicts into unsaved AvailabilitySlots, raising ScheduleError on bad input"""
+    slots = []
+    errors = []
+    for index, entry in enumerate(entries or [], start=1):
+        if not isinstance(entry, dict):
+            errors.append(f'Slot {index}: expected an object.')
+            continue
+        try:
+            day = int(entry.get('day_of_week'))
+        except (TypeError, ValueError):
+            day = None
+        start_time = _parse_time(entry.get('start_time'))
+        end_time = _parse_time(entry.get('end_time'))
+        try:
+            slot_duration = int(entry.get('slot_duration', 30))
+        except (TypeError, ValueError):
+            slot_duration = 0
+        overrides = {}
+        for field in POLICY_FIELDS:
+            value = entry.get(field)
+            if value in (None, ''):
+                overrides[field] = None
+                continue
+            try:
+                overrides[field] = int(value)
+            except (TypeError, ValueError):
+                overrides[field] = -1
+            if overrides[field] < 0:
+                errors.append(f'Slot {index}: {field.replace("_", " ")} must be a whole number of zero or more.')
+        if day not in DAY_NAMES:
+            errors.append(f'Slot {index}: select a valid day.')
+        elif not start_time or not end_time:
+            errors.append(f'Slot {index}: enter start and end times as HH:MM.')
+        elif end_time <= start_time:
+            errors.append(f'Slot {index}: end time must be after start time.')
+        elif slot_duration <= 0:
+            errors.append(f'Slot {index}: slot duration must be positive.')
+        else:
+            slots.append(AvailabilitySlot(
+                day_of_week=day,
+                start_time=start_time,
+                end_time=end_time,
+                slot_duration=slot_duration,
+                is_active=bool(entry.get('is_active', True)),
+                **overrides
+            ))
+    if errors:
+        raise ScheduleError(errors)
+    return slots
+
+
+def find_overlaps(slots):
+    """Sorted sweep over active slots; returns a message for each overlapping or duplicate pair"""
+    errors = []
+    seen = set()
+    previous = None
+    for slot in sorted(slots, key=lambda item: (item.day_of_week, item.start_time, item.end_time)):
+        key = (slot.day_of_week, slot.start_time)
+        day = DAY_NAMES.get(slot.day_of_week, slot.day_of_week)
+        if key in seen:
+            errors.append(f'{day} has two slots starting at {slot.start_time.strftime("%H:%M")}.')
+            continue
+        seen.add(key)
+        if not slot.is_active:
+            continue
+        if previous and previous.day_of_week == slot.day_of_week and slot.start_time < previous.end_time:
+            errors.append(
+                f'{day} {slot.start_time.strftime("%H:%M")}-{slot.end_time.strftime("%H:%M")} overlaps '
+                f'{previous.start_time.strftime("%H:%M")}-{previous.end_time.strftime("%H:%M")}.'
+            )
+            if slot.end_time <= previous.end_time:
+                continue
+        previous = slot
+    return errors
+
+
+@contextmanager
+def bulk_schedule_write():
+    """Mute the per-row AvailabilitySlot signals; the caller refreshes derived data once"""
+    previous = in_bulk_schedule_write()
+    _bulk_write.active = True
+    try:
+        yield
+    finally:
+        _bulk_write.active = previous
+
+
+def in_bulk_schedule_write():
+    return getattr(_bulk_write, 'active', False)
+
+
+def _refresh_derived(doctor_id):
+    # Bulk writes bypass the AvailabilitySlot signals
+    refresh_doctor_horizon(doctor_id)
+    invalidate_availability_calendar(doctor_id)
+    invalidate_slot_suggestions(doctor_id)
+
+
+def _upsert(doctor, slots):
+    for slot in slots:
+        slot.doctor = doctor
+    AvailabilitySlot.objects.bulk_create(
+        slots,
+        update_conflicts=True,
+        unique_fields=['doctor', 'day_of_week', 'start_time'],
+        update_fields=['end_time', 'slot_duration', 'is_active', *POLICY_FIELDS],
+        batch_size=UPSERT_BATCH_SIZE,
+    )
+
+
+def replace_weekly_schedule(doctor, slots):
+    """Make ``slots`` the doctor's whole week: one upsert plus one delete of removed slots"""
+    errors = find_overlaps(slots)
+    if errors:
+        raise ScheduleError(errors)
+    with transaction.atomic():
+        removed = AvailabilitySlot.objects.filter(doctor=doctor)
+        if slots:
+            keep = Q()
+            for slot in slots:
+                keep |= Q(day_of_week=slot.day_of_week, start_time=slot.start_time)
+            removed = removed.exclude(keep)
+        # delete() sends post_delete per row, and each would rebuild the whole horizon
+        with bulk_schedule_write():
+            removed.delete()
+        if slots:
+            _upsert(doctor, slots)
+    _refresh_derived(doctor.id)
+    return slots
+
+
+def merge_into_schedule(doctor, slots):
+    """Add or update ``slots`` while keeping the rest of the doctor's week"""
+    incoming = {(slot.day_of_week, slot.start_time): slot for slot in slots}
+    existing = []
+    for slot in AvailabilitySlot.objects.filter(doctor=doctor):
+        replacement = incoming.get((slot.day_of_week, slot.start_time))
+        if replacement is None:
+            existing.append(slot)
+            continue
+        # Forms do not carry policy overrides, so keep the stored ones
+        for field in POLICY_FIELDS:
+            if getattr(replacement, field) is None:
+                setattr(replacement, field, getattr(slot, field))
+    errors = find_overlaps(existing + list(slots))
+    if errors:
+        raise ScheduleError(errors)
+    with transaction.atomic():
+        _upsert(doctor, slots)
+    _refresh_derived(doctor.id)
+    return slots
+
+
+def serialize_schedule(doctor):
+    return [
+        {
+            'id': slot.id,
+            'day_of_week': slot.day_of_week,
+            'day': slot.get_day_of_week_display(),
+            'start_time': slot.start_time.strftime('%H:%M'),
+            'end_time': slot.end_time.strftime('%H:%M'),
+            'slot_duration': slot.slot_duration,
+            'is_active': slot.is_active,
+            'capacity': slot.capacity,
+            'auto_confirm_limit': slot.auto_confirm_limit,
+            'overbooking_allowance': slot.overbooking_allowance,
+        }
+        for slot in AvailabilitySlot.objects.filter(doctor=doctor).order_by('day_of_week', 'start_time')
+    ]
@@ -0,0 +1,121 @@
+import base64
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from django.db.models import Q
+from django.utils import timezone
+from accounts.models import DoctorProfile
+from .slots import get_horizon_end, open_slots_between
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+DEFAULT_RANGE_DAYS = 7
+
+
+class SearchError(ValueError):
+    pass
+
+
+def _parse_date(value, field):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise SearchError(f'{field} must be a date in YYYY-MM-DD format.')
+
+
+def _parse_time(value, field):
+    for fmt in ('%H:%M', '%H:%M:%S'):
+        try:
+            return datetime.strptime(value, fmt).time()
+        except (TypeError, ValueError):
+            continue
+    raise SearchError(f'{field} must be a time in HH:MM format.')
+
+
+def _parse_number(value, field, cast):
+    try:
+        return cast(value)
+    except (TypeError, ValueError, InvalidOperation):
+        raise SearchError(f'{field} must be a number.')
+
+
+def encode_cursor(slot):
+    raw = f'{slot.date.isoformat()}|{slot.start_time.strftime("%H:%M:%S")}|{slot.doctor_id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        date_value, time_value, doctor_id = raw.split('|')
+        return (
+            datetime.strptime(date_value, '%Y-%m-%d').date(),
+            datetime.strptime(time_value, '%H:%M:%S').time(),
+            int(doctor_id),
+        )
+    except (ValueError, UnicodeDecodeError):
+        raise SearchError('Invalid cursor.')
+
+
+def parse_search_params(params):
+    """Validate query-string filters into a dict for search_open_slots"""
+    today = timezone.localdate()
+    filters = {'specialization': params.get('specialization', '').strip()}
+    filters['start_date'] = _parse_date(params['date_from'], 'date_from') if params.get('date_from') else today
+    if params.get('date_to'):
+        filters['end_date'] = _parse_date(params['date_to'], 'date_to')
+    else:
+        filters['end_date'] = filters['start_date'] + timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if filters['end_date'] < filters['start_date']:
+        raise SearchError('date_to must not be before date_from.')
+    for field in ('time_from', 'time_to'):
+        filters[field] = _parse_time(params[field], field) if params.get(field) else None
+    for field in ('min_fee', 'max_fee'):
+        filters[field] = _parse_number(params[field], field, Decimal) if params.get(field) else None
+    for field in ('min_experience', 'max_experience'):
+        filters[field] = _parse_number(params[field], field, int) if params.get(field) else None
+    limit = _parse_number(params.get('limit') or DEFAULT_PAGE_SIZE, 'limit', int)
+    filters['limit'] = min(max(limit, 1), MAX_PAGE_SIZE)
+    filters['cursor'] = decode_cursor(params['cursor']) if params.get('cursor') else None
+    return filters
+
+
+def search_open_slots(specialization='', start_date=None, end_date=None, time_from=None, time_to=None,
+                      min_fee=None, max_fee=None, min_experience=None, max_experience=None,
+                      limit=DEFAULT_PAGE_SIZE, cursor=None, user=None):
+    """One page of open slots across every matching doctor, earliest first.
+
+    Candidate doctors are filtered in a subquery and joined against the
+    open-slot index, so a page costs one query however many doctors match.
+    Returns (slots, next_cursor, horizon_end); searches are limited to the
+    index horizon.
+    """
+    doctors = DoctorProfile.objects.filter(is_approved=True)
+    if specialization:
+        doctors = doctors.filter(specialization=specialization)
+    if min_fee is not None:
+        doctors = doctors.filter(consultation_fee__gte=min_fee)
+    if max_fee is not None:
+        doctors = doctors.filter(consultation_fee__lte=max_fee)
+    if min_experience is not None:
+        doctors = doctors.filter(experience_years__gte=min_experience)
+    if max_experience is not None:
+        doctors = doctors.filter(experience_years__lte=max_experience)
+
+    horizon_end = get_horizon_end()
+    start_date = start_date or timezone.localdate()
+    end_date = min(end_date or start_date, horizon_end)
+    slots = open_slots_between(doctors.values('user_id'), start_date, end_date, user)
+    if time_from:
+        slots = slots.filter(start_time__gte=time_from)
+    if time_to:
+        slots = slots.filter(end_time__lte=time_to)
+    if cursor:
+        after_date, after_time, after_doctor = cursor
+        slots = slots.filter(
+            Q(date__gt=after_date) |
+            Q(date=after_date, start_time__gt=after_time) |
+            Q(date=after_date, start_time=after_time, doctor_id__gt=after_doctor)
+        )
+    page = list(slots.select_related('doctor__doctor_profile')[:limit + 1])
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor, horizon_end
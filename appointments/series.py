@@ -0,0 +1,134 @@
+import calendar
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from messaging.models import Notification
+from .models import Appointment, AppointmentSeries, DayOccupancy
+from .availability import invalidate_availability_calendar
+from .suggestions import invalidate_slot_suggestions
+from .blackout import load_blackout_calendar
+from .booking import BookingConflict, book_in_bulk
+from .holds import held_places
+from .occupancy import Occupancy, load_schedule, schedule_window
+from .policy import policy_for
+from . import slots
+
+MAX_OCCURRENCES = 26
+
+
+def add_months(date, months):
+    month_index = date.month - 1 + months
+    year = date.year + month_index // 12
+    month = month_index % 12 + 1
+    return date.replace(year=year, month=month, day=min(date.day, calendar.monthrange(year, month)[1]))
+
+
+def series_dates(start_date, frequency, occurrences):
+    """Visit dates of a recurrence rule, starting with start_date"""
+    if frequency == 'monthly':
+        return [add_months(start_date, index) for index in range(occurrences)]
+    step = timedelta(weeks=2 if frequency == 'biweekly' else 1)
+    return [start_date + step * index for index in range(occurrences)]
+
+
+def book_series(doctor, patient, start_date, start_time, frequency, occurrences, reason=''):
+    """Book every visit of a recurrence rule in one transaction.
+
+    The whole date set is checked against the stored day occupancy, the
+    blackout calendar and other patients' holds at once, the slot counters
+    and appointments go through book_in_bulk, and the summary
+    notifications are written with one bulk insert. Raises
+    BookingConflict listing every visit that cannot be booked.
+    """
+    if not 2 <= occurrences <= MAX_OCCURRENCES:
+        raise BookingConflict([f'A series must have between 2 and {MAX_OCCURRENCES} visits.'])
+    dates = series_dates(start_date, frequency, occurrences)
+    now = timezone.localtime()
+    schedule = load_schedule(doctor.id)
+    blackout = load_blackout_calendar(doctor.id)
+    profile = getattr(doctor, 'doctor_profile', None)
+    errors = []
+    windows = {}
+    policies = {}
+    for date in dates:
+        end_time, mask, fits_schedule = schedule_window(schedule, date, start_time)
+        policies[date] = policy_for(profile, schedule, date, start_time)
+        if date < now.date() or (date == now.date() and start_time <= now.time()):
+            errors.append(f'{date}: this visit would be in the past.')
+        elif blackout.is_blocked(date):
+            errors.append(f'{date}: the doctor is on leave.')
+        elif not fits_schedule:
+            errors.append(f'{date}: the time is outside the doctor\'s availability.')
+        windows[date] = (end_time, mask)
+    if errors:
+        raise BookingConflict(errors)
+
+    with transaction.atomic():
+        occupancy = {
+            (doctor.id, date): Occupancy.from_bytes(layers)
+            for date, layers in DayOccupancy.objects.filter(doctor=doctor, date__in=dates).values_list('date', 'layers')
+        }
+        held = held_places(patient, doctor=doctor, date__in=dates, start_time=start_time)
+        for date in dates:
+            day = occupancy.setdefault((doctor.id, date), Occupancy())
+            free_places = policies[date].max_bookings - day.depth(windows[date][1])
+            if free_places <= 0:
+                errors.append(f'{date}: this time slot is already booked.')
+            elif held[(doctor.id, date, start_time)] >= free_places:
+                errors.append(f'{date}: the time is being held for another patient.')
+            else:
+                day.add(windows[date][1])
+        if errors:
+            raise BookingConflict(errors)
+
+        series = AppointmentSeries.objects.create(
+            doctor=doctor,
+            patient=patient,
+            frequency=frequency,
+            start_date=start_date,
+            appointment_time=start_time,
+            occurrences=occurrences,
+            reason=reason
+        )
+        appointments = book_in_bulk(
+            [
+                Appointment(
+                    doctor=doctor,
+                    patient=patient,
+                    appointment_date=date,
+                    appointment_time=start_time,
+                    end_time=windows[date][0],
+                    reason=reason,
+                    series=series
+                )
+                for date in dates
+            ],
+            [policies[date] for date in dates],
+            occupancy,
+            'One or more visits were just booked by someone else. Please try again.'
+        )
+        confirmed = sum(1 for appointment in appointments if appointment.status == 'confirmed')
+        summary = f'{occurrences} {series.get_frequency_display().lower()} visits from {dates[0]} to {dates[-1]} at {start_time.strftime("%H:%M")}'
+        Notification.objects.bulk_create([
+            Notification(
+                user=doctor,
+                notification_type='appointment_confirmed' if confirmed == occurrences else 'appointment_request',
+                title='New Recurring Appointments',
+                description=f'{patient.get_full_name()} booked {summary} ({confirmed} confirmed).',
+                related_appointment=appointments[0]
+            ),
+            Notification(
+                user=patient,
+                notification_type='appointment_confirmed' if confirmed == occurrences else 'appointment_request',
+                title='Recurring Appointments Booked',
+                description=f'Your {summary} with Dr. {doctor.get_full_name()} are booked ({confirmed} confirmed).',
+                related_appointment=appointments[0]
+            ),
+        ])
+
+    horizon_end = slots.get_horizon_end()
+    if dates[0] <= horizon_end:
+        slots.rebuild_open_slots(doctor.id, dates[0], min(dates[-1], horizon_end))
+    invalidate_availability_calendar(doctor.id)
+    invalidate_slot_suggestions(doctor.id)
+    return series, appointments
@@ -0,0 +1,124 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from accounts.models import DoctorProfile
+from .models import Appointment, AvailabilitySlot, DoctorLeave
+from . import slots
+from .availability import invalidate_availability_calendar
+from .occupancy import rebuild_day_occupancy
+from .policy import PROFILE_POLICY_FIELDS
+from .blackout import invalidate_blackout_calendar
+from .booking import sync_slot_counter
+from .schedule import in_bulk_schedule_write
+from .waitlist import promote_waitlist
+from .suggestions import bump_version, invalidate_slot_suggestions, specialization_scope
+
+
+def _refresh_derived(doctor_id, date, freed):
+    rebuild_day_occupancy(doctor_id, date)
+    slots.rebuild_open_slots(doctor_id, date, date)
+    invalidate_availability_calendar(doctor_id)
+    invalidate_slot_suggestions(doctor_id)
+    if freed:
+        promote_waitlist(doctor_id, date)
+
+
+def _refresh_slot(doctor_id, date, start_time, freed, counted=False):
+    if not counted:
+        sync_slot_counter(doctor_id, date, start_time)
+    # The derived rows wait for the commit, so a booking holds its slot lock
+    # only for the counter; waitlisted patients then also see a settled day
+    transaction.on_commit(lambda: _refresh_derived(doctor_id, date, freed))
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_appointment_state(sender, instance, **kwargs):
+    # The one lookup of the stored row per save; dashboard.signals reads it too
+    instance._previous_state = None
+    if instance.pk is not None:
+        instance._previous_state = Appointment.objects.filter(pk=instance.pk).values_list(
+            'doctor_id', 'appointment_date', 'appointment_time', 'status'
+        ).first()
+
+
+@receiver(post_save, sender=Appointment)
+@receiver(post_delete, sender=Appointment)
+def refresh_slots_for_appointment(sender, instance, **kwargs):
+    deleted = kwargs.get('signal') is post_delete
+    freed = deleted or instance.status == 'cancelled'
+    # reserve_slot already counted a booking made through the slot counter
+    counted = getattr(instance, '_slot_counted', False)
+    instance._slot_counted = False
+    _refresh_slot(instance.doctor_id, instance.appointment_date, instance.appointment_time, freed, counted)
+    # Left in place for the dashboard receivers; the next save overwrites it
+    previous = None if deleted else getattr(instance, '_previous_state', None)
+    if previous and previous[:3] != (instance.doctor_id, instance.appointment_date, instance.appointment_time):
+        # A rescheduled or reassigned appointment also frees the slot it left
+        _refresh_slot(*previous[:3], freed=True)
+
+
+@receiver(post_save, sender=AvailabilitySlot)
+@receiver(post_delete, sender=AvailabilitySlot)
+def refresh_slots_for_availability(sender, instance, **kwargs):
+    if in_bulk_schedule_write():
+        return
+    slots.refresh_doctor_horizon(instance.doctor_id)
+    invalidate_availability_calendar(instance.doctor_id)
+    invalidate_slot_suggestions(instance.doctor_id)
+
+
+@receiver(pre_save, sender=DoctorLeave)
+def remember_leave_range(sender, instance, **kwargs):
+    instance._previous_range = None
+    if instance.pk is not None:
+        instance._previous_range = DoctorLeave.objects.filter(pk=instance.pk).values_list(
+            'doctor_id', 'start_date', 'end_date', 'status'
+        ).first()
+
+
+@receiver(post_save, sender=DoctorLeave)
+@receiver(post_delete, sender=DoctorLeave)
+def refresh_slots_for_leave(sender, instance, **kwargs):
+    horizon_end = slots.get_horizon_end()
+    ranges = {(instance.doctor_id, instance.start_date, instance.end_date)}
+    previous = getattr(instance, '_previous_range', None)
+    instance._previous_range = None
+    if previous and previous != (instance.doctor_id, instance.start_date, instance.end_date, instance.status):
+        # A moved or shortened leave reopens the days it no longer covers
+        ranges.add(previous[:3])
+    for doctor_id, start_date, end_date in ranges:
+        invalidate_blackout_calendar(doctor_id)
+        slots.rebuild_open_slots(doctor_id, start_date, min(end_date, horizon_end))
+        invalidate_availability_calendar(doctor_id)
+        invalidate_slot_suggestions(doctor_id)
+
+
+@receiver(pre_save, sender=DoctorProfile)
+def remember_profile_state(sender, instance, **kwargs):
+    instance._previous_specialization = None
+    instance._previous_policy = None
+    if instance.pk is not None:
+        row = DoctorProfile.objects.filter(pk=instance.pk).values_list('specialization', *PROFILE_POLICY_FIELDS).first()
+        if row:
+            instance._previous_specialization, instance._previous_policy = row[0], row[1:]
+
+
+def _refresh_doctor_policy(doctor_id):
+    slots.refresh_doctor_horizon(doctor_id)
+    invalidate_availability_calendar(doctor_id)
+
+
+@receiver(post_save, sender=DoctorProfile)
+def refresh_suggestions_for_profile(sender, instance, **kwargs):
+    # Approval and specialization decide which doctors a suggestion may include
+    invalidate_slot_suggestions(instance.user_id, instance.specialization)
+    previous = getattr(instance, '_previous_specialization', None)
+    previous_policy = getattr(instance, '_previous_policy', None)
+    instance._previous_specialization = instance._previous_policy = None
+    if previous and previous != instance.specialization:
+        # Suggestions for the old specialization still list this doctor
+        bump_version(specialization_scope(previous))
+    if previous_policy is not None and previous_policy != tuple(getattr(instance, field) for field in PROFILE_POLICY_FIELDS):
+        # Capacity and overbooking decide the indexed places and the calendar
+        doctor_id = instance.user_id
+        transaction.on_commit(lambda: _refresh_doctor_policy(doctor_id))
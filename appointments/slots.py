@@ -0,0 +1,292 @@
+import heapq
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import islice
+from operator import attrgetter, itemgetter
+from django.conf import settings
+from django.db.models import Count, F, Min, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from accounts.models import DoctorProfile
+from .models import Appointment, AvailabilitySlot, OpenSlot
+from .blackout import load_blackout_calendars
+from .holds import held_places, holds_blocking
+from .policy import slot_policy
+
+ACTIVE_STATUSES = ['pending', 'confirmed']
+DEFAULT_SLOT_MINUTES = 30
+ROLL_FORWARD_BATCH_SIZE = 200
+
+
+def get_horizon_days():
+    return getattr(settings, 'OPEN_SLOT_HORIZON_DAYS', 30)
+
+
+def get_horizon_end(today=None):
+    today = today or timezone.localdate()
+    return today + timedelta(days=get_horizon_days() - 1)
+
+
+def slot_step(slot):
+    """Return a usable slot length in minutes for an availability slot"""
+    if slot.slot_duration and slot.slot_duration > 0:
+        return slot.slot_duration
+    return DEFAULT_SLOT_MINUTES
+
+
+def expand_slot(slot, date):
+    """Yield (start, end) times for each bookable interval of a slot on a date"""
+    step = timedelta(minutes=slot_step(slot))
+    cursor = datetime.combine(date, slot.start_time)
+    slot_end = datetime.combine(date, slot.end_time)
+    while cursor + step <= slot_end:
+        yield cursor.time(), (cursor + step).time()
+        cursor += step
+
+
+def slot_interval_count(slot):
+    """Number of bookable intervals an availability slot yields on any day"""
+    start_minutes = slot.start_time.hour * 60 + slot.start_time.minute
+    end_minutes = slot.end_time.hour * 60 + slot.end_time.minute
+    return max((end_minutes - start_minutes) // slot_step(slot), 0)
+
+
+class SlotRecord:
+    """A single bookable interval; compact so long streams stay cheap"""
+    __slots__ = ('doctor_id', 'date', 'start_time', 'end_time', 'capacity', 'remaining')
+
+    def __init__(self, doctor_id, date, start_time, end_time, capacity, remaining):
+        self.doctor_id = doctor_id
+        self.date = date
+        self.start_time = start_time
+        self.end_time = end_time
+        self.capacity = capacity
+        self.remaining = remaining
+
+    @property
+    def sort_key(self):
+        return (self.date, self.start_time, self.doctor_id)
+
+    def to_open_slot(self):
+        return OpenSlot(
+            doctor_id=self.doctor_id,
+            date=self.date,
+            start_time=self.start_time,
+            end_time=self.end_time,
+            capacity=self.capacity,
+            remaining=self.remaining
+        )
+
+
+class SlotExpander:
+    """Lazily expands availability for many doctors over a date range.
+
+    The active slots, booking policies, pending/confirmed appointments and
+    approved leave of every doctor are loaded up front in one query each, so the
+    cost does not grow with the number of doctors; the expansion itself
+    only runs as far as callers iterate.
+    """
+
+    def __init__(self, doctor_ids, start_date, end_date):
+        self.doctor_ids = list(doctor_ids)
+        self.start_date = start_date
+        self.end_date = end_date
+        self.slots_by_day = {}
+        self.max_bookings = {}
+        self.booked = Counter()
+        self.blackouts = {}
+        if not self.doctor_ids or end_date < start_date:
+            return
+        for slot in AvailabilitySlot.objects.filter(doctor_id__in=self.doctor_ids, is_active=True).order_by('start_time'):
+            self.slots_by_day.setdefault((slot.doctor_id, slot.day_of_week), []).append(slot)
+        if not self.slots_by_day:
+            return
+        profiles = {
+            profile.user_id: profile
+            for profile in DoctorProfile.objects.filter(user_id__in=self.doctor_ids).only(
+                'user_id', 'slot_capacity', 'auto_confirm_limit', 'overbooking_allowance'
+            )
+        }
+        # Places per interval as the booking counter sees them: profile defaults plus slot overrides
+        for day_slots in self.slots_by_day.values():
+            for slot in day_slots:
+                self.max_bookings[slot.id] = slot_policy(profiles.get(slot.doctor_id), slot).max_bookings
+        self.booked = Counter(
+            Appointment.objects.filter(
+                doctor_id__in=self.doctor_ids,
+                appointment_date__gte=start_date,
+                appointment_date__lte=end_date,
+                status__in=ACTIVE_STATUSES
+            ).values_list('doctor_id', 'appointment_date', 'appointment_time')
+        )
+        self.blackouts = load_blackout_calendars(self.doctor_ids)
+
+    def _expand(self, slot, date):
+        capacity = self.max_bookings[slot.id]
+        for start_time, end_time in expand_slot(slot, date):
+            yield start_time, end_time, capacity
+
+    def iter_doctor(self, doctor_id):
+        """Yield a doctor's SlotRecords in (date, start_time) order"""
+        blackout = self.blackouts.get(doctor_id)
+        current = self.start_date
+        while current <= self.end_date:
+            day_slots = self.slots_by_day.get((doctor_id, current.weekday()))
+            if day_slots and not (blackout and blackout.is_blocked(current)):
+                # merge is stable, so a start shared by two slots takes the earlier slot's policy
+                intervals = heapq.merge(
+                    *(self._expand(slot, current) for slot in day_slots),
+                    key=itemgetter(0)
+                )
+                last_start = None
+                for start_time, end_time, capacity in intervals:
+                    if start_time == last_start:
+                        continue
+                    last_start = start_time
+                    booked = self.booked[(doctor_id, current, start_time)]
+                    yield SlotRecord(doctor_id, current, start_time, end_time, capacity, max(capacity - booked, 0))
+            current += timedelta(days=1)
+
+    def iter_all(self):
+        for doctor_id in self.doctor_ids:
+            yield from self.iter_doctor(doctor_id)
+
+
+def merge_earliest(streams, limit):
+    """k-way merge of per-doctor streams, returning the globally earliest open records"""
+    merged = heapq.merge(*streams, key=attrgetter('sort_key'))
+    return list(islice((record for record in merged if record.remaining > 0), limit))
+
+
+def rebuild_open_slots(doctor_ids, start_date, end_date):
+    """Recompute the open-slot rows of the given doctors for the inclusive date range"""
+    if isinstance(doctor_ids, int):
+        doctor_ids = [doctor_ids]
+    doctor_ids = list(doctor_ids)
+    start_date = max(start_date, timezone.localdate())
+    if not doctor_ids or end_date < start_date:
+        return
+    rows = {
+        (record.doctor_id, record.date, record.start_time): record.to_open_slot()
+        for record in SlotExpander(doctor_ids, start_date, end_date).iter_all()
+    }
+    existing = OpenSlot.objects.filter(
+        doctor_id__in=doctor_ids,
+        date__gte=start_date,
+        date__lte=end_date
+    ).values_list('id', 'doctor_id', 'date', 'start_time')
+    stale_ids = [pk for pk, doctor_id, date, start_time in existing if (doctor_id, date, start_time) not in rows]
+    if stale_ids:
+        OpenSlot.objects.filter(id__in=stale_ids).delete()
+    if rows:
+        # Upsert keeps row identity stable for concurrent readers
+        OpenSlot.objects.bulk_create(
+            rows.values(),
+            update_conflicts=True,
+            unique_fields=['doctor', 'date', 'start_time'],
+            update_fields=['end_time', 'capacity', 'remaining', 'updated_at'],
+            batch_size=ROLL_FORWARD_BATCH_SIZE,
+        )
+    refresh_next_available(doctor_ids)
+
+
+def earliest_open_slots(doctor_ids):
+    """{doctor_id: aware datetime} of each doctor's first open indexed slot, in two grouped queries"""
+    now = timezone.localtime()
+    upcoming = OpenSlot.objects.filter(doctor_id__in=doctor_ids, remaining__gt=0, date__gte=now.date()).exclude(
+        date=now.date(),
+        start_time__lte=now.time()
+    )
+    first_dates = dict(upcoming.values('doctor_id').annotate(first=Min('date')).order_by().values_list('doctor_id', 'first'))
+    if not first_dates:
+        return {}
+    first_day = Q()
+    for doctor_id, date in first_dates.items():
+        first_day |= Q(doctor_id=doctor_id, date=date)
+    first_times = upcoming.filter(first_day).values('doctor_id').annotate(first=Min('start_time')).order_by()
+    return {
+        row['doctor_id']: timezone.make_aware(datetime.combine(first_dates[row['doctor_id']], row['first']))
+        for row in first_times
+    }
+
+
+def refresh_next_available(doctor_ids):
+    """Store each doctor's earliest open slot on DoctorProfile.next_available_at"""
+    if isinstance(doctor_ids, int):
+        doctor_ids = [doctor_ids]
+    earliest = earliest_open_slots(doctor_ids)
+    profiles = list(DoctorProfile.objects.filter(user_id__in=doctor_ids).only('id', 'user_id', 'next_available_at'))
+    changed = []
+    for profile in profiles:
+        value = earliest.get(profile.user_id)
+        if profile.next_available_at != value:
+            profile.next_available_at = value
+            changed.append(profile)
+    if changed:
+        # bulk_update keeps profile signals (and their cache bumps) out of index rebuilds
+        DoctorProfile.objects.bulk_update(changed, ['next_available_at'])
+    return earliest
+
+
+def refresh_doctor_horizon(doctor_id):
+    today = timezone.localdate()
+    rebuild_open_slots(doctor_id, today, get_horizon_end(today))
+
+
+def roll_forward(horizon_days=None):
+    """Drop past rows and rebuild the index for every doctor with availability"""
+    horizon_days = horizon_days or get_horizon_days()
+    today = timezone.localdate()
+    end_date = today + timedelta(days=horizon_days - 1)
+    OpenSlot.objects.filter(date__lt=today).delete()
+    doctor_ids = set(AvailabilitySlot.objects.values_list('doctor_id', flat=True))
+    doctor_ids.update(OpenSlot.objects.values_list('doctor_id', flat=True))
+    doctor_ids.update(DoctorProfile.objects.filter(next_available_at__isnull=False).values_list('user_id', flat=True))
+    doctor_ids = sorted(doctor_ids)
+    for index in range(0, len(doctor_ids), ROLL_FORWARD_BATCH_SIZE):
+        rebuild_open_slots(doctor_ids[index:index + ROLL_FORWARD_BATCH_SIZE], today, end_date)
+    return len(doctor_ids)
+
+
+def open_slots_between(doctor_ids, start_date, end_date, user=None, ignore_holds=False):
+    """Open slots for the given doctors ordered by date and time, skipping past times
+    and, unless ignore_holds is set, slots whose free places are all held for other patients"""
+    now = timezone.localtime()
+    slots = OpenSlot.objects.filter(
+        doctor_id__in=doctor_ids,
+        date__gte=max(start_date, now.date()),
+        date__lte=end_date,
+        remaining__gt=0
+    ).exclude(
+        date=now.date(),
+        start_time__lte=now.time()
+    )
+    if not ignore_holds:
+        held = holds_blocking(user).filter(
+            doctor_id=OuterRef('doctor_id'),
+            date=OuterRef('date'),
+            start_time=OuterRef('start_time')
+        ).order_by().values('doctor_id').annotate(total=Count('id')).values('total')
+        slots = slots.alias(held=Coalesce(Subquery(held), Value(0))).filter(remaining__gt=F('held'))
+    return slots.order_by('date', 'start_time', 'doctor_id')
+
+
+def collect_open_slots(doctor_ids, start_date, end_date, limit, user=None, ignore_holds=False):
+    """Earliest open slots across doctors, reading the index and expanding past its horizon"""
+    doctor_ids = list(doctor_ids)
+    now = timezone.localtime()
+    start_date = max(start_date, now.date())
+    horizon_end = get_horizon_end(now.date())
+    results = list(open_slots_between(doctor_ids, start_date, min(end_date, horizon_end), user, ignore_holds)[:limit])
+    if len(results) < limit and end_date > horizon_end:
+        live_start = max(start_date, horizon_end + timedelta(days=1))
+        expander = SlotExpander(doctor_ids, live_start, end_date)
+        held = Counter()
+        if not ignore_holds:
+            held = held_places(user, doctor_id__in=doctor_ids, date__gte=live_start, date__lte=end_date)
+        streams = [
+            (record for record in expander.iter_doctor(doctor_id) if record.remaining > held[(record.doctor_id, record.date, record.start_time)])
+            for doctor_id in expander.doctor_ids
+        ]
+        results.extend(merge_earliest(streams, limit - len(results)))
+    return results
@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from django.utils import timezone
+from accounts.models import DoctorProfile
+from medical_connect.cache_versions import bump_cache_version, get_cache_version
+from .holds import held_places
+from .slots import SlotRecord, collect_open_slots
+
+SUGGESTION_CACHE_TIMEOUT = 600
+# Extra candidates cached so slots held by other patients can be dropped per request
+HOLD_MARGIN = 10
+
+
+def doctor_scope(doctor_id):
+    return f'doctor:{doctor_id}'
+
+
+def specialization_scope(specialization):
+    return f'spec:{specialization or "all"}'
+
+
+def _version_key(scope):
+    return f'slot_suggestions_version:{scope}'
+
+
+def bump_version(scope):
+    bump_cache_version(_version_key(scope))
+
+
+def invalidate_slot_suggestions(doctor_id, specialization=None):
+    """Retire cached suggestions that may include this doctor's slots"""
+    if specialization is None:
+        specialization = DoctorProfile.objects.filter(user_id=doctor_id).values_list('specialization', flat=True).first()
+    bump_version(doctor_scope(doctor_id))
+    bump_version(specialization_scope(None))
+    if specialization:
+        bump_version(specialization_scope(specialization))
+
+
+def suggested_open_slots(scope, doctor_ids, start_date, end_date, limit, user=None):
+    """collect_open_slots shared across users through a versioned cache.
+
+    Entries are stored without hold filtering; slots whose free places
+    other patients hold and times that have since passed are dropped on
+    every read with at most one query.
+    """
+    key = f'slot_suggestions:{scope}:{start_date}:{end_date}:{limit}:v{get_cache_version(_version_key(scope))}'
+    rows = cache.get(key)
+    if rows is None:
+        rows = [
+            (slot.doctor_id, slot.date, slot.start_time, slot.end_time, slot.capacity, slot.remaining)
+            for slot in collect_open_slots(doctor_ids, start_date, end_date, limit + HOLD_MARGIN, ignore_holds=True)
+        ]
+        cache.set(key, rows, SUGGESTION_CACHE_TIMEOUT)
+    now = timezone.localtime()
+    rows = [row for row in rows if row[1] > now.date() or (row[1] == now.date() and row[2] > now.time())]
+    if rows:
+        held = held_places(user, doctor_id__in={row[0] for row in rows}, date__in={row[1] for row in rows})
+        rows = [row for row in rows if row[5] > held[row[:3]]]
+    return [SlotRecord(*row) for row in rows[:limit]]
@@ -1,3 +1,627 @@
+import json
+from datetime import datetime, time, timedelta
+from importlib import import_module
+from itertools import count
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import CustomUser, DoctorProfile
+from messaging.models import Notification
+from .availability import CALENDAR_DAYS, build_availability_calendar, get_availability_calendar
+from .blackout import BlackoutCalendar, get_blackout_calendar
+from .booking import BookingConflict, book_appointment_slot
+from .holds import holds_fill_slot, place_holds
+from .leave import approve_leave
+from .models import Appointment, AppointmentSeries, AvailabilitySlot, DayOccupancy, DoctorLeave, OpenSlot, SlotCapacity, SlotHold, WaitlistEntry
+from .occupancy import Occupancy, build_occupancy, check_booking_window, interval_mask
+from .policy import resolve_policy
+from .reassign import displaced_appointments, propose_reassignments
+from .schedule import ScheduleError, parse_weekly_template, replace_weekly_schedule
+from .series import book_series
+from .slots import SlotRecord, collect_open_slots, get_horizon_end, merge_earliest, open_slots_between, rebuild_open_slots
+from .suggestions import specialization_scope, suggested_open_slots
+from .waitlist import promote_waitlist
 
-# Create your tests here.
+# Upper bound for replacing a doctor's week, whatever number of slots it removes
+SCHEDULE_REPLACE_QUERY_BUDGET = 20
+# Queries a booking runs while it holds the slot counter's row lock
+BOOKING_QUERY_BUDGET = 14
+# Upper bound for one booking-assistant suggestion, including the session and user lookups
+SUGGEST_SLOT_QUERY_BUDGET = 10
+
+
+class SchedulingMixin:
+    """Doctors open every day from 09:00 to 12:00 in 30-minute slots"""
+
+    @classmethod
+    def make_doctor(cls, username, specialization='cardiology', **profile):
+        doctor = CustomUser.objects.create_user(username=username, password='pw', role='doctor', first_name=username.title())
+        DoctorProfile.objects.create(
+            user=doctor,
+            specialization=specialization,
+            license_number=f'{username}-license',
+            experience_years=5,
+            consultation_fee=100,
+            available_from=time(9),
+            available_to=time(17),
+            is_approved=True,
+            **profile
+        )
+        for day in range(7):
+            AvailabilitySlot.objects.create(doctor=doctor, day_of_week=day, start_time=time(9), end_time=time(12), slot_duration=30)
+        return doctor
+
+    @classmethod
+    def make_patient(cls, username):
+        return CustomUser.objects.create_user(username=username, password='pw', role='patient', first_name=username.title())
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = cls.make_doctor('doctor1')
+        cls.patients = [cls.make_patient(f'patient{index}') for index in range(4)]
+        cls.day = timezone.localdate() + timedelta(days=2)
+
+    def setUp(self):
+        # Cached calendars and versions are keyed by ids the rolled-back tests reuse
+        cache.clear()
+
+    def book(self, patient, start_time, date=None, doctor=None):
+        """Book through the slot counter like the booking views; returns the appointment or None when full"""
+        doctor = doctor or self.doctor
+        date = date or self.day
+        appointment = Appointment(
+            doctor=doctor,
+            patient=patient,
+            appointment_date=date,
+            appointment_time=start_time,
+            end_time=(datetime.combine(date, start_time) + timedelta(minutes=30)).time()
+        )
+        # Derived rows are refreshed on commit, which TestCase never reaches on its own
+        with self.captureOnCommitCallbacks(execute=True):
+            if not book_appointment_slot(appointment, resolve_policy(doctor.id, date, start_time)):
+                return None
+        return appointment
+
+    def open_slot(self, start_time, date=None, doctor=None):
+        return OpenSlot.objects.get(doctor=doctor or self.doctor, date=date or self.day, start_time=start_time)
+
+
+class OpenSlotIndexTests(SchedulingMixin, TestCase):
+
+    def test_index_follows_weekly_availability(self):
+        starts = list(
+            OpenSlot.objects.filter(doctor=self.doctor, date=self.day).order_by('start_time').values_list('start_time', flat=True)
+        )
+        self.assertEqual(starts, [time(9), time(9, 30), time(10), time(10, 30), time(11), time(11, 30)])
+        AvailabilitySlot.objects.filter(doctor=self.doctor, day_of_week=self.day.weekday()).delete()
+        self.assertFalse(OpenSlot.objects.filter(doctor=self.doctor, date=self.day).exists())
+
+    def test_moving_an_appointment_refreshes_both_days(self):
+        appointment = self.book(self.patients[0], time(9))
+        slot = self.open_slot(time(9))
+        self.assertEqual(slot.remaining, slot.capacity - 1)
+        next_day = self.day + timedelta(days=1)
+        appointment.appointment_date = next_day
+        appointment.appointment_time = time(10)
+        appointment.end_time = time(10, 30)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.save()
+
+        slot = self.open_slot(time(9))
+        self.assertEqual(slot.remaining, slot.capacity)
+        self.assertFalse(DayOccupancy.objects.filter(doctor=self.doctor, date=self.day).exists())
+        self.assertEqual(SlotCapacity.objects.get(doctor=self.doctor, date=self.day, start_time=time(9)).booked, 0)
+        slot = self.open_slot(time(10), date=next_day)
+        self.assertEqual(slot.remaining, slot.capacity - 1)
+        self.assertTrue(DayOccupancy.objects.filter(doctor=self.doctor, date=next_day).exists())
+
+
+class OccupancyTests(SchedulingMixin, TestCase):
+
+    def test_layers_count_overlapping_bookings(self):
+        occupancy = Occupancy()
+        morning = interval_mask(time(9), time(9, 30))
+        occupancy.add(morning)
+        occupancy.add(interval_mask(time(9, 15), time(9, 45)))
+        self.assertEqual(occupancy.depth(interval_mask(time(9, 15), time(9, 20))), 2)
+        self.assertEqual(occupancy.depth(interval_mask(time(9, 35), time(9, 40))), 1)
+        self.assertTrue(occupancy.conflicts(interval_mask(time(9, 20), time(9, 25)), capacity=2))
+        self.assertFalse(occupancy.conflicts(interval_mask(time(9, 35), time(9, 40)), capacity=2))
+        occupancy.remove(morning)
+        self.assertEqual(occupancy.depth(interval_mask(time(9), time(9, 45))), 1)
+        self.assertEqual(Occupancy.from_bytes(occupancy.to_bytes()).layers, occupancy.layers)
+
+    def test_booking_window_uses_stored_day(self):
+        self.book(self.patients[0], time(9))
+        window = check_booking_window(self.doctor.id, self.day, time(9))
+        self.assertTrue(window.fits_schedule)
+        self.assertEqual(window.end_time, time(9, 30))
+        self.assertEqual(window.overlapping(), 1)
+        self.assertFalse(check_booking_window(self.doctor.id, self.day, time(11, 45)).fits_schedule)
+
+    def test_backfill_migration_matches_live_bitmaps(self):
+        migration = import_module('appointments.migrations.0008_dayoccupancy')
+        intervals = [(time(9), time(9, 30)), (time(9, 15), time(10)), (time(23, 30), time(0, 15))]
+        self.assertEqual(migration.occupancy_bytes(intervals), build_occupancy(intervals).to_bytes())
+
+
+class BlackoutTests(SchedulingMixin, TestCase):
+
+    def test_calendar_merges_adjacent_ranges(self):
+        day = self.day
+        calendar = BlackoutCalendar([(day + timedelta(days=3), day + timedelta(days=4)), (day, day + timedelta(days=2))])
+        self.assertEqual(calendar.ranges(), [(day, day + timedelta(days=4))])
+        self.assertTrue(calendar.is_blocked(day + timedelta(days=3)))
+        self.assertFalse(calendar.is_blocked(day - timedelta(days=1)))
+        self.assertFalse(calendar.is_blocked(day + timedelta(days=5)))
+
+    def test_approved_leave_closes_the_index(self):
+        DoctorLeave.objects.create(doctor=self.doctor, start_date=self.day, end_date=self.day, status='approved')
+        self.assertFalse(OpenSlot.objects.filter(doctor=self.doctor, date=self.day).exists())
+        self.assertTrue(OpenSlot.objects.filter(doctor=self.doctor, date=self.day + timedelta(days=1)).exists())
+
+    def test_booking_checks_ignore_a_stale_cache(self):
+        self.assertFalse(get_blackout_calendar(self.doctor.id).is_blocked(self.day))
+        # bulk_create skips the signal, like an approval made by another worker
+        DoctorLeave.objects.bulk_create([
+            DoctorLeave(doctor=self.doctor, start_date=self.day, end_date=self.day, status='approved')
+        ])
+        self.assertFalse(get_blackout_calendar(self.doctor.id).is_blocked(self.day))
+        self.assertTrue(check_booking_window(self.doctor.id, self.day, time(9)).on_leave)
+        rebuild_open_slots(self.doctor.id, self.day, self.day)
+        self.assertFalse(OpenSlot.objects.filter(doctor=self.doctor, date=self.day).exists())
+
+    def test_moving_a_leave_reopens_the_old_days(self):
+        leave = DoctorLeave.objects.create(doctor=self.doctor, start_date=self.day, end_date=self.day, status='approved')
+        self.assertFalse(OpenSlot.objects.filter(doctor=self.doctor, date=self.day).exists())
+        next_day = self.day + timedelta(days=1)
+        leave.start_date = leave.end_date = next_day
+        leave.save()
+        self.assertEqual(OpenSlot.objects.filter(doctor=self.doctor, date=self.day).count(), 6)
+        self.assertFalse(OpenSlot.objects.filter(doctor=self.doctor, date=next_day).exists())
+
+
+class BookingPolicyTests(SchedulingMixin, TestCase):
+
+    def test_counter_follows_the_default_policy(self):
+        statuses = [self.book(patient, time(9)) for patient in self.patients]
+        self.assertEqual([appointment.status for appointment in statuses[:3]], ['confirmed', 'confirmed', 'pending'])
+        self.assertIsNone(statuses[3])
+        self.assertEqual(SlotCapacity.objects.get(doctor=self.doctor, date=self.day, start_time=time(9)).booked, 3)
+        slot = self.open_slot(time(9))
+        self.assertEqual((slot.capacity, slot.remaining), (3, 0))
+
+    def test_overbooking_allowance_and_slot_overrides(self):
+        doctor = self.make_doctor('doctor2', slot_capacity=1, auto_confirm_limit=1, overbooking_allowance=1)
+        first = self.book(self.patients[0], time(9), doctor=doctor)
+        second = self.book(self.patients[1], time(9), doctor=doctor)
+        self.assertEqual((first.status, second.status), ('confirmed', 'pending'))
+        self.assertIsNone(self.book(self.patients[2], time(9), doctor=doctor))
+
+        AvailabilitySlot.objects.filter(doctor=doctor, day_of_week=self.day.weekday()).update(capacity=4)
+        policy = resolve_policy(doctor.id, self.day, time(10))
+        self.assertEqual((policy.capacity, policy.max_bookings), (4, 5))
+        rebuild_open_slots(doctor.id, self.day, self.day)
+        slot = self.open_slot(time(10), doctor=doctor)
+        self.assertEqual((slot.capacity, slot.remaining), (5, 5))
+
+    def test_calendar_counts_every_place(self):
+        self.book(self.patients[0], time(9))
+        day = build_availability_calendar(self.doctor.id, self.day, days=1)[0]
+        self.assertEqual((day['capacity'], day['appointments'], day['remaining']), (18, 1, 17))
+
+
+    def test_slot_lock_covers_only_the_counter_and_the_insert(self):
+        appointment = Appointment(
+            doctor=self.doctor, patient=self.patients[0], appointment_date=self.day,
+            appointment_time=time(9), end_time=time(9, 30)
+        )
+        policy = resolve_policy(self.doctor.id, self.day, time(9))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            with CaptureQueriesContext(connection) as context:
+                book_appointment_slot(appointment, policy)
+        self.assertLessEqual(
+            len(context), BOOKING_QUERY_BUDGET,
+            '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(SlotCapacity.objects.get(doctor=self.doctor, date=self.day, start_time=time(9)).booked, 1)
+
+class SlotHoldTests(SchedulingMixin, TestCase):
+
+    def open_starts(self, patient):
+        return list(open_slots_between([self.doctor.id], self.day, self.day, patient).values_list('start_time', flat=True))
+
+    def test_each_hold_takes_one_place(self):
+        capacity = self.open_slot(time(9)).remaining
+        self.assertGreater(capacity, 2)
+        for patient in self.patients[:capacity - 1]:
+            place_holds(patient, [(self.doctor.id, self.day, time(9))])
+        self.assertEqual(SlotHold.objects.filter(start_time=time(9)).count(), capacity - 1)
+        self.assertIn(time(9), self.open_starts(self.patients[3]))
+        self.assertFalse(holds_fill_slot(self.doctor.id, self.day, time(9), self.patients[3], capacity))
+
+        self.assertIsNotNone(self.book(self.patients[3], time(9)))
+        self.assertNotIn(time(9), self.open_starts(None))
+        self.assertTrue(holds_fill_slot(self.doctor.id, self.day, time(9), None, capacity - 1))
+        # A holder still sees the place kept for them
+        self.assertIn(time(9), self.open_starts(self.patients[0]))
+        self.assertFalse(holds_fill_slot(self.doctor.id, self.day, time(9), self.patients[0], capacity - 1))
+        place_holds(self.patients[0], [(self.doctor.id, self.day, time(10))])
+        self.assertIn(time(9), self.open_starts(None))
+
+    def test_booking_view_accepts_a_held_slot_with_places_left(self):
+        place_holds(self.patients[0], [(self.doctor.id, self.day, time(9))])
+        self.client.force_login(self.patients[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                reverse('book_appointment', args=[self.doctor.id]),
+                {'appointment_date': self.day, 'appointment_time': '09:00', 'reason': 'Checkup', 'repeat': 'none'}
+            )
+        self.assertTrue(Appointment.objects.filter(patient=self.patients[1], appointment_time=time(9)).exists())
+
+    def test_only_patients_place_holds(self):
+        place_holds(self.doctor, [(self.doctor.id, self.day, time(9))])
+        self.assertFalse(SlotHold.objects.exists())
+
+
+class WaitlistTests(SchedulingMixin, TestCase):
+
+    def test_freed_place_goes_to_the_highest_priority_entry(self):
+        booked = [self.book(patient, time(9)) for patient in self.patients[:3]]
+        entries = [
+            WaitlistEntry.objects.create(
+                doctor=self.doctor, patient=self.patients[3], date=self.day,
+                window_start=time(9), window_end=time(9, 30), priority=priority
+            )
+            for priority in (0, 5)
+        ]
+        self.assertEqual(promote_waitlist(self.doctor.id, self.day), [])
+        before = WaitlistEntry.objects.get(pk=entries[1].pk).updated_at
+        booked[0].status = 'cancelled'
+        # The cancellation promotes the waitlist once it commits
+        with self.captureOnCommitCallbacks(execute=True):
+            booked[0].save()
+
+        entry = WaitlistEntry.objects.get(pk=entries[1].pk)
+        self.assertEqual(entry.status, 'promoted')
+        self.assertGreater(entry.updated_at, before)
+        self.assertEqual(entry.appointment.patient, self.patients[3])
+        self.assertEqual(WaitlistEntry.objects.get(pk=entries[0].pk).status, 'waiting')
+        self.assertEqual(SlotCapacity.objects.get(doctor=self.doctor, date=self.day, start_time=time(9)).booked, 3)
+
+
+class WeeklyScheduleTests(SchedulingMixin, TestCase):
+
+    def template(self, *days):
+        return parse_weekly_template([
+            {'day_of_week': day, 'start_time': '09:00', 'end_time': '12:00', 'slot_duration': 30}
+            for day in days
+        ])
+
+    def replace_counting_queries(self, doctor, slots):
+        with CaptureQueriesContext(connection) as context:
+            replace_weekly_schedule(doctor, slots)
+        self.assertLessEqual(
+            len(context), SCHEDULE_REPLACE_QUERY_BUDGET,
+            '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        return len(context)
+
+    def test_template_errors_are_collected(self):
+        with self.assertRaises(ScheduleError) as raised:
+            parse_weekly_template([
+                {'day_of_week': 9, 'start_time': '09:00', 'end_time': '10:00'},
+                {'day_of_week': 1, 'start_time': '11:00', 'end_time': '10:00'},
+            ])
+        self.assertEqual(len(raised.exception.errors), 2)
+        overlapping = self.template(0) + parse_weekly_template([{'day_of_week': 0, 'start_time': '11:00', 'end_time': '13:00'}])
+        with self.assertRaises(ScheduleError):
+            replace_weekly_schedule(self.doctor, overlapping)
+
+    def test_replace_removes_dropped_days_and_reindexes(self):
+        weekday = self.day.weekday()
+        replace_weekly_schedule(self.doctor, self.template(weekday))
+        self.assertEqual(
+            sorted(AvailabilitySlot.objects.filter(doctor=self.doctor).values_list('day_of_week', flat=True)),
+            [weekday]
+        )
+        self.assertEqual(OpenSlot.objects.filter(doctor=self.doctor, date=self.day).count(), 6)
+        self.assertFalse(OpenSlot.objects.filter(doctor=self.doctor, date=self.day + timedelta(days=1)).exists())
+
+    def test_replace_query_count_does_not_grow_with_removed_slots(self):
+        few = self.replace_counting_queries(self.doctor, self.template(0))
+        doctor = self.make_doctor('doctor2')
+        for day in range(7):
+            AvailabilitySlot.objects.create(doctor=doctor, day_of_week=day, start_time=time(14), end_time=time(17))
+        self.assertEqual(self.replace_counting_queries(doctor, self.template(0)), few)
+
+
+class SlotSuggestionTests(SchedulingMixin, TestCase):
+
+    def suggest(self, specialization, doctor_ids):
+        return suggested_open_slots(specialization_scope(specialization), doctor_ids, self.day, self.day, 3)
+
+    def test_booking_retires_cached_suggestions(self):
+        self.assertEqual([slot.remaining for slot in self.suggest('cardiology', [self.doctor.id])], [3, 3, 3])
+        self.book(self.patients[0], time(9))
+        self.assertEqual([slot.remaining for slot in self.suggest('cardiology', [self.doctor.id])], [2, 3, 3])
+
+    def test_specialization_change_retires_both_scopes(self):
+        self.assertTrue(self.suggest('cardiology', [self.doctor.id]))
+        self.assertFalse(self.suggest('neurology', []))
+        profile = self.doctor.doctor_profile
+        profile.specialization = 'neurology'
+        profile.save()
+        self.assertFalse(self.suggest('cardiology', []))
+        self.assertTrue(self.suggest('neurology', [self.doctor.id]))
+
+
+class SlotRankingTests(SchedulingMixin, TestCase):
+
+    def test_evening_request_returns_evening_slots(self):
+        # Five-minute morning slots fill every earliest candidate before the evening opens
+        AvailabilitySlot.objects.filter(doctor=self.doctor).update(slot_duration=5)
+        AvailabilitySlot.objects.create(doctor=self.doctor, day_of_week=self.day.weekday(), start_time=time(18), end_time=time(20))
+        self.client.force_login(self.patients[0])
+        response = self.client.post(
+            reverse('chatbot_suggest_slot'),
+            json.dumps({'doctor_id': self.doctor.id, 'query': 'evening', 'preferred_date': self.day.isoformat()}),
+            content_type='application/json'
+        )
+        slots = response.json()['slots']
+        self.assertEqual([slot['time'] for slot in slots], ['18:00', '18:30', '19:00'])
+        self.assertTrue(all(slot['date'] == self.day.isoformat() for slot in slots))
+
+
+class ReassignmentTests(SchedulingMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_doctor = cls.make_doctor('doctor2')
+        cls.admin = CustomUser.objects.create_user(username='admin1', password='pw', role='admin')
+
+    def setUp(self):
+        super().setUp()
+        self.appointment = self.book(self.patients[0], time(9))
+        self.leave = DoctorLeave.objects.create(doctor=self.doctor, start_date=self.day, end_date=self.day)
+        approve_leave(self.leave)
+        self.client.force_login(self.admin)
+
+    def post(self, key):
+        return self.client.post(
+            reverse('leave_reassignments', args=[self.leave.id]),
+            {'accept': [self.appointment.id], f'slot_{self.appointment.id}': key}
+        )
+
+    def test_leave_cancels_and_proposes_the_closest_slot(self):
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.status, 'cancelled')
+        proposals, unmatched = propose_reassignments(self.leave)
+        self.assertEqual(unmatched, [])
+        self.assertEqual((proposals[0].date, proposals[0].start_time, proposals[0].cost), (self.day, time(9), 0))
+        self.assertNotEqual(proposals[0].doctor_id, self.doctor.id)
+
+    def test_posted_proposal_is_booked(self):
+        proposal = propose_reassignments(self.leave)[0][0]
+        self.post(proposal.key)
+        moved = Appointment.objects.get(reassigned_from=self.appointment)
+        self.assertEqual((moved.doctor_id, moved.appointment_date, moved.appointment_time), (proposal.doctor_id, self.day, time(9)))
+        self.assertEqual(SlotCapacity.objects.get(doctor_id=proposal.doctor_id, date=self.day, start_time=time(9)).booked, 1)
+        self.assertTrue(DayOccupancy.objects.filter(doctor_id=proposal.doctor_id, date=self.day).exists())
+        slot = self.open_slot(time(9), doctor=moved.doctor)
+        self.assertEqual(slot.remaining, slot.capacity - 1)
+        self.assertEqual(list(displaced_appointments(self.leave)), [])
+
+    def test_changed_proposal_is_not_applied(self):
+        proposal = propose_reassignments(self.leave)[0][0]
+        self.post(f'{proposal.doctor_id}:{self.day.isoformat()}:11:30')
+        self.assertFalse(Appointment.objects.filter(reassigned_from=self.appointment).exists())
+
+
+class SeriesBookingTests(SchedulingMixin, TestCase):
+
+    def test_series_books_every_visit_in_bulk(self):
+        series, appointments = book_series(self.doctor, self.patients[0], self.day, time(10), 'weekly', 3)
+        dates = [self.day + timedelta(weeks=week) for week in range(3)]
+        self.assertEqual([appointment.appointment_date for appointment in series.appointments.order_by('appointment_date')], dates)
+        self.assertEqual({appointment.status for appointment in appointments}, {'confirmed'})
+        for date in dates:
+            self.assertEqual(SlotCapacity.objects.get(doctor=self.doctor, date=date, start_time=time(10)).booked, 1)
+            self.assertEqual(check_booking_window(self.doctor.id, date, time(10)).overlapping(), 1)
+        slot = self.open_slot(time(10))
+        self.assertEqual(slot.remaining, slot.capacity - 1)
+
+    def test_full_visit_rejects_the_whole_series(self):
+        for patient in self.patients[1:]:
+            self.book(patient, time(10), date=self.day + timedelta(weeks=1))
+        with self.assertRaises(BookingConflict) as raised:
+            book_series(self.doctor, self.patients[0], self.day, time(10), 'weekly', 3)
+        self.assertEqual(len(raised.exception.errors), 1)
+        self.assertFalse(Appointment.objects.filter(patient=self.patients[0]).exists())
+        self.assertFalse(AppointmentSeries.objects.exists())
+        self.assertFalse(SlotCapacity.objects.filter(doctor=self.doctor, date=self.day).exists())
+
+
+class NextAvailableTests(SchedulingMixin, TestCase):
+    """doctor1 is open every day, doctor2 only on self.day's weekday and doctor3 never"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.later = cls.make_doctor('doctor2')
+        AvailabilitySlot.objects.filter(doctor=cls.later).exclude(day_of_week=cls.day.weekday()).delete()
+        cls.idle = cls.make_doctor('doctor3')
+        AvailabilitySlot.objects.filter(doctor=cls.idle).delete()
+
+    def browse(self, **params):
+        self.client.force_login(self.patients[0])
+        response = self.client.get(reverse('browse_doctors'), params)
+        return [profile.user for profile in response.context['doctors']]
+
+    def test_soonest_sort_puts_doctors_without_slots_last(self):
+        doctors = self.browse(sort='soonest')
+        self.assertEqual(doctors[:2], [self.doctor, self.later])
+        self.assertLess(doctors.index(self.later), doctors.index(self.idle))
+
+    def test_available_filters_by_the_stored_first_slot(self):
+        self.assertEqual(self.browse(available='week'), [self.doctor, self.later])
+        self.assertEqual(self.browse(available='today'), [self.doctor])
+        self.assertEqual(len(self.browse(available='never')), DoctorProfile.objects.filter(is_approved=True).count())
+
+    def test_passed_first_slot_is_refreshed_on_browse(self):
+        DoctorProfile.objects.filter(user=self.later).update(next_available_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.browse(sort='soonest', available='today'), [self.doctor])
+        self.assertEqual(
+            DoctorProfile.objects.get(user=self.later).next_available_at,
+            timezone.make_aware(datetime.combine(self.day, time(9)))
+        )
+
+
+class AvailabilitySearchTests(SchedulingMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other_doctor = cls.make_doctor('doctor2', specialization='neurology')
+
+    def search(self, **params):
+        self.client.force_login(self.patients[0])
+        params.setdefault('date_from', self.day.isoformat())
+        params.setdefault('date_to', self.day.isoformat())
+        return self.client.get(reverse('search_availability_api'), params)
+
+    def test_cursor_walks_every_slot_once(self):
+        seen = []
+        cursor = ''
+        while True:
+            body = self.search(limit=5, cursor=cursor).json()
+            seen += [(row['start_time'], row['doctor_id']) for row in body['results']]
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 12)
+        self.assertEqual(seen, sorted(set(seen)))
+
+    def test_filters_and_bad_input(self):
+        body = self.search(specialization='neurology', time_from='10:00', time_to='11:00').json()
+        self.assertEqual(
+            [(row['doctor_id'], row['start_time']) for row in body['results']],
+            [(self.other_doctor.id, '10:00'), (self.other_doctor.id, '10:30')]
+        )
+        self.assertEqual(self.search(cursor='not-a-cursor').status_code, 400)
+        self.assertEqual(self.search(date_to=(self.day - timedelta(days=1)).isoformat()).status_code, 400)
+
+
+class LeaveApprovalTests(SchedulingMixin, TestCase):
+
+    def test_approval_cancels_the_range_in_bulk(self):
+        inside = [self.book(patient, time(9)) for patient in self.patients[:2]]
+        outside = self.book(self.patients[2], time(9), date=self.day + timedelta(days=1))
+        WaitlistEntry.objects.create(
+            doctor=self.doctor, patient=self.patients[3], date=self.day, window_start=time(9), window_end=time(9, 30)
+        )
+        leave = DoctorLeave.objects.create(doctor=self.doctor, start_date=self.day, end_date=self.day)
+
+        cancelled = approve_leave(leave)
+        self.assertEqual({appointment.id for appointment in cancelled}, {appointment.id for appointment in inside})
+        self.assertEqual(
+            set(Appointment.objects.filter(displaced_by=leave).values_list('status', flat=True)),
+            {'cancelled'}
+        )
+        outside.refresh_from_db()
+        self.assertEqual(outside.status, 'confirmed')
+        self.assertEqual(Notification.objects.filter(title='Appointment Cancelled').count(), 2)
+        self.assertFalse(DayOccupancy.objects.filter(doctor=self.doctor, date=self.day).exists())
+        self.assertEqual(SlotCapacity.objects.get(doctor=self.doctor, date=self.day, start_time=time(9)).booked, 0)
+        self.assertEqual(WaitlistEntry.objects.get(doctor=self.doctor).status, 'cancelled')
+        self.assertFalse(OpenSlot.objects.filter(doctor=self.doctor, date=self.day).exists())
+        self.assertEqual(DoctorProfile.objects.get(user=self.doctor).cancelled_appointments, 2)
+
+
+class AvailabilityCalendarTests(SchedulingMixin, TestCase):
+
+    def test_cached_calendar_follows_bookings_and_leave(self):
+        today = timezone.localdate()
+        calendar = {day['date']: day for day in get_availability_calendar(self.doctor.id)}
+        self.assertEqual(len(calendar), CALENDAR_DAYS)
+        self.assertEqual(calendar[self.day]['remaining'], 18)
+        with self.assertNumQueries(0):
+            get_availability_calendar(self.doctor.id)
+
+        self.book(self.patients[0], time(9))
+        calendar = {day['date']: day for day in get_availability_calendar(self.doctor.id)}
+        self.assertEqual((calendar[self.day]['appointments'], calendar[self.day]['remaining']), (1, 17))
+
+        DoctorLeave.objects.create(doctor=self.doctor, start_date=self.day, end_date=self.day, status='approved')
+        dates = [day['date'] for day in get_availability_calendar(self.doctor.id)]
+        self.assertNotIn(self.day, dates)
+        self.assertIn(today, dates)
+
+    def test_policy_edit_reaches_the_index_and_calendar(self):
+        self.assertEqual({day['date']: day for day in get_availability_calendar(self.doctor.id)}[self.day]['remaining'], 18)
+        profile = DoctorProfile.objects.get(user=self.doctor)
+        profile.slot_capacity = 4
+        profile.overbooking_allowance = 1
+        # Saved the way the admin's editable list saves it
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+
+        slot = self.open_slot(time(9))
+        self.assertEqual((slot.capacity, slot.remaining), (5, 5))
+        self.assertEqual({day['date']: day for day in get_availability_calendar(self.doctor.id)}[self.day]['remaining'], 30)
+
+
+class SlotStreamTests(SchedulingMixin, TestCase):
+
+    def test_merge_takes_the_earliest_open_records_lazily(self):
+        def stream(doctor_id, minute):
+            # Endless, so the merge must stop as soon as it has enough
+            for day in count():
+                yield SlotRecord(doctor_id, self.day + timedelta(days=day), time(9, minute), time(9, minute + 10), 1, day % 2)
+
+        records = merge_earliest([stream(1, 0), stream(2, 30)], 3)
+        self.assertEqual(
+            [(record.date - self.day, record.doctor_id) for record in records],
+            [(timedelta(days=1), 1), (timedelta(days=1), 2), (timedelta(days=3), 1)]
+        )
+
+    def test_collection_past_the_horizon_expands_live(self):
+        other = self.make_doctor('doctor2')
+        AvailabilitySlot.objects.filter(doctor=other).update(start_time=time(9, 15), end_time=time(12, 15))
+        far_day = get_horizon_end() + timedelta(days=5)
+        self.book(self.patients[0], time(9, 30), date=far_day)
+        records = collect_open_slots([self.doctor.id, other.id], far_day, far_day, 4)
+        self.assertEqual(
+            [(record.doctor_id, record.start_time, record.remaining) for record in records],
+            [(self.doctor.id, time(9), 3), (other.id, time(9, 15), 3), (self.doctor.id, time(9, 30), 2), (other.id, time(9, 45), 3)]
+        )
+
+
+class SuggestSlotQueryBudgetTests(SchedulingMixin, TestCase):
+
+    def suggest_counting_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(
+                reverse('chatbot_suggest_slot'),
+                json.dumps({'specialization': 'cardiology', 'query': 'evening'}),
+                content_type='application/json'
+            )
+        self.assertEqual(len(response.json()['slots']), 3)
+        self.assertLessEqual(
+            len(context), SUGGEST_SLOT_QUERY_BUDGET,
+            '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        return len(context)
+
+    def test_query_count_does_not_grow_with_doctors(self):
+        self.client.force_login(self.patients[0])
+        before = self.suggest_counting_queries()
+        for index in range(5):
+            self.make_doctor(f'extra{index}')
+        self.assertEqual(self.suggest_counting_queries(), before)
@@ -12,10 +12,14 @@ urlpatterns = [
     path('<int:appointment_id>/cancel/', views.cancel_appointment, name='cancel_appointment'),
     path('<int:appointment_id>/complete/', views.complete_appointment, name='complete_appointment'),
     path('availability/', views.manage_availability, name='manage_availability'),
+    path('api/weekly-schedule/', views.weekly_schedule_api, name='weekly_schedule_api'),
     path('<int:appointment_id>/prescription/', views.add_prescription, name='add_prescription'),
     path('<int:appointment_id>/prescription/edit/', views.edit_prescription, name='edit_prescription'),
     path('<int:appointment_id>/prescription/download/', views.download_prescription, name='download_prescription'),
+    path('waitlist/<int:entry_id>/leave/', views.leave_waitlist_entry, name='leave_waitlist_entry'),
     path('leave/request/', views.request_leave, name='request_leave'),
     path('leave/manage/', views.manage_leave_requests, name='manage_leave_requests'),
+    path('leave/<int:leave_id>/reassign/', views.leave_reassignments, name='leave_reassignments'),
+    path('api/availability/search/', views.search_availability_api, name='search_availability_api'),
     path('api/template-items/<int:template_id>/', views.get_template_items, name='get_template_items'),
 ]
\ No newline at end of file
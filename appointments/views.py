@@ -1,7 +1,8 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.http import JsonResponse, HttpResponse
@@ -11,18 +12,37 @@ from datetime import datetime, timedelta, time
 from django.contrib.auth import get_user_model
 import json
 import re
-from .models import Appointment, AvailabilitySlot, Prescription, PrescriptionTemplate, PrescriptionTemplateItem, DoctorLeave
+from .models import Appointment, AvailabilitySlot, Prescription, PrescriptionTemplate, PrescriptionTemplateItem, DoctorLeave, WaitlistEntry
 from .forms import AppointmentBookingForm, AvailabilitySlotForm, PrescriptionForm, AppointmentStatusForm, PrescriptionItemFormSet, DoctorLeaveForm
+from .slots import refresh_next_available
+from .suggestions import doctor_scope, specialization_scope, suggested_open_slots
+from .availability import get_availability_calendar
+from .occupancy import check_booking_window
+from .booking import BookingConflict, book_appointment_slot
+from .policy import resolve_policy
+from .holds import holds_fill_slot, place_holds, release_holds
+from .waitlist import join_waitlist, leave_waitlist
+from .leave import approve_leave
+from .reassign import apply_reassignments, displaced_appointments, propose_reassignments
+from .series import book_series
+from .ranking import TIME_OF_DAY, doctor_utilization, rank_slots, slots_near
+from .search import SearchError, parse_search_params, search_open_slots
+from .schedule import ScheduleError, merge_into_schedule, parse_weekly_template, replace_weekly_schedule, serialize_schedule
 from accounts.models import DoctorProfile
+from medical_connect.ratelimit import rate_limit
 from messaging.models import Notification, Conversation
 
 CustomUser = get_user_model()
 
+AVAILABLE_WITHIN_DAYS = {'today': 1, 'week': 7}
+
 @login_required(login_url='login')
 def browse_doctors(request):
     """Browse and search doctors"""
     specialization = request.GET.get('specialization', '').strip()
     search = request.GET.get('search', '').strip()
+    sort = request.GET.get('sort', '').strip()
+    available_within = request.GET.get('available', '').strip()
 
     doctors = DoctorProfile.objects.filter(is_approved=True).select_related('user')
 
@@ -51,51 +71,47 @@ def browse_doctors(request):
 
         doctors = doctors.filter(search_filters)
 
+    now = timezone.now()
+    available_before = None
+    if available_within in AVAILABLE_WITHIN_DAYS:
+        available_before = now + timedelta(days=AVAILABLE_WITHIN_DAYS[available_within])
+        doctors = doctors.filter(next_available_at__isnull=False, next_available_at__lt=available_before)
+    if sort == 'soonest':
+        doctors = doctors.order_by(F('next_available_at').asc(nulls_last=True), '-rating')
+
     # Force evaluation to avoid lazy evaluation issues with renamed field
     doctors = list(doctors)
 
+    # Slots that passed since the last write are refreshed here rather than on a timer
+    stale_ids = [doctor.user_id for doctor in doctors if doctor.next_available_at and doctor.next_available_at <= now]
+    if stale_ids:
+        earliest = refresh_next_available(stale_ids)
+        for doctor in doctors:
+            if doctor.user_id in stale_ids:
+                doctor.next_available_at = earliest.get(doctor.user_id)
+        if available_before:
+            doctors = [doctor for doctor in doctors if doctor.next_available_at and doctor.next_available_at < available_before]
+        if sort == 'soonest':
+            doctors.sort(key=lambda doctor: (doctor.next_available_at is None, doctor.next_available_at or now, -doctor.rating))
+
     context = {
         'doctors': doctors,
         'specializations': DoctorProfile._meta.get_field('specialization').choices,
         'search': search,
-        'specialization': specialization
+        'specialization': specialization,
+        'sort': sort,
+        'available_within': available_within
     }
     return render(request, 'appointments/browse_doctors.html', context)
 
 @login_required(login_url='login')
 def doctor_detail(request, doctor_id):
     """View doctor profile and available slots"""
-    doctor_profile = get_object_or_404(DoctorProfile, user_id=doctor_id, is_approved=True)
+    doctor_profile = get_object_or_404(DoctorProfile.objects.select_related('user'), user_id=doctor_id, is_approved=True)
     doctor = doctor_profile.user
     
-    # Get available slots for next 30 days
-    today = timezone.now().date()
-    available_dates = []
-    
-    for i in range(30):
-        date = today + timedelta(days=i)
-        day_of_week = date.weekday()
-        
-        # Check if doctor has availability for this day
-        slots = AvailabilitySlot.objects.filter(
-            doctor=doctor,
-            day_of_week=day_of_week,
-            is_active=True
-        )
-        
-        if slots.exists():
-            # Check if there are available appointments
-            existing_appointments = Appointment.objects.filter(
-                doctor=doctor,
-                appointment_date=date,
-                status__in=['confirmed', 'pending']
-            ).count()
-            
-            available_dates.append({
-                'date': date,
-                'appointments': existing_appointments,
-                'slots_available': True
-            })
+    # Remaining capacity per day for the next 30 days (cached per doctor)
+    available_dates = get_availability_calendar(doctor.id)
     
     context = {
         'doctor': doctor,
@@ -127,26 +143,48 @@ def book_appointment(request, doctor_id):
                 messages.error(request, 'You cannot book an appointment in the past.')
                 return redirect('book_appointment', doctor_id=doctor_id)
             
-            # Calculate end_time (default 30 minutes consultation)
-            start_time = appointment.appointment_time
-            end_datetime = datetime.combine(datetime.today(), start_time) + timedelta(minutes=30)
-            appointment.end_time = end_datetime.time()
+            repeat = form.cleaned_data['repeat']
+            if repeat != AppointmentBookingForm.REPEAT_NONE:
+                try:
+                    series, series_appointments = book_series(
+                        doctor, request.user, appointment_date, appointment_time,
+                        repeat, form.cleaned_data['occurrences'], appointment.reason
+                    )
+                except BookingConflict as exc:
+                    for error in exc.errors:
+                        messages.error(request, error)
+                    return redirect('book_appointment', doctor_id=doctor_id)
+                release_holds(request.user)
+                messages.success(request, f'{len(series_appointments)} recurring appointments booked successfully!')
+                return redirect('my_appointments')
             
-            # Check if slot already exists
-            slot_bookings = Appointment.objects.filter(
-                doctor=doctor,
-                appointment_date=appointment.appointment_date,
-                appointment_time=appointment.appointment_time,
-                status__in=['confirmed', 'pending']
-            ).count()
+            # Appointment length comes from the covering availability slot
+            window = check_booking_window(doctor.id, appointment_date, appointment_time)
+            if window.on_leave:
+                messages.error(request, 'The doctor is on leave on the selected date.')
+                return redirect('book_appointment', doctor_id=doctor_id)
+            if not window.fits_schedule:
+                messages.error(request, 'The selected time is outside the doctor\'s availability.')
+                return redirect('book_appointment', doctor_id=doctor_id)
+            appointment.end_time = window.end_time
             
-            if slot_bookings >= 3:
-                messages.error(request, 'This time slot is already booked.')
+            policy = resolve_policy(doctor.id, appointment_date, appointment_time)
+            if holds_fill_slot(doctor.id, appointment_date, appointment_time, request.user, policy.max_bookings - window.overlapping()):
+                messages.error(request, 'This time slot is being held for another patient. Please choose another time.')
                 return redirect('book_appointment', doctor_id=doctor_id)
+            if window.conflicts(policy.max_bookings) or not book_appointment_slot(appointment, policy):
+                # Queue the patient so a cancellation books them without polling
+                entry, created = join_waitlist(
+                    doctor, request.user, appointment_date, appointment_time, window.end_time, appointment.reason
+                )
+                if created:
+                    messages.info(request, 'This time slot is already booked. You have been added to the waitlist and will be booked automatically if it frees up.')
+                else:
+                    messages.info(request, 'This time slot is already booked. You are already on the waitlist for it.')
+                return redirect('my_appointments')
+            release_holds(request.user)
             
-            if slot_bookings < 2:
-                appointment.status = 'confirmed'
-                appointment.save()
+            if appointment.status == 'confirmed':
                 Notification.objects.create(
                     user=doctor,
                     notification_type='appointment_confirmed',
@@ -156,8 +194,6 @@ def book_appointment(request, doctor_id):
                 )
                 messages.success(request, 'Appointment booked and confirmed!')
             else:
-                appointment.status = 'pending'
-                appointment.save()
                 Notification.objects.create(
                     user=doctor,
                     notification_type='appointment_request',
@@ -190,8 +226,17 @@ def my_appointments(request):
     
     appointments = appointments.order_by('-appointment_date', '-appointment_time')
     
+    waitlist_entries = WaitlistEntry.objects.none()
+    if request.user.role == 'patient':
+        waitlist_entries = WaitlistEntry.objects.filter(
+            patient=request.user,
+            status='waiting',
+            date__gte=timezone.localdate()
+        ).select_related('doctor').order_by('date', 'window_start')
+    
     context = {
         'appointments': appointments,
+        'waitlist_entries': waitlist_entries,
         'status_choices': Appointment._meta.get_field('status').choices,
         'current_status': status_filter
     }
@@ -259,32 +304,28 @@ def manage_availability(request):
             slot_duration = form.cleaned_data['slot_duration']
             is_active = form.cleaned_data['is_active']
             apply_everyday = getattr(form, 'apply_everyday', False)
-            if apply_everyday:
-                for day, _ in AvailabilitySlot.DAYS_OF_WEEK:
-                    AvailabilitySlot.objects.update_or_create(
-                        doctor=request.user,
-                        day_of_week=day,
-                        start_time=start_time,
-                        defaults={
-                            'end_time': end_time,
-                            'slot_duration': slot_duration,
-                            'is_active': is_active,
-                        }
-                    )
-                messages.success(request, 'Availability slots updated for every day.')
-            else:
-                AvailabilitySlot.objects.update_or_create(
-                    doctor=request.user,
-                    day_of_week=day_value,
+            days = [day for day, _ in AvailabilitySlot.DAYS_OF_WEEK] if apply_everyday else [day_value]
+            new_slots = [
+                AvailabilitySlot(
+                    day_of_week=day,
                     start_time=start_time,
-                    defaults={
-                        'end_time': end_time,
-                        'slot_duration': slot_duration,
-                        'is_active': is_active,
-                    }
+                    end_time=end_time,
+                    slot_duration=slot_duration,
+                    is_active=is_active
                 )
-                messages.success(request, 'Availability slot saved successfully!')
-            return redirect('manage_availability')
+                for day in days
+            ]
+            try:
+                merge_into_schedule(request.user, new_slots)
+            except ScheduleError as exc:
+                for error in exc.errors:
+                    form.add_error(None, error)
+            else:
+                if apply_everyday:
+                    messages.success(request, 'Availability slots updated for every day.')
+                else:
+                    messages.success(request, 'Availability slot saved successfully!')
+                return redirect('manage_availability')
     else:
         form = AvailabilitySlotForm()
     
@@ -294,6 +335,47 @@ def manage_availability(request):
     }
     return render(request, 'appointments/manage_availability.html', context)
 
+@login_required(login_url='login')
+def weekly_schedule_api(request):
+    """Read or replace a doctor's whole weekly availability template as JSON.
+
+    Doctors edit their own week; admins pass ``doctor_id`` to onboard others.
+    POST accepts ``{"slots": [...], "replace": true}``; with ``replace`` false
+    the slots are merged into the existing week instead.
+    """
+    if request.user.role not in ('doctor', 'admin'):
+        return JsonResponse({'status': 'error', 'message': 'Only doctors can manage availability.'}, status=403)
+    data = {}
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body.decode('utf-8'))
+        except (json.JSONDecodeError, AttributeError):
+            return JsonResponse({'status': 'error', 'message': 'Invalid request data.'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'status': 'error', 'message': 'Invalid request data.'}, status=400)
+    elif request.method != 'GET':
+        return JsonResponse({'status': 'error', 'message': 'Method not allowed.'}, status=405)
+    doctor = request.user
+    if request.user.role == 'admin':
+        try:
+            doctor_id = int(data.get('doctor_id') or request.GET.get('doctor_id'))
+        except (TypeError, ValueError):
+            return JsonResponse({'status': 'error', 'message': 'Doctor information is missing.'}, status=400)
+        doctor = get_object_or_404(CustomUser, id=doctor_id, role='doctor')
+    if request.method == 'POST':
+        entries = data.get('slots')
+        if not isinstance(entries, list):
+            return JsonResponse({'status': 'error', 'message': 'Provide the week as a list of slots.'}, status=400)
+        try:
+            new_slots = parse_weekly_template(entries)
+            if data.get('replace', True):
+                replace_weekly_schedule(doctor, new_slots)
+            else:
+                merge_into_schedule(doctor, new_slots)
+        except ScheduleError as exc:
+            return JsonResponse({'status': 'error', 'message': str(exc), 'errors': exc.errors}, status=400)
+    return JsonResponse({'status': 'success', 'doctor_id': doctor.id, 'slots': serialize_schedule(doctor)})
+
 @login_required(login_url='login')
 def add_prescription(request, appointment_id):
     """Add prescription to appointment"""
@@ -486,6 +568,15 @@ def complete_appointment(request, appointment_id):
     return redirect('appointment_detail', appointment_id=appointment.id)
 
 
+@login_required(login_url='login')
+@require_POST
+def leave_waitlist_entry(request, entry_id):
+    """Remove a patient from a slot's waitlist"""
+    entry = get_object_or_404(WaitlistEntry, id=entry_id, patient=request.user, status='waiting')
+    leave_waitlist(entry)
+    messages.success(request, 'You have left the waitlist.')
+    return redirect('my_appointments')
+
 @login_required(login_url='login')
 def cancel_appointment(request, appointment_id):
     """Cancel an appointment"""
@@ -549,56 +640,36 @@ def _parse_preferred_date(data, query, today):
     return preferred_date
 
 
-def _collect_available_slots(profiles, start_date, today):
-    available_slots = []
-    now_time = timezone.localtime().time()
-    for profile in profiles:
-        doctor = profile.user
-        slots_qs = AvailabilitySlot.objects.filter(doctor=doctor, is_active=True)
-        if not slots_qs.exists():
-            continue
-        for day_offset in range(0, 14):
-            current_date = start_date + timedelta(days=day_offset)
-            if current_date < today:
-                continue
-            day_slots = slots_qs.filter(day_of_week=current_date.weekday())
-            if not day_slots.exists():
-                continue
-            existing_times = set(
-                Appointment.objects.filter(
-                    doctor=doctor,
-                    appointment_date=current_date,
-                    status__in=['pending', 'confirmed']
-                ).values_list('appointment_time', flat=True)
-            )
-            for slot in day_slots:
-                step = slot.slot_duration if slot.slot_duration else 30
-                if step <= 0:
-                    step = 30
-                start_dt = datetime.combine(current_date, slot.start_time)
-                end_dt = datetime.combine(current_date, slot.end_time)
-                current_dt = start_dt
-                while current_dt + timedelta(minutes=step) <= end_dt:
-                    slot_time = current_dt.time()
-                    if slot_time in existing_times:
-                        current_dt += timedelta(minutes=step)
-                        continue
-                    if current_date == today and slot_time <= now_time:
-                        current_dt += timedelta(minutes=step)
-                        continue
-                    available_slots.append({
-                        'doctor': doctor,
-                        'profile': profile,
-                        'date': current_date,
-                        'time': slot_time
-                    })
-                    if len(available_slots) >= 30:
-                        return available_slots
-                    current_dt += timedelta(minutes=step)
-    return available_slots
+def _parse_preferred_time(data, query):
+    time_str = data.get('preferred_time')
+    if time_str:
+        try:
+            return datetime.strptime(time_str, '%H:%M').time()
+        except (TypeError, ValueError):
+            pass
+    for word, (hour, minute) in TIME_OF_DAY.items():
+        if word in query:
+            return time(hour, minute)
+    return None
+
+
+def _collect_available_slots(profile_map, start_date, today, scope, user=None, preferred_at=None):
+    """The earliest open slots, plus those around preferred_at when a time was asked for"""
+    if not profile_map:
+        return []
+    end_date = start_date + timedelta(days=13)
+    open_slots = suggested_open_slots(scope, profile_map.keys(), max(start_date, today), end_date, 30, user)
+    if preferred_at:
+        seen = {(slot.doctor_id, slot.date, slot.start_time) for slot in open_slots}
+        open_slots += [
+            slot for slot in slots_near(profile_map.keys(), preferred_at, end_date, user)
+            if (slot.doctor_id, slot.date, slot.start_time) not in seen
+        ]
+    return [open_slot for open_slot in open_slots if open_slot.doctor_id in profile_map]
 
 
 @require_POST
+@rate_limit('chatbot_suggest', ip='30/m', user='20/m', anonymous='6/m')
 def chatbot_suggest_slot(request):
     try:
         data = json.loads(request.body.decode('utf-8'))
@@ -608,6 +679,7 @@ def chatbot_suggest_slot(request):
     query = (data.get('query') or '').lower().strip()
     today = timezone.localdate()
     preferred_date = _parse_preferred_date(data, query, today)
+    preferred_time = _parse_preferred_time(data, query)
     start_date = preferred_date or today
     doctor_id = data.get('doctor_id')
     try:
@@ -619,18 +691,35 @@ def chatbot_suggest_slot(request):
         profiles = profiles.filter(user_id=doctor_id)
     if specialization and specialization != 'any':
         profiles = profiles.filter(specialization=specialization)
+    profile_map = {profile.user_id: profile for profile in profiles}
     doctor_profile = None
     if doctor_id:
-        doctor_profile = profiles.first()
+        doctor_profile = profile_map.get(doctor_id)
         if not doctor_profile:
             message = "This doctor has no availability right now. Please try another day."
             return JsonResponse({'status': 'empty', 'message': message, 'slots': []})
     specialization_map = dict(DoctorProfile.SPECIALIZATION_CHOICES)
-    if not doctor_id and not profiles.exists():
+    if not profile_map:
         message = "No doctors are available right now. Please try again soon."
         return JsonResponse({'status': 'empty', 'message': message, 'slots': []})
-    available_slots = _collect_available_slots(profiles, start_date, today)
-    if not available_slots:
+    if doctor_id:
+        scope = doctor_scope(doctor_id)
+    else:
+        scope = specialization_scope(specialization if specialization != 'any' else None)
+    now = timezone.localtime().replace(tzinfo=None)
+    if preferred_time:
+        preferred_at = datetime.combine(start_date, preferred_time)
+        if not preferred_date and preferred_at < now:
+            preferred_at += timedelta(days=1)
+    elif preferred_date and preferred_date > today:
+        preferred_at = datetime.combine(preferred_date, time.min)
+    else:
+        preferred_at = now
+    candidates = _collect_available_slots(
+        profile_map, start_date, today, scope, request.user,
+        preferred_at=preferred_at if preferred_time else None
+    )
+    if not candidates:
         if doctor_profile:
             doctor_label = doctor_profile.user.get_full_name() or doctor_profile.user.username
             message = f"No open slots found for {doctor_label} in the next two weeks. Please try a different date."
@@ -638,25 +727,17 @@ def chatbot_suggest_slot(request):
             label = specialization_map.get(specialization, 'Doctors') if specialization else 'Doctors'
             message = f"No open slots found for {label.lower()} in the next two weeks. Please try a different specialty or time."
         return JsonResponse({'status': 'empty', 'message': message, 'slots': []})
-    available_slots.sort(key=lambda item: (item['date'], item['time']))
-    selected_indices = []
-    seen_doctors = set()
-    for index, item in enumerate(available_slots):
-        doctor_identifier = item['doctor'].id
-        if doctor_identifier in seen_doctors:
-            continue
-        seen_doctors.add(doctor_identifier)
-        selected_indices.append(index)
-        if len(selected_indices) == 3:
-            break
-    if len(selected_indices) < 3:
-        for index in range(len(available_slots)):
-            if index in selected_indices:
-                continue
-            selected_indices.append(index)
-            if len(selected_indices) == 3:
-                break
-    top_slots = [available_slots[index] for index in selected_indices]
+    utilization = doctor_utilization(profile_map.keys(), max(start_date, today), start_date + timedelta(days=13))
+    top_slots = [
+        {
+            'doctor': profile_map[slot.doctor_id].user,
+            'profile': profile_map[slot.doctor_id],
+            'date': slot.date,
+            'time': slot.start_time
+        }
+        for slot in rank_slots(candidates, profile_map, preferred_at, utilization)
+    ]
+    place_holds(request.user, [(item['doctor'].id, item['date'], item['time']) for item in top_slots])
     slots_response = []
     unique_doctors = set()
     for item in top_slots:
@@ -702,6 +783,7 @@ def chatbot_suggest_slot(request):
 
 @login_required(login_url='login')
 @require_POST
+@rate_limit('chatbot_book', user='10/m')
 def chatbot_book_appointment(request):
     if request.user.role != 'patient':
         return JsonResponse({'status': 'error', 'message': 'Only patients can book appointments.'}, status=403)
@@ -733,30 +815,71 @@ def chatbot_book_appointment(request):
     appointment = form.save(commit=False)
     appointment.doctor = doctor
     appointment.patient = request.user
-    start_time = appointment.appointment_time
-    end_datetime = datetime.combine(datetime.today(), start_time) + timedelta(minutes=30)
-    appointment.end_time = end_datetime.time()
-    existing = Appointment.objects.filter(
-        doctor=doctor,
-        appointment_date=appointment.appointment_date,
-        appointment_time=appointment.appointment_time,
-        status__in=['confirmed', 'pending']
-    ).exists()
-    if existing:
+    window = check_booking_window(doctor.id, appointment.appointment_date, appointment.appointment_time)
+    if window.on_leave:
+        return JsonResponse({'status': 'error', 'message': 'The doctor is on leave on the selected date.'}, status=400)
+    if not window.fits_schedule:
+        return JsonResponse({'status': 'error', 'message': 'The selected time is outside the doctor\'s availability.'}, status=400)
+    appointment.end_time = window.end_time
+    policy = resolve_policy(doctor.id, appointment.appointment_date, appointment.appointment_time)
+    if holds_fill_slot(doctor.id, appointment.appointment_date, appointment.appointment_time, request.user, policy.max_bookings - window.overlapping()):
+        return JsonResponse({'status': 'error', 'message': 'This time slot is being held for another patient.'}, status=409)
+    if window.conflicts(policy.max_bookings) or not book_appointment_slot(appointment, policy):
         return JsonResponse({'status': 'error', 'message': 'This time slot is already booked.'}, status=409)
-    appointment.save()
-    Notification.objects.create(
-        user=doctor,
-        notification_type='appointment_request',
-        title='New Appointment Request',
-        description=f'{request.user.get_full_name()} has requested an appointment',
-        related_appointment=appointment
-    )
-    messages.success(request, 'Appointment booked successfully! Awaiting confirmation.')
+    release_holds(request.user)
+    if appointment.status == 'confirmed':
+        Notification.objects.create(
+            user=doctor,
+            notification_type='appointment_confirmed',
+            title='New Appointment Confirmed',
+            description=f'{request.user.get_full_name()} auto-confirmed an appointment',
+            related_appointment=appointment
+        )
+        messages.success(request, 'Appointment booked and confirmed!')
+    else:
+        Notification.objects.create(
+            user=doctor,
+            notification_type='appointment_request',
+            title='New Appointment Request',
+            description=f'{request.user.get_full_name()} has requested an appointment',
+            related_appointment=appointment
+        )
+        messages.success(request, 'Appointment booked successfully! Awaiting confirmation.')
     redirect_url = reverse('my_appointments')
     return JsonResponse({'status': 'success', 'message': 'Appointment booked successfully!', 'redirect_url': redirect_url})
 
 
+@login_required(login_url='login')
+@rate_limit('availability_search', user='60/m', methods=('GET',))
+def search_availability_api(request):
+    """Open slots across doctors filtered by specialization, dates, time of day, fee and experience"""
+    try:
+        filters = parse_search_params(request.GET)
+    except SearchError as exc:
+        return JsonResponse({'status': 'error', 'message': str(exc)}, status=400)
+    page, next_cursor, horizon_end = search_open_slots(user=request.user, **filters)
+    results = []
+    for slot in page:
+        profile = slot.doctor.doctor_profile
+        results.append({
+            'doctor_id': slot.doctor_id,
+            'doctor_name': slot.doctor.get_full_name(),
+            'specialization': profile.get_specialization_display(),
+            'consultation_fee': str(profile.consultation_fee),
+            'experience_years': profile.experience_years,
+            'date': slot.date.isoformat(),
+            'start_time': slot.start_time.strftime('%H:%M'),
+            'end_time': slot.end_time.strftime('%H:%M'),
+            'remaining': slot.remaining,
+            'booking_url': reverse('book_appointment', args=[slot.doctor_id]),
+        })
+    return JsonResponse({
+        'status': 'success',
+        'results': results,
+        'next_cursor': next_cursor,
+        'horizon_end': horizon_end.isoformat(),
+    })
+
 @login_required(login_url='login')
 def get_template_items(request, template_id):
     if request.user.role != 'doctor':
@@ -813,7 +936,21 @@ def manage_leave_requests(request):
         messages.error(request, 'You do not have permission to manage leave requests.')
         return redirect('dashboard')
 
-    leave_requests = DoctorLeave.objects.select_related('doctor').order_by('-created_at')
+    affected = Appointment.objects.filter(
+        doctor_id=OuterRef('doctor_id'),
+        appointment_date__gte=OuterRef('start_date'),
+        appointment_date__lte=OuterRef('end_date'),
+        status__in=['pending', 'confirmed']
+    ).order_by().values('doctor_id').annotate(total=Count('id')).values('total')
+    unassigned = Appointment.objects.filter(
+        displaced_by=OuterRef('pk'),
+        status='cancelled',
+        reassignments__isnull=True
+    ).order_by().values('displaced_by').annotate(total=Count('id')).values('total')
+    leave_requests = DoctorLeave.objects.select_related('doctor').annotate(
+        affected_count=Coalesce(Subquery(affected), 0),
+        unassigned_count=Coalesce(Subquery(unassigned), 0)
+    ).order_by('-created_at')
 
     if request.method == 'POST':
         leave_id = request.POST.get('leave_id')
@@ -821,15 +958,12 @@ def manage_leave_requests(request):
         leave = get_object_or_404(DoctorLeave, id=leave_id)
 
         if action == 'approve':
-            leave.status = 'approved'
-            leave.save()
-            Notification.objects.create(
-                user=leave.doctor,
-                notification_type='doctor_approved',
-                title='Leave Request Approved',
-                description=f'Your leave request from {leave.start_date} to {leave.end_date} has been approved.',
-            )
-            messages.success(request, 'Leave request approved.')
+            cancelled = approve_leave(leave)
+            if cancelled:
+                messages.success(request, f'Leave request approved. {len(cancelled)} affected appointment(s) were cancelled and the patients notified.')
+                return redirect('leave_reassignments', leave_id=leave.id)
+            else:
+                messages.success(request, 'Leave request approved.')
         elif action == 'reject':
             leave.status = 'rejected'
             leave.save()
@@ -850,3 +984,49 @@ def manage_leave_requests(request):
     return render(request, 'appointments/manage_leave_requests.html', context)
 
 
+@login_required(login_url='login')
+def leave_reassignments(request, leave_id):
+    """Admin view to move patients displaced by a leave to same-specialty doctors"""
+    if request.user.role != 'admin':
+        messages.error(request, 'You do not have permission to manage leave requests.')
+        return redirect('dashboard')
+
+    leave = get_object_or_404(DoctorLeave.objects.select_related('doctor'), id=leave_id, status='approved')
+    proposals, unmatched = propose_reassignments(leave, displaced_appointments(leave))
+
+    if request.method == 'POST':
+        accepted_ids = set(request.POST.getlist('accept'))
+        accepted = [proposal for proposal in proposals if str(proposal.appointment.id) in accepted_ids]
+        if not accepted_ids:
+            messages.error(request, 'Select at least one reassignment to apply.')
+            return redirect('leave_reassignments', leave_id=leave.id)
+        # Proposals are recomputed per request; only apply the slots the admin actually saw
+        if len(accepted) != len(accepted_ids) or any(
+            request.POST.get(f'slot_{proposal.appointment.id}') != proposal.key for proposal in accepted
+        ):
+            messages.error(request, 'Some proposals changed since the page was loaded. Please review them and apply again.')
+            return redirect('leave_reassignments', leave_id=leave.id)
+        try:
+            apply_reassignments(accepted)
+        except BookingConflict as exc:
+            for error in exc.errors:
+                messages.error(request, error)
+            return redirect('leave_reassignments', leave_id=leave.id)
+        messages.success(request, f'{len(accepted)} appointment(s) were reassigned and the patients notified.')
+        return redirect('manage_leave_requests')
+
+    doctors = {
+        user.id: user
+        for user in CustomUser.objects.filter(id__in={proposal.doctor_id for proposal in proposals})
+    }
+    for proposal in proposals:
+        proposal.doctor = doctors[proposal.doctor_id]
+    context = {
+        'leave': leave,
+        'proposals': proposals,
+        'unmatched': unmatched,
+        'title': 'Reassign Displaced Appointments'
+    }
+    return render(request, 'appointments/leave_reassignments.html', context)
+
+
@@ -0,0 +1,109 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from messaging.models import Notification
+from .models import Appointment, WaitlistEntry
+from .blackout import load_blackout_calendar
+from .booking import reserve_slot
+from .occupancy import interval_mask, load_day_occupancy, load_schedule
+from .policy import policy_for
+
+ACTIVE_STATUSES = ['pending', 'confirmed']
+
+
+def join_waitlist(doctor, patient, date, window_start, window_end, reason=''):
+    """Queue a patient for a full slot; returns (entry, created)"""
+    return WaitlistEntry.objects.get_or_create(
+        doctor=doctor,
+        patient=patient,
+        date=date,
+        window_start=window_start,
+        status='waiting',
+        defaults={'window_end': window_end, 'reason': reason}
+    )
+
+
+def promote_waitlist(doctor_id, date):
+    """Book waiting patients into places freed on a doctor's day.
+
+    Entries are tried in priority then FIFO order inside one transaction;
+    each promotion takes its place through the slot counter, and all
+    notifications go out in a single bulk insert. Returns the promoted
+    entries.
+    """
+    if date < timezone.localdate() or load_blackout_calendar(doctor_id).is_blocked(date):
+        return []
+    doctor = get_user_model().objects.select_related('doctor_profile').filter(id=doctor_id).first()
+    if doctor is None:
+        return []
+    profile = getattr(doctor, 'doctor_profile', None)
+    schedule = load_schedule(doctor_id)
+    promoted = []
+    notifications = []
+    with transaction.atomic():
+        already_booked = Appointment.objects.filter(
+            doctor_id=OuterRef('doctor_id'),
+            patient_id=OuterRef('patient_id'),
+            appointment_date=OuterRef('date'),
+            appointment_time=OuterRef('window_start'),
+            status__in=ACTIVE_STATUSES
+        )
+        entries = list(
+            WaitlistEntry.objects.select_for_update(skip_locked=True)
+            .filter(doctor_id=doctor_id, date=date, status='waiting')
+            .exclude(Exists(already_booked))
+            .select_related('patient')
+            .order_by('-priority', 'created_at')
+        )
+        if not entries:
+            return []
+        occupancy = load_day_occupancy(doctor_id, date)
+        for entry in entries:
+            policy = policy_for(profile, schedule, date, entry.window_start)
+            mask = interval_mask(entry.window_start, entry.window_end)
+            if occupancy.conflicts(mask, policy.max_bookings):
+                continue
+            position = reserve_slot(doctor_id, date, entry.window_start, policy.max_bookings)
+            if position is None:
+                continue
+            appointment = Appointment(
+                doctor=doctor,
+                patient=entry.patient,
+                appointment_date=date,
+                appointment_time=entry.window_start,
+                end_time=entry.window_end,
+                reason=entry.reason,
+                status=policy.status_for(position)
+            )
+            appointment._slot_counted = True
+            appointment.save()
+            occupancy.add(mask)
+            entry.status = 'promoted'
+            entry.appointment = appointment
+            # bulk_update writes the field as given; auto_now only applies on save()
+            entry.updated_at = timezone.now()
+            promoted.append(entry)
+            notifications.append(Notification(
+                user=entry.patient,
+                notification_type='appointment_confirmed' if appointment.status == 'confirmed' else 'appointment_request',
+                title='Waitlist Spot Opened',
+                description=f'A place opened with Dr. {doctor.get_full_name()} on {date} at {entry.window_start.strftime("%H:%M")}. Your appointment is now {appointment.status}.',
+                related_appointment=appointment
+            ))
+            notifications.append(Notification(
+                user=doctor,
+                notification_type='appointment_request',
+                title='Waitlisted Patient Booked',
+                description=f'{entry.patient.get_full_name()} was booked from the waitlist for {date}.',
+                related_appointment=appointment
+            ))
+        if promoted:
+            WaitlistEntry.objects.bulk_update(promoted, ['status', 'appointment', 'updated_at'])
+            Notification.objects.bulk_create(notifications)
+    return promoted
+
+
+def leave_waitlist(entry):
+    entry.status = 'cancelled'
+    entry.save(update_fields=['status', 'updated_at'])
@@ -0,0 +1,110 @@
+from collections import Counter, defaultdict
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Q
+from accounts.models import DoctorProfile
+from appointments.models import Appointment
+from .models import PlatformCounters
+
+COUNTERS_PK = 1
+ROLE_FIELDS = {'doctor': 'doctors', 'patient': 'patients', 'admin': 'admins'}
+STATUS_FIELDS = {value: f'appointments_{value}' for value, _ in Appointment.STATUS_CHOICES}
+# DoctorProfile counter for each status that has one; every appointment also counts in the total
+DOCTOR_STATUS_FIELDS = {'completed': 'completed_appointments', 'cancelled': 'cancelled_appointments'}
+
+
+def get_platform_counters():
+    """The global counters row, by primary key"""
+    counters, _ = PlatformCounters.objects.get_or_create(pk=COUNTERS_PK)
+    return counters
+
+
+def _bump_platform(deltas):
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    updated = PlatformCounters.objects.filter(pk=COUNTERS_PK).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    if not updated:
+        # First write on an empty table: start from the true totals instead
+        reconcile_platform_counters()
+
+
+def count_appointment_changes(changes):
+    """Apply (doctor_id, status, delta) changes to the doctor and global counters.
+
+    Call it inside the transaction of the write so the counters commit or
+    roll back with it. Doctors sharing the same deltas are updated with
+    one UPDATE, so bulk writes cost a handful of statements.
+    """
+    per_doctor = defaultdict(Counter)
+    per_status = Counter()
+    for doctor_id, status, delta in changes:
+        per_doctor[doctor_id]['total_appointments'] += delta
+        if status in DOCTOR_STATUS_FIELDS:
+            per_doctor[doctor_id][DOCTOR_STATUS_FIELDS[status]] += delta
+        if status in STATUS_FIELDS:
+            per_status[STATUS_FIELDS[status]] += delta
+    groups = defaultdict(list)
+    for doctor_id, deltas in per_doctor.items():
+        key = tuple(sorted((field, delta) for field, delta in deltas.items() if delta))
+        if key:
+            groups[key].append(doctor_id)
+    with transaction.atomic():
+        for key, doctor_ids in groups.items():
+            DoctorProfile.objects.filter(user_id__in=doctor_ids).update(
+                **{field: F(field) + delta for field, delta in key}
+            )
+        _bump_platform(per_status)
+
+
+def count_user_change(role, delta, approved=False):
+    deltas = {ROLE_FIELDS[role]: delta} if role in ROLE_FIELDS else {}
+    if approved:
+        deltas['approved_doctors'] = delta
+    _bump_platform(deltas)
+
+
+def count_approval_change(delta):
+    _bump_platform({'approved_doctors': delta})
+
+
+def reconcile_platform_counters():
+    """Recompute the global row from the source tables; returns the fields that drifted"""
+    User = get_user_model()
+    actual = User.objects.aggregate(
+        doctors=Count('id', filter=Q(role='doctor')),
+        approved_doctors=Count('doctor_profile', filter=Q(role='doctor', doctor_profile__is_approved=True)),
+        patients=Count('id', filter=Q(role='patient')),
+        admins=Count('id', filter=Q(role='admin')),
+    )
+    actual.update(Appointment.objects.aggregate(
+        **{field: Count('id', filter=Q(status=status)) for status, field in STATUS_FIELDS.items()}
+    ))
+    counters, created = PlatformCounters.objects.get_or_create(pk=COUNTERS_PK, defaults=actual)
+    drifted = [field for field, value in actual.items() if getattr(counters, field) != value]
+    if drifted and not created:
+        PlatformCounters.objects.filter(pk=COUNTERS_PK).update(**actual)
+    return drifted
+
+
+def reconcile_doctor_counters():
+    """Recompute every doctor's counters with one grouped query; returns the number of profiles fixed"""
+    actual = {
+        row['doctor_id']: row
+        for row in Appointment.objects.values('doctor_id').annotate(
+            total_appointments=Count('id'),
+            **{field: Count('id', filter=Q(status=status)) for status, field in DOCTOR_STATUS_FIELDS.items()}
+        ).order_by()
+    }
+    fields = ['total_appointments', *DOCTOR_STATUS_FIELDS.values()]
+    drifted = []
+    for profile in DoctorProfile.objects.only('id', 'user_id', *fields):
+        row = actual.get(profile.user_id, {})
+        if any(getattr(profile, field) != row.get(field, 0) for field in fields):
+            for field in fields:
+                setattr(profile, field, row.get(field, 0))
+            drifted.append(profile)
+    DoctorProfile.objects.bulk_update(drifted, fields, batch_size=500)
+    return len(drifted)
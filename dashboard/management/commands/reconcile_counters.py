@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from dashboard.counters import reconcile_doctor_counters, reconcile_platform_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute the doctor and platform appointment counters and repair any drift (run nightly)'
+
+    def handle(self, *args, **options):
+        drifted = reconcile_platform_counters()
+        if drifted:
+            self.stdout.write(f'Platform counters corrected: {", ".join(drifted)}.')
+        else:
+            self.stdout.write('Platform counters are up to date.')
+        fixed = reconcile_doctor_counters()
+        self.stdout.write(f'Doctor counters corrected for {fixed} profile(s).')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from dashboard.rollup import rollup_appointment_stats
+
+
+class Command(BaseCommand):
+    help = 'Refresh the daily appointment rollup for days changed since the last run (run every few minutes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Rebuild every day instead of only the changed ones'
+        )
+
+    def handle(self, *args, **options):
+        days = rollup_appointment_stats(full=options['full'])
+        self.stdout.write(f'Appointment stats refreshed for {days} day(s).')
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:09
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_counters(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    DoctorProfile = apps.get_model('accounts', 'DoctorProfile')
+    Appointment = apps.get_model('appointments', 'Appointment')
+    PlatformCounters = apps.get_model('dashboard', 'PlatformCounters')
+    totals = CustomUser.objects.aggregate(
+        doctors=Count('id', filter=Q(role='doctor')),
+        approved_doctors=Count('doctor_profile', filter=Q(role='doctor', doctor_profile__is_approved=True)),
+        patients=Count('id', filter=Q(role='patient')),
+        admins=Count('id', filter=Q(role='admin')),
+    )
+    totals.update(Appointment.objects.aggregate(
+        **{f'appointments_{status}': Count('id', filter=Q(status=status)) for status in ('pending', 'confirmed', 'completed', 'cancelled')}
+    ))
+    PlatformCounters.objects.update_or_create(pk=1, defaults=totals)
+    per_doctor = {
+        row['doctor_id']: row
+        for row in Appointment.objects.values('doctor_id').annotate(
+            total=Count('id'),
+            completed=Count('id', filter=Q(status='completed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+        ).order_by()
+    }
+    profiles = list(DoctorProfile.objects.all())
+    for profile in profiles:
+        row = per_doctor.get(profile.user_id, {})
+        profile.total_appointments = row.get('total', 0)
+        profile.completed_appointments = row.get('completed', 0)
+        profile.cancelled_appointments = row.get('cancelled', 0)
+    DoctorProfile.objects.bulk_update(profiles, ['total_appointments', 'completed_appointments', 'cancelled_appointments'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_doctorprofile_appointment_counters'),
+        ('appointments', '0014_appointment_reassignment'),
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlatformCounters',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('doctors', models.IntegerField(default=0)),
+                ('approved_doctors', models.IntegerField(default=0)),
+                ('patients', models.IntegerField(default=0)),
+                ('admins', models.IntegerField(default=0)),
+                ('appointments_pending', models.IntegerField(default=0)),
+                ('appointments_confirmed', models.IntegerField(default=0)),
+                ('appointments_completed', models.IntegerField(default=0)),
+                ('appointments_cancelled', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'platform counters',
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
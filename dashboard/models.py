@@ -1,3 +1,63 @@
 from django.db import models
+from accounts.models import CustomUser
+from appointments.models import Appointment
 
-# Create your models here.
+
+class DailyAppointmentStats(models.Model):
+    """Appointments per day, doctor and status; filled by the rollup_appointment_stats command"""
+    date = models.DateField()
+    doctor = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='daily_appointment_stats')
+    status = models.CharField(max_length=20, choices=Appointment.STATUS_CHOICES)
+    count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ['date', 'doctor', 'status']
+        ordering = ['date']
+        indexes = [
+            models.Index(fields=['doctor', 'date'], name='daily_stats_doctor_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.count} {self.status} on {self.date} for {self.doctor.get_full_name()}"
+
+
+class StaleStatsDay(models.Model):
+    """A day whose rollup must be recomputed because an appointment left it"""
+    date = models.DateField(unique=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Stale stats for {self.date}"
+
+
+class RollupWatermark(models.Model):
+    """How far an incremental job has processed appointment changes"""
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name} up to {self.processed_until}"
+
+
+class PlatformCounters(models.Model):
+    """Single row of platform-wide totals kept current by dashboard.counters"""
+    doctors = models.IntegerField(default=0)
+    approved_doctors = models.IntegerField(default=0)
+    patients = models.IntegerField(default=0)
+    admins = models.IntegerField(default=0)
+    appointments_pending = models.IntegerField(default=0)
+    appointments_confirmed = models.IntegerField(default=0)
+    appointments_completed = models.IntegerField(default=0)
+    appointments_cancelled = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'platform counters'
+
+    def __str__(self):
+        return 'Platform counters'
+
+    @property
+    def appointments_total(self):
+        return self.appointments_pending + self.appointments_confirmed + self.appointments_completed + self.appointments_cancelled
@@ -0,0 +1,46 @@
+from django.db.models import Count, F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from appointments.models import Appointment
+
+RECORDS_PER_DOCTOR = 5
+
+
+def past_appointments(doctor_ids):
+    """Appointments of the given doctors that started before now"""
+    now = timezone.localtime()
+    return Appointment.objects.filter(doctor_id__in=doctor_ids).filter(
+        Q(appointment_date__lt=now.date()) |
+        Q(appointment_date=now.date(), appointment_time__lte=now.time())
+    )
+
+
+def consultation_totals(doctor_ids):
+    """{doctor_id: past appointment count} in one grouped query"""
+    return dict(
+        past_appointments(doctor_ids).values('doctor_id').annotate(total=Count('id')).order_by().values_list('doctor_id', 'total')
+    )
+
+
+def latest_consultations(doctor_ids, limit=RECORDS_PER_DOCTOR):
+    """{doctor_id: [record, ...]} with each doctor's ``limit`` latest past appointments.
+
+    ROW_NUMBER() OVER (PARTITION BY doctor_id) ranks the rows in the
+    database, so only the kept rows are fetched however long the history.
+    """
+    rows = past_appointments(doctor_ids).annotate(
+        position=Window(
+            RowNumber(),
+            partition_by=[F('doctor_id')],
+            order_by=[F('appointment_date').desc(), F('appointment_time').desc(), F('id').desc()]
+        )
+    ).filter(position__lte=limit).select_related('patient').order_by('doctor_id', 'position')
+    records = {}
+    for appointment in rows:
+        records.setdefault(appointment.doctor_id, []).append({
+            'patient': appointment.patient.get_full_name() or appointment.patient.username,
+            'date': appointment.appointment_date.strftime('%Y-%m-%d'),
+            'time': appointment.appointment_time.strftime('%H:%M'),
+            'status': appointment.get_status_display()
+        })
+    return records
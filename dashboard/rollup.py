@@ -0,0 +1,99 @@
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+from django.utils import timezone
+from appointments.models import Appointment
+from .models import DailyAppointmentStats, RollupWatermark, StaleStatsDay
+
+ROLLUP_NAME = 'daily_appointment_stats'
+# Changes committed by transactions that started before the last run are picked up again
+ROLLUP_LOOKBACK = timedelta(minutes=5)
+ROLLUP_BATCH_DAYS = 100
+CHART_MONTHS = 12
+CHART_WEEKS = 12
+
+
+def mark_stale_days(dates):
+    StaleStatsDay.objects.bulk_create([StaleStatsDay(date=date) for date in set(dates)], ignore_conflicts=True)
+
+
+def changed_days(since):
+    """Days with appointments written after since, plus days marked stale by deletes and moves"""
+    days = set(
+        Appointment.objects.filter(updated_at__gte=since).order_by().values_list('appointment_date', flat=True).distinct()
+    )
+    days.update(StaleStatsDay.objects.values_list('date', flat=True))
+    return days
+
+
+def rebuild_days(dates):
+    """Replace the rollup rows of the given days with fresh grouped counts"""
+    dates = sorted(dates)
+    for index in range(0, len(dates), ROLLUP_BATCH_DAYS):
+        batch = dates[index:index + ROLLUP_BATCH_DAYS]
+        with transaction.atomic():
+            # Clear the markers first so a delete racing this batch marks its day again
+            StaleStatsDay.objects.filter(date__in=batch).delete()
+            DailyAppointmentStats.objects.filter(date__in=batch).delete()
+            DailyAppointmentStats.objects.bulk_create([
+                DailyAppointmentStats(date=row['appointment_date'], doctor_id=row['doctor_id'], status=row['status'], count=row['total'])
+                for row in Appointment.objects.filter(appointment_date__in=batch)
+                .values('appointment_date', 'doctor_id', 'status')
+                .annotate(total=Count('id'))
+                .order_by()
+            ])
+
+
+def rollup_appointment_stats(full=False):
+    """Bring DailyAppointmentStats up to date and return the number of days recomputed.
+
+    Only days touched since the previous run are reprocessed; the first
+    run, or ``full``, rebuilds every day that has appointments or rollup rows.
+    """
+    started = timezone.now()
+    watermark = RollupWatermark.objects.filter(name=ROLLUP_NAME).first()
+    if full or watermark is None:
+        days = set(Appointment.objects.order_by().values_list('appointment_date', flat=True).distinct())
+        days.update(DailyAppointmentStats.objects.order_by().values_list('date', flat=True).distinct())
+        days.update(StaleStatsDay.objects.values_list('date', flat=True))
+    else:
+        days = changed_days(watermark.processed_until - ROLLUP_LOOKBACK)
+    rebuild_days(days)
+    RollupWatermark.objects.update_or_create(name=ROLLUP_NAME, defaults={'processed_until': started})
+    return len(days)
+
+
+def _status_totals():
+    return {
+        'total': Sum('count'),
+        'completed': Sum('count', filter=Q(status='completed')),
+        'cancelled': Sum('count', filter=Q(status='cancelled')),
+    }
+
+
+def monthly_appointment_stats(today, months=CHART_MONTHS):
+    """Totals for the latest ``months`` calendar months, oldest first"""
+    month_index = today.year * 12 + today.month - months
+    first_month = today.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+    next_month = (today.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return list(
+        DailyAppointmentStats.objects.filter(date__gte=first_month, date__lt=next_month)
+        .annotate(month=TruncMonth('date'))
+        .values('month')
+        .annotate(**_status_totals())
+        .order_by('month')
+    )
+
+
+def weekly_appointment_stats(today, weeks=CHART_WEEKS):
+    """Totals for the latest ``weeks`` weeks starting on Monday, oldest first"""
+    week_start = today - timedelta(days=today.weekday())
+    return list(
+        DailyAppointmentStats.objects.filter(date__gte=week_start - timedelta(weeks=weeks - 1), date__lt=week_start + timedelta(weeks=1))
+        .annotate(week=TruncWeek('date'))
+        .values('week')
+        .annotate(**_status_totals())
+        .order_by('week')
+    )
+
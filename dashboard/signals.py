@@ -0,0 +1,79 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from accounts.models import DoctorProfile
+from appointments.models import Appointment
+from .counters import count_appointment_changes, count_approval_change, count_user_change
+from .rollup import mark_stale_days
+
+User = get_user_model()
+
+
+def _tracks(kwargs, field):
+    update_fields = kwargs.get('update_fields')
+    return update_fields is None or field in update_fields
+
+
+@receiver(post_save, sender=Appointment)
+def count_saved_appointment(sender, instance, created, **kwargs):
+    # (doctor_id, appointment_date, appointment_time, status) before the save,
+    # looked up once by appointments.signals.remember_appointment_state
+    previous = getattr(instance, '_previous_state', None)
+    if created:
+        count_appointment_changes([(instance.doctor_id, instance.status, 1)])
+        return
+    if previous and (previous[0], previous[3]) != (instance.doctor_id, instance.status):
+        count_appointment_changes([(previous[0], previous[3], -1), (instance.doctor_id, instance.status, 1)])
+    if previous and previous[1] != instance.appointment_date:
+        # The rollup finds changed rows by updated_at, which only names the new day
+        mark_stale_days([previous[1]])
+
+
+@receiver(post_delete, sender=Appointment)
+def count_deleted_appointment(sender, instance, **kwargs):
+    count_appointment_changes([(instance.doctor_id, instance.status, -1)])
+    mark_stale_days([instance.appointment_date])
+
+
+@receiver(pre_save, sender=User)
+def remember_user_role(sender, instance, **kwargs):
+    instance._counted_role = None
+    if instance.pk is not None and _tracks(kwargs, 'role'):
+        instance._counted_role = User.objects.filter(pk=instance.pk).values_list('role', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def count_saved_user(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_counted_role', None)
+    if created:
+        count_user_change(instance.role, 1)
+    elif previous and previous != instance.role:
+        count_user_change(previous, -1)
+        count_user_change(instance.role, 1)
+
+
+@receiver(post_delete, sender=User)
+def count_deleted_user(sender, instance, **kwargs):
+    count_user_change(instance.role, -1)
+
+
+@receiver(pre_save, sender=DoctorProfile)
+def remember_approval(sender, instance, **kwargs):
+    instance._counted_approval = None
+    if instance.pk is not None and _tracks(kwargs, 'is_approved'):
+        instance._counted_approval = DoctorProfile.objects.filter(pk=instance.pk).values_list('is_approved', flat=True).first()
+
+
+@receiver(post_save, sender=DoctorProfile)
+def count_saved_profile(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_counted_approval', None)
+    if created and instance.is_approved:
+        count_approval_change(1)
+    elif previous is not None and previous != instance.is_approved:
+        count_approval_change(1 if instance.is_approved else -1)
+
+
+@receiver(post_delete, sender=DoctorProfile)
+def count_deleted_profile(sender, instance, **kwargs):
+    if instance.is_approved:
+        count_approval_change(-1)
@@ -0,0 +1,60 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from medical_connect.cache_versions import bump_cache_version, get_cache_version
+
+# Entries outlive their soft TTL so a stale copy can be served while one
+# worker recomputes; the hard timeout only bounds how old that copy can get.
+SNAPSHOT_HARD_TIMEOUT = 60 * 60
+SNAPSHOT_LOCK_TIMEOUT = 120
+# Bump when the shape of a snapshot changes so old pickles are never read
+SNAPSHOT_FORMAT = 1
+
+
+def _version_key(name):
+    return f'dashboard_snapshot_version:{name}'
+
+
+def snapshot_version(name):
+    """Current version of a snapshot, for URLs that must change when it is invalidated"""
+    return get_cache_version(_version_key(name))
+
+
+def invalidate_snapshot(name):
+    """Retire the current snapshot; the next read rebuilds it"""
+    bump_cache_version(_version_key(name))
+
+
+def _store(key, builder):
+    data = builder()
+    cache.set(key, {'built_at': time.time(), 'data': data}, SNAPSHOT_HARD_TIMEOUT)
+    return data
+
+
+def _refresh(key, builder):
+    try:
+        _store(key, builder)
+    finally:
+        cache.delete(f'{key}:lock')
+        # Connections are per thread; close the ones this refresh opened
+        connections.close_all()
+
+
+def cached_snapshot(name, builder, soft_ttl=None):
+    """Return builder() through a versioned cache, stale-while-revalidate.
+
+    A missing snapshot is built in the request. Once it is older than
+    ``soft_ttl`` seconds it is still returned, and the first request to
+    take the lock rebuilds it in a background thread.
+    """
+    if soft_ttl is None:
+        soft_ttl = getattr(settings, 'DASHBOARD_SNAPSHOT_SOFT_TTL', 60)
+    key = f'dashboard_snapshot:{name}:f{SNAPSHOT_FORMAT}:v{snapshot_version(name)}'
+    entry = cache.get(key)
+    if entry is None:
+        return _store(key, builder)
+    if time.time() - entry['built_at'] > soft_ttl and cache.add(f'{key}:lock', 1, SNAPSHOT_LOCK_TIMEOUT):
+        threading.Thread(target=_refresh, args=(key, builder), daemon=True).start()
+    return entry['data']
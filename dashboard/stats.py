@@ -0,0 +1,80 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from appointments.models import Appointment
+from messaging.models import Message, Notification
+
+# Dashboard counters are computed with one conditional aggregate per table
+# (COUNT(*) FILTER (WHERE ...)) instead of a separate .count() per number.
+
+
+def _grouped_count(queryset, field):
+    return Coalesce(Subquery(queryset.order_by().values(field).annotate(total=Count('id')).values('total')), 0)
+
+
+def user_counts():
+    """Users by role plus doctor approval state, in one query"""
+    return get_user_model().objects.aggregate(
+        total_users=Count('id'),
+        total_doctors=Count('id', filter=Q(role='doctor')),
+        total_patients=Count('id', filter=Q(role='patient')),
+        active_patients=Count('id', filter=Q(role='patient', is_active=True)),
+        total_admins=Count('id', filter=Q(role='admin')),
+        approved_doctors=Count('doctor_profile', filter=Q(doctor_profile__is_approved=True)),
+        pending_doctors=Count('doctor_profile', filter=Q(doctor_profile__is_approved=False)),
+    )
+
+
+def appointment_counts(today):
+    """Date-dependent appointment counters, in one query; per-status totals are in PlatformCounters"""
+    month_start = today.replace(day=1)
+    return Appointment.objects.aggregate(
+        upcoming=Count('id', filter=Q(appointment_date__gte=today)),
+        completed_this_month=Count(
+            'id', filter=Q(status='completed', appointment_date__gte=month_start, appointment_date__lte=today)
+        ),
+    )
+
+
+def notification_counts(user=None):
+    """All notifications, unread ones and, given a user, the viewer's own unread ones, in one query"""
+    totals = {'total': Count('id'), 'unread': Count('id', filter=Q(is_read=False))}
+    if user is not None:
+        totals['user_unread'] = Count('id', filter=Q(is_read=False, user=user))
+    counts = Notification.objects.aggregate(**totals)
+    counts['read'] = counts['total'] - counts['unread']
+    return counts
+
+
+def doctor_counts(doctor, now):
+    """Date-dependent counters for the doctor dashboard, in one query; totals are on DoctorProfile"""
+    today = now.date()
+    past = Q(appointment_date__lt=today) | Q(appointment_date=today, appointment_time__lte=now.time())
+    return Appointment.objects.filter(doctor=doctor).aggregate(
+        today=Count('id', filter=Q(appointment_date=today, status='confirmed')),
+        next_day=Count('id', filter=Q(appointment_date=today + timedelta(days=1), status='confirmed')),
+        pending=Count('id', filter=Q(status='pending')),
+        pending_prescriptions=Count('id', filter=past & Q(status='completed', prescription__isnull=True)),
+    )
+
+
+def patient_counts(patient, today):
+    """Counters for the patient dashboard, in one query"""
+    return Appointment.objects.filter(patient=patient).aggregate(
+        total=Count('id'),
+        today=Count('id', filter=Q(appointment_date=today, status='confirmed')),
+        completed=Count('id', filter=Q(status='completed')),
+    )
+
+
+def inbox_counts(user):
+    """Unread notifications and unread messages from the other side of the user's conversations, in one query"""
+    side = 'conversation__doctor' if user.role == 'doctor' else 'conversation__patient'
+    unread_messages = Message.objects.filter(is_read=False, **{side: OuterRef('pk')}).exclude(sender=OuterRef('pk'))
+    unread_notifications = Notification.objects.filter(user=OuterRef('pk'), is_read=False)
+    counts = get_user_model().objects.filter(pk=user.pk).annotate(
+        unread_messages=_grouped_count(unread_messages, side),
+        unread_notifications=_grouped_count(unread_notifications, 'user'),
+    ).values('unread_messages', 'unread_notifications').first()
+    return counts or {'unread_messages': 0, 'unread_notifications': 0}
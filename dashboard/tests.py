@@ -1,3 +1,382 @@
+from datetime import time, timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from accounts.models import CustomUser, DoctorProfile
+from appointments.models import Appointment
+from messaging.models import Conversation, Message, Notification
+from . import stats
+from .counters import get_platform_counters, reconcile_doctor_counters, reconcile_platform_counters
+from .models import DailyAppointmentStats, PlatformCounters, StaleStatsDay
+from .records import RECORDS_PER_DOCTOR, latest_consultations
+from .rollup import monthly_appointment_stats, rollup_appointment_stats
+from .snapshot import cached_snapshot
 
-# Create your tests here.
+# Upper bounds for a full page load, including the session and user lookups;
+# admin budgets are for a cold snapshot build
+ADMIN_DASHBOARD_QUERY_BUDGET = 7
+ADMIN_SECTION_QUERY_BUDGETS = {
+    'overview': 6,
+    'manage-data': 6,
+    'users': 5,
+    'appointments': 7,
+    'notifications': 4,
+    'analytics': 6,
+}
+# Session, user and the viewer's unread notifications
+ADMIN_SNAPSHOT_HIT_QUERY_BUDGET = 3
+DOCTOR_DASHBOARD_QUERY_BUDGET = 11
+PATIENT_DASHBOARD_QUERY_BUDGET = 6
+
+
+class DashboardDataMixin:
+    """Doctors, patients and appointments spread over every status"""
+
+    @classmethod
+    def make_doctor(cls, username, approved=True):
+        doctor = CustomUser.objects.create_user(username=username, password='pw', role='doctor', first_name=username.title())
+        DoctorProfile.objects.create(
+            user=doctor,
+            specialization='cardiology',
+            license_number=f'{username}-license',
+            experience_years=5,
+            consultation_fee=100,
+            available_from=time(9),
+            available_to=time(17),
+            is_approved=approved
+        )
+        return doctor
+
+    @classmethod
+    def make_patient(cls, username):
+        return CustomUser.objects.create_user(username=username, password='pw', role='patient', first_name=username.title())
+
+    @classmethod
+    def add_appointments(cls, doctors, patients, count):
+        today = timezone.localdate()
+        statuses = [value for value, _ in Appointment.STATUS_CHOICES]
+        for index in range(count):
+            Appointment.objects.create(
+                doctor=doctors[index % len(doctors)],
+                patient=patients[index % len(patients)],
+                appointment_date=today + timedelta(days=index - count // 2),
+                appointment_time=time(9 + index % 8),
+                end_time=time(9 + index % 8, 30),
+                status=statuses[index % len(statuses)]
+            )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = CustomUser.objects.create_user(username='admin', password='pw', role='admin', first_name='Admin')
+        cls.doctors = [cls.make_doctor('doctor1'), cls.make_doctor('doctor2'), cls.make_doctor('doctor3', approved=False)]
+        cls.patients = [cls.make_patient('patient1'), cls.make_patient('patient2')]
+        cls.add_appointments(cls.doctors, cls.patients, 12)
+        conversation = Conversation.objects.create(doctor=cls.doctors[0], patient=cls.patients[0])
+        Message.objects.create(conversation=conversation, sender=cls.patients[0], content='Hello')
+        Message.objects.create(conversation=conversation, sender=cls.doctors[0], content='Hi')
+        Notification.objects.create(user=cls.admin, notification_type='message', title='Note', description='Unread')
+        rollup_appointment_stats()
+
+
+class DashboardQueryBudgetTests(DashboardDataMixin, TestCase):
+
+    def get_with_budget(self, user, url, budget):
+        self.client.force_login(user)
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(
+            len(context), budget,
+            '\n'.join(query['sql'] for query in context.captured_queries)
+        )
+        return len(context)
+
+    def client_get_admin(self, url, data=None):
+        self.client.force_login(self.admin)
+        return self.client.get(url, data)
+
+    def assert_flat_query_count(self, user, url, budget):
+        before = self.get_with_budget(user, url, budget)
+        doctors = [self.make_doctor(f'extra{index}') for index in range(3)]
+        patients = [self.make_patient(f'extra-patient{index}') for index in range(3)]
+        if user.role == 'doctor':
+            doctors.append(user)
+        elif user.role == 'patient':
+            patients.append(user)
+        self.add_appointments(doctors, patients, 20)
+        self.assertEqual(self.get_with_budget(user, url, budget), before)
+
+    def test_admin_dashboard_budget(self):
+        self.assert_flat_query_count(self.admin, reverse('admin_dashboard'), ADMIN_DASHBOARD_QUERY_BUDGET)
+
+    def test_admin_dashboard_served_from_snapshot(self):
+        url = reverse('admin_dashboard')
+        self.get_with_budget(self.admin, url, ADMIN_DASHBOARD_QUERY_BUDGET)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(len(context), ADMIN_SNAPSHOT_HIT_QUERY_BUDGET)
+        self.assertEqual(response.context['user_summary']['notifications'], 1)
+
+    def test_admin_actions_invalidate_snapshot(self):
+        url = reverse('admin_dashboard')
+        self.get_with_budget(self.admin, url, ADMIN_DASHBOARD_QUERY_BUDGET)
+        pending = self.doctors[2]
+        self.client.post(url, {'action': 'approve_doctor', 'user_id': pending.id})
+        rows = {row['id']: row for row in self.client.get(url, {'focus': 'manage-data'}).context['doctor_rows']}
+        self.assertEqual(rows[pending.id]['status'], 'Approved')
+
+    def test_admin_dashboard_renders_overview_only(self):
+        response = self.client_get_admin(reverse('admin_dashboard'))
+        self.assertIn('stat_cards', response.context)
+        self.assertNotIn('doctor_rows', response.context)
+        self.assertNotIn('monthly_appointments', response.context)
+        loaded = [section['id'] for section in response.context['admin_sections'] if section['loaded']]
+        self.assertEqual(loaded, ['overview'])
+        response = self.client_get_admin(reverse('admin_dashboard'), {'doctor_search': 'doctor1'})
+        self.assertEqual(response.context['active_section'], 'manage-data')
+        self.assertEqual([row['name'] for row in response.context['doctor_rows']], ['Doctor1'])
+
+    def test_admin_section_budgets(self):
+        for section, budget in ADMIN_SECTION_QUERY_BUDGETS.items():
+            with self.subTest(section=section):
+                self.get_with_budget(self.admin, reverse('admin_dashboard_section', args=[section]), budget)
+
+    def test_admin_sections_are_private_fragments(self):
+        url = reverse('admin_dashboard_section', args=['analytics'])
+        response = self.client_get_admin(url)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('max-age=300', response['Cache-Control'])
+        self.assertNotContains(response, '<html')
+        self.assertEqual(self.client_get_admin(reverse('admin_dashboard_section', args=['unknown'])).status_code, 404)
+        self.client.force_login(self.doctors[0])
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_doctor_dashboard_budget(self):
+        self.assert_flat_query_count(self.doctors[0], reverse('dashboard'), DOCTOR_DASHBOARD_QUERY_BUDGET)
+
+    def test_patient_dashboard_budget(self):
+        self.assert_flat_query_count(self.patients[0], reverse('dashboard'), PATIENT_DASHBOARD_QUERY_BUDGET)
+
+
+class DashboardStatsTests(DashboardDataMixin, TestCase):
+
+    def test_user_counts(self):
+        with self.assertNumQueries(1):
+            counts = stats.user_counts()
+        # The seed migration adds sample doctors, so compare against plain counts
+        self.assertEqual(counts['total_users'], CustomUser.objects.count())
+        self.assertEqual(counts['total_doctors'], CustomUser.objects.filter(role='doctor').count())
+        self.assertEqual(counts['approved_doctors'], DoctorProfile.objects.filter(is_approved=True).count())
+        self.assertEqual(counts['pending_doctors'], 1)
+        self.assertEqual(counts['total_patients'], 2)
+        self.assertEqual(counts['total_admins'], 1)
+
+    def test_appointment_counts(self):
+        with self.assertNumQueries(1):
+            counts = stats.appointment_counts(timezone.localdate())
+        self.assertEqual(counts['upcoming'], Appointment.objects.filter(appointment_date__gte=timezone.localdate()).count())
+
+    def test_notification_counts(self):
+        with self.assertNumQueries(1):
+            counts = stats.notification_counts(self.admin)
+        self.assertEqual(counts['unread'], Notification.objects.filter(is_read=False).count())
+        self.assertEqual(counts['user_unread'], 1)
+        self.assertEqual(counts['read'], counts['total'] - counts['unread'])
+
+    def test_doctor_and_patient_counts(self):
+        doctor, patient = self.doctors[0], self.patients[0]
+        with self.assertNumQueries(1):
+            counts = stats.doctor_counts(doctor, timezone.localtime())
+        self.assertEqual(counts['pending'], Appointment.objects.filter(doctor=doctor, status='pending').count())
+        with self.assertNumQueries(1):
+            counts = stats.patient_counts(patient, timezone.localdate())
+        self.assertEqual(counts['completed'], Appointment.objects.filter(patient=patient, status='completed').count())
+
+    def test_inbox_counts_only_count_the_other_side(self):
+        with self.assertNumQueries(1):
+            doctor_inbox = stats.inbox_counts(self.doctors[0])
+        self.assertEqual(doctor_inbox['unread_messages'], 1)
+        self.assertEqual(stats.inbox_counts(self.patients[0])['unread_messages'], 1)
+        self.assertEqual(stats.inbox_counts(self.patients[1])['unread_messages'], 0)
+
+
+class AppointmentRollupTests(DashboardDataMixin, TestCase):
+
+    def rollup_totals(self):
+        return {
+            (row.date, row.doctor_id, row.status): row.count
+            for row in DailyAppointmentStats.objects.all()
+        }
+
+    def appointment_totals(self):
+        totals = {}
+        for appointment in Appointment.objects.all():
+            key = (appointment.appointment_date, appointment.doctor_id, appointment.status)
+            totals[key] = totals.get(key, 0) + 1
+        return totals
+
+    def test_incremental_run_follows_creates_moves_and_deletes(self):
+        self.assertEqual(self.rollup_totals(), self.appointment_totals())
+        appointments = list(Appointment.objects.order_by('id')[:2])
+        appointments[0].appointment_date -= timedelta(days=40)
+        appointments[0].save()
+        appointments[1].delete()
+        self.add_appointments(self.doctors, self.patients, 3)
+        rollup_appointment_stats()
+        self.assertEqual(self.rollup_totals(), self.appointment_totals())
+
+    def test_monthly_chart_keeps_the_latest_months(self):
+        today = timezone.localdate()
+        Appointment.objects.create(
+            doctor=self.doctors[0], patient=self.patients[0],
+            appointment_date=today - timedelta(days=800), appointment_time=time(9), end_time=time(9, 30)
+        )
+        rollup_appointment_stats()
+        months = [row['month'] for row in monthly_appointment_stats(today)]
+        self.assertEqual(months, sorted(months))
+        self.assertEqual(months[-1], today.replace(day=1))
+        self.assertGreater(months[0], today - timedelta(days=366))
+
+
+class DoctorRecordsTests(DashboardDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        today = timezone.localdate()
+        for days_ago in range(1, RECORDS_PER_DOCTOR + 4):
+            for hour in (10, 14):
+                Appointment.objects.create(
+                    doctor=cls.doctors[1], patient=cls.patients[days_ago % 2],
+                    appointment_date=today - timedelta(days=days_ago),
+                    appointment_time=time(hour), end_time=time(hour, 30), status='completed'
+                )
+
+    def expected_records(self, doctor):
+        now = timezone.localtime()
+        past = [
+            (appointment.appointment_date, appointment.appointment_time)
+            for appointment in Appointment.objects.filter(doctor=doctor)
+            if (appointment.appointment_date, appointment.appointment_time) <= (now.date(), now.time())
+        ]
+        return len(past), sorted(past, reverse=True)[:RECORDS_PER_DOCTOR]
+
+    def test_only_the_latest_visits_are_kept_per_doctor(self):
+        records = latest_consultations([doctor.id for doctor in self.doctors])
+        for doctor in self.doctors:
+            _, latest = self.expected_records(doctor)
+            self.assertEqual(
+                [(record['date'], record['time']) for record in records.get(doctor.id, [])],
+                [(date.strftime('%Y-%m-%d'), start.strftime('%H:%M')) for date, start in latest]
+            )
+
+    def test_records_endpoint_returns_the_latest_five_and_the_total(self):
+        doctor = self.doctors[1]
+        total, latest = self.expected_records(doctor)
+        self.assertGreater(total, RECORDS_PER_DOCTOR)
+        self.client.force_login(self.admin)
+        data = self.client.get(reverse('admin_doctor_records', args=[doctor.id])).json()
+        self.assertEqual(data['total'], total)
+        self.assertEqual(len(data['records']), RECORDS_PER_DOCTOR)
+        self.assertEqual(data['records'][0]['date'], latest[0][0].strftime('%Y-%m-%d'))
+        self.assertEqual(data['records'][0]['time'], latest[0][1].strftime('%H:%M'))
+        self.client.force_login(self.patients[0])
+        self.assertEqual(self.client.get(reverse('admin_doctor_records', args=[doctor.id])).status_code, 403)
+
+
+class MaintainedCounterTests(DashboardDataMixin, TestCase):
+
+    def assert_counters_match(self):
+        counters = get_platform_counters()
+        for value, _ in Appointment.STATUS_CHOICES:
+            self.assertEqual(getattr(counters, f'appointments_{value}'), Appointment.objects.filter(status=value).count())
+        self.assertEqual(counters.doctors, CustomUser.objects.filter(role='doctor').count())
+        self.assertEqual(counters.approved_doctors, DoctorProfile.objects.filter(is_approved=True).count())
+        self.assertEqual(counters.patients, CustomUser.objects.filter(role='patient').count())
+        for profile in DoctorProfile.objects.all():
+            appointments = Appointment.objects.filter(doctor_id=profile.user_id)
+            self.assertEqual(profile.total_appointments, appointments.count())
+            self.assertEqual(profile.completed_appointments, appointments.filter(status='completed').count())
+            self.assertEqual(profile.cancelled_appointments, appointments.filter(status='cancelled').count())
+
+    def test_counters_follow_writes(self):
+        self.assert_counters_match()
+        appointment = Appointment.objects.filter(status='pending').first()
+        appointment.status = 'completed'
+        appointment.save()
+        Appointment.objects.filter(status='confirmed').first().delete()
+        profile = self.doctors[2].doctor_profile
+        profile.is_approved = True
+        profile.save(update_fields=['is_approved'])
+        self.make_patient('patient3').delete()
+        self.doctors[1].delete()
+        self.assert_counters_match()
+
+    def test_reconcile_repairs_drift(self):
+        get_platform_counters()
+        PlatformCounters.objects.update(appointments_pending=999, doctors=0)
+        DoctorProfile.objects.filter(user=self.doctors[0]).update(total_appointments=0)
+        self.assertEqual(sorted(reconcile_platform_counters()), ['appointments_pending', 'doctors'])
+        self.assertEqual(reconcile_doctor_counters(), 1)
+        self.assert_counters_match()
+        self.assertEqual(reconcile_platform_counters(), [])
+
+    def test_drifted_counter_does_not_block_writes(self):
+        appointment = Appointment.objects.filter(status='pending').first()
+        appointment.status = 'completed'
+        appointment.save()
+        DoctorProfile.objects.filter(user_id=appointment.doctor_id).update(completed_appointments=0)
+        appointment.status = 'cancelled'
+        appointment.save()
+        self.assertEqual(Appointment.objects.get(pk=appointment.pk).status, 'cancelled')
+        reconcile_doctor_counters()
+        self.assert_counters_match()
+
+    def test_a_save_reads_the_stored_row_once(self):
+        appointment = Appointment.objects.filter(status='pending').first()
+        left_day = appointment.appointment_date
+        appointment.status = 'completed'
+        appointment.appointment_date -= timedelta(days=1)
+        with CaptureQueriesContext(connection) as context:
+            appointment.save()
+        table = Appointment._meta.db_table
+        lookups = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and f'FROM "{table}" WHERE "{table}"."id" = {appointment.pk}' in query['sql']
+        ]
+        self.assertEqual(len(lookups), 1, lookups)
+        self.assertTrue(StaleStatsDay.objects.filter(date=left_day).exists())
+        self.assert_counters_match()
+
+
+class SnapshotCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stale_snapshot_is_served_while_one_refresh_runs(self):
+        builds = []
+
+        def builder():
+            builds.append(len(builds))
+            return len(builds)
+
+        self.assertEqual(cached_snapshot('test', builder, soft_ttl=60), 1)
+        with mock.patch('dashboard.snapshot.threading.Thread') as thread:
+            self.assertEqual(cached_snapshot('test', builder, soft_ttl=60), 1)
+            thread.assert_not_called()
+            # Past the soft TTL every reader gets the stale copy, and only the first starts a refresh
+            self.assertEqual(cached_snapshot('test', builder, soft_ttl=-1), 1)
+            self.assertEqual(cached_snapshot('test', builder, soft_ttl=-1), 1)
+            self.assertEqual(thread.call_count, 1)
+        # Run the refresh here; closing connections would end the test transaction
+        with mock.patch('dashboard.snapshot.connections'):
+            thread.call_args.kwargs['target'](*thread.call_args.kwargs['args'])
+        self.assertEqual(cached_snapshot('test', builder, soft_ttl=60), 2)
+        self.assertEqual(len(builds), 2)
@@ -4,5 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.dashboard, name='dashboard'),
     path('admin/', views.admin_dashboard, name='admin_dashboard'),
+    path('admin/sections/<slug:section>/', views.admin_dashboard_section, name='admin_dashboard_section'),
+    path('admin/doctors/<int:doctor_id>/records/', views.admin_doctor_records, name='admin_doctor_records'),
     path('appointments/<int:appointment_id>/status/', views.admin_update_appointment_status, name='admin_update_appointment_status'),
 ]
\ No newline at end of file
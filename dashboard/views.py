@@ -1,17 +1,22 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Q, Count, Avg
-from django.db import IntegrityError
+from django.db.models import Q, Avg
 from django.utils import timezone
-from django.views.decorators.http import require_POST
-from datetime import timedelta
-from collections import defaultdict
-import json
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_GET, require_POST
 from appointments.models import Appointment, AvailabilitySlot, DoctorLeave, PrescriptionTemplate
 from appointments.forms import AvailabilitySlotForm, DoctorLeaveForm
+from appointments.schedule import ScheduleError, merge_into_schedule
 from messaging.models import Notification
 from accounts.models import DoctorProfile
+from .records import consultation_totals, latest_consultations
+from . import stats
+from .counters import get_platform_counters
+from .rollup import monthly_appointment_stats, weekly_appointment_stats
+from .snapshot import cached_snapshot, invalidate_snapshot, snapshot_version
 
 @login_required(login_url='login')
 def dashboard(request):
@@ -37,27 +42,8 @@ def doctor_dashboard(request):
     upcoming_appointments = list(upcoming_qs)
     for appointment in upcoming_appointments:
         appointment.has_prescription = hasattr(appointment, 'prescription')
-    next_day_date = today + timedelta(days=1)
-    next_day_appointments = Appointment.objects.filter(
-        doctor=doctor,
-        appointment_date=next_day_date,
-        status='confirmed'
-    ).count()
-    today_appointments = Appointment.objects.filter(
-        doctor=doctor,
-        appointment_date=today,
-        status='confirmed'
-    ).count()
-    pending_requests = Appointment.objects.filter(
-        doctor=doctor,
-        status='pending'
-    ).count()
-    appointment_count = Appointment.objects.filter(doctor=doctor).count()
-    completed_appointments = Appointment.objects.filter(
-        doctor=doctor,
-        status='completed'
-    ).count()
     now = timezone.localtime()
+    counts = stats.doctor_counts(doctor, now)
     consultations_qs = Appointment.objects.filter(doctor=doctor).filter(
         Q(appointment_date__lt=today) |
         Q(appointment_date=today, appointment_time__lte=now.time())
@@ -65,7 +51,6 @@ def doctor_dashboard(request):
     recent_consultations = list(consultations_qs.order_by('-appointment_date', '-appointment_time')[:10])
     for consultation in recent_consultations:
         consultation.has_prescription = hasattr(consultation, 'prescription')
-    pending_prescriptions = consultations_qs.filter(status='completed', prescription__isnull=True).count()
     availability_form = AvailabilitySlotForm()
     leave_form = DoctorLeaveForm()
     if request.method == 'POST':
@@ -74,13 +59,16 @@ def doctor_dashboard(request):
             availability_form = AvailabilitySlotForm(request.POST)
             if availability_form.is_valid():
                 slot = availability_form.save(commit=False)
-                slot.doctor = doctor
-                try:
-                    slot.save()
-                    messages.success(request, 'Availability slot added successfully.')
-                    return redirect('dashboard')
-                except IntegrityError:
+                if AvailabilitySlot.objects.filter(doctor=doctor, day_of_week=slot.day_of_week, start_time=slot.start_time).exists():
                     availability_form.add_error(None, 'This availability slot already exists.')
+                else:
+                    try:
+                        merge_into_schedule(doctor, [slot])
+                        messages.success(request, 'Availability slot added successfully.')
+                        return redirect('dashboard')
+                    except ScheduleError as exc:
+                        for error in exc.errors:
+                            availability_form.add_error(None, error)
         elif form_type == 'leave':
             leave_form = DoctorLeaveForm(request.POST)
             if leave_form.is_valid():
@@ -92,24 +80,20 @@ def doctor_dashboard(request):
     availability_slots = AvailabilitySlot.objects.filter(doctor=doctor).order_by('day_of_week', 'start_time')
     leave_requests = DoctorLeave.objects.filter(doctor=doctor).order_by('-start_date')[:5]
     doctor_profile = getattr(doctor, 'doctor_profile', None)
-    from messaging.models import Message, Conversation
-    conversations = Conversation.objects.filter(doctor=doctor)
-    unread_messages = Message.objects.filter(
-        conversation__in=conversations,
-        is_read=False
-    ).exclude(sender=doctor).count()
-    unread_notifications = request.user.notifications.filter(is_read=False).count()
+    total_appointments = doctor_profile.total_appointments if doctor_profile else 0
+    inbox = stats.inbox_counts(doctor)
     context = {
         'upcoming_appointments': upcoming_appointments,
-        'today_appointments': today_appointments,
-        'pending_requests': pending_requests,
-        'appointment_count': appointment_count,
-        'completed_appointments': completed_appointments,
-        'next_day_appointments': next_day_appointments,
-        'pending_prescriptions': pending_prescriptions,
+        'today_appointments': counts['today'],
+        'pending_requests': counts['pending'],
+        'appointment_count': total_appointments,
+        'total_appointments': total_appointments,
+        'completed_appointments': doctor_profile.completed_appointments if doctor_profile else 0,
+        'next_day_appointments': counts['next_day'],
+        'pending_prescriptions': counts['pending_prescriptions'],
         'recent_consultations': recent_consultations,
-        'unread_notifications': unread_notifications,
-        'unread_messages': unread_messages,
+        'unread_notifications': inbox['unread_notifications'],
+        'unread_messages': inbox['unread_messages'],
         'availability_form': availability_form,
         'availability_slots': availability_slots,
         'leave_form': leave_form,
@@ -130,216 +114,96 @@ def patient_dashboard(request):
         status='confirmed'
     ).order_by('appointment_date', 'appointment_time')[:5]
     
-    today_appointments = Appointment.objects.filter(
-        patient=patient,
-        appointment_date=today,
-        status='confirmed'
-    ).count()
-    
-    appointment_count = Appointment.objects.filter(patient=patient).count()
-    completed_appointments = Appointment.objects.filter(
-        patient=patient,
-        status='completed'
-    ).count()
-    
-    # Get doctors
-    from accounts.models import CustomUser
-    doctors = CustomUser.objects.filter(role='doctor', doctor_profile__is_approved=True).count()
+    counts = stats.patient_counts(patient, today)
     
-    # Get notifications
-    unread_notifications = request.user.notifications.filter(is_read=False).count()
+    # Approved doctors come from the maintained platform counters
+    doctors = get_platform_counters().approved_doctors
     
-    # Get unread messages
-    from messaging.models import Message, Conversation
-    conversations = Conversation.objects.filter(patient=patient)
-    unread_messages = Message.objects.filter(
-        conversation__in=conversations,
-        is_read=False
-    ).exclude(sender=patient).count()
+    # Get unread notifications and messages
+    inbox = stats.inbox_counts(patient)
     
     context = {
         'upcoming_appointments': upcoming_appointments,
-        'today_appointments': today_appointments,
-        'appointment_count': appointment_count,
-        'completed_appointments': completed_appointments,
+        'today_appointments': counts['today'],
+        'appointment_count': counts['total'],
+        'total_appointments': counts['total'],
+        'completed_appointments': counts['completed'],
         'doctors_available': doctors,
-        'unread_notifications': unread_notifications,
-        'unread_messages': unread_messages,
+        'unread_notifications': inbox['unread_notifications'],
+        'unread_messages': inbox['unread_messages'],
     }
     
     return render(request, 'dashboard/patient_dashboard.html', context)
 
-@login_required(login_url='login')
-def admin_dashboard(request):
-    """Admin dashboard"""
-    if request.user.role != 'admin':
-        return redirect('dashboard')
-    from accounts.models import CustomUser
-    doctor_search_query = request.GET.get('doctor_search', '').strip()
-    patient_search_query = request.GET.get('patient_search', '').strip()
-    focus = request.GET.get('focus', '').strip()
-    active_section = 'overview'
-    manage_tab = 'doctors'
-    users_tab = 'patients'
-    if request.method == 'POST':
-        action = request.POST.get('action')
-        if action == 'mark_all_notifications_read':
-            Notification.objects.filter(is_read=False).update(is_read=True)
-            messages.success(request, 'All notifications marked as read.')
-            return redirect('admin_dashboard')
-        if action == 'delete_patient':
-            user_id = request.POST.get('user_id')
-            patient = get_object_or_404(CustomUser, id=user_id, role='patient')
-            patient.delete()
-            messages.success(request, 'Patient removed successfully.')
-            return redirect('admin_dashboard')
-        if action == 'approve_doctor':
-            user_id = request.POST.get('user_id')
-            doctor = get_object_or_404(CustomUser, id=user_id, role='doctor')
-            profile = getattr(doctor, 'doctor_profile', None)
-            if not profile:
-                messages.error(request, 'Doctor profile not found.')
-            elif profile.is_approved:
-                messages.info(request, 'Doctor already approved.')
-            else:
-                profile.is_approved = True
-                profile.save(update_fields=['is_approved'])
-                messages.success(request, 'Doctor approved successfully.')
-            return redirect('admin_dashboard')
-        if action == 'delete_doctor':
-            user_id = request.POST.get('user_id')
-            doctor = get_object_or_404(CustomUser, id=user_id, role='doctor')
-            doctor.delete()
-            messages.success(request, 'Doctor removed successfully.')
-            return redirect('admin_dashboard')
+ADMIN_SNAPSHOT = 'admin_dashboard'
+# Sections of the admin console in page order; only the overview and the
+# active section are rendered with the page, the rest load when opened
+ADMIN_SECTIONS = ['overview', 'manage-data', 'users', 'appointments', 'notifications', 'analytics']
+# Browser cache lifetime of each section fragment; fragment URLs carry the
+# snapshot version, so a cached copy never outlives an admin action
+ADMIN_SECTION_MAX_AGE = {
+    'overview': 30,
+    'manage-data': 60,
+    'users': 60,
+    'appointments': 30,
+    'notifications': 30,
+    'analytics': 300,
+}
+STATUS_PALETTE = {
+    'pending': '#F4B740',
+    'confirmed': '#4C6EF5',
+    'completed': '#0BA57A',
+    'cancelled': '#EF4444'
+}
 
-    # Build doctors queryset - COMPLETELY avoid filtering on related fields to prevent annotation conflicts
-    has_doctor_search = bool(doctor_search_query)
-    all_doctor_ids = None  # Initialize variable
-    if has_doctor_search:
-        active_section = 'manage-data'
-        manage_tab = 'doctors'
-        # Filter on user fields only, then filter profiles in Python to avoid annotation conflicts
-        doctors_qs_user_fields = CustomUser.objects.filter(role='doctor').filter(
-            Q(first_name__icontains=doctor_search_query) |
-            Q(last_name__icontains=doctor_search_query) |
-            Q(username__icontains=doctor_search_query) |
-            Q(email__icontains=doctor_search_query) |
-            Q(phone__icontains=doctor_search_query)
-        )
-        # Get IDs from user field search
-        doctor_ids_from_user_search = list(doctors_qs_user_fields.values_list('id', flat=True))
-        
-        # For related field searches, fetch separately and filter in Python
-        # Search in doctor profiles separately
-        matching_profiles = DoctorProfile.objects.filter(
-            Q(hospital_name__icontains=doctor_search_query) |
-            Q(specialization__icontains=doctor_search_query)
-        ).values_list('user_id', flat=True)
-        doctor_ids_from_profile_search = list(matching_profiles)
-        # Combine and deduplicate
-        all_doctor_ids = list(dict.fromkeys(doctor_ids_from_user_search + doctor_ids_from_profile_search))
-        
-        total_doctors_from_search = len(all_doctor_ids) if all_doctor_ids else 0
-    
-    # Build patients queryset - COMPLETELY avoid filtering on related fields to prevent annotation conflicts
-    has_patient_search = bool(patient_search_query)
-    all_patient_ids = None  # Initialize variable
-    if has_patient_search:
-        active_section = 'users'
-        users_tab = 'patients'
-        # Filter on user fields only, then filter profiles in Python to avoid annotation conflicts
-        patients_qs_user_fields = CustomUser.objects.filter(role='patient').filter(
-            Q(first_name__icontains=patient_search_query) |
-            Q(last_name__icontains=patient_search_query) |
-            Q(username__icontains=patient_search_query) |
-            Q(email__icontains=patient_search_query) |
-            Q(phone__icontains=patient_search_query)
-        )
-        # Get IDs from user field search
-        patient_ids_from_user_search = list(patients_qs_user_fields.values_list('id', flat=True))
-        
-        # For related field searches, fetch separately and filter in Python
-        # Search in patient profiles separately
-        from accounts.models import PatientProfile
-        matching_profiles = PatientProfile.objects.filter(
-            Q(medical_history__icontains=patient_search_query)
-        ).values_list('user_id', flat=True)
-        patient_ids_from_profile_search = list(matching_profiles)
-        # Combine and deduplicate
-        all_patient_ids = list(dict.fromkeys(patient_ids_from_user_search + patient_ids_from_profile_search))
-        
-        total_patients_from_search = len(all_patient_ids) if all_patient_ids else 0
-    
-    admin_qs = CustomUser.objects.filter(role='admin')
-    total_users = CustomUser.objects.count()
-    
-    # Get counts using separate queries to avoid annotation conflicts
-    # When distinct() is used with related field filters, don't use select_related
-    if has_doctor_search:
-        # Use the pre-evaluated count to avoid annotation conflicts
-        total_doctors = total_doctors_from_search
-    else:
-        total_doctors = CustomUser.objects.filter(role='doctor').count()
-    
-    if has_patient_search:
-        # Use the pre-evaluated count to avoid annotation conflicts
-        total_patients = total_patients_from_search
-    else:
-        total_patients = CustomUser.objects.filter(role='patient').count()
-    approved_doctors = DoctorProfile.objects.filter(is_approved=True).count()
-    pending_doctors = DoctorProfile.objects.filter(is_approved=False).count()
-    # Get active_patients count safely to avoid annotation conflicts
-    if has_patient_search:
-        # Count active patients from the pre-evaluated list more efficiently
-        if all_patient_ids:
-            active_patients = CustomUser.objects.filter(id__in=all_patient_ids, is_active=True).count()
-        else:
-            active_patients = 0
-    else:
-        active_patients = CustomUser.objects.filter(role='patient', is_active=True).count()
+def _initials(user):
+    full_name = user.get_full_name()
+    initials = ''.join([part[0] for part in full_name.split() if part]) if full_name else (user.username[:1] if user.username else '')
+    return initials.upper() or '?'
 
-    today = timezone.now().date()
-    month_start = today.replace(day=1)
-    upcoming_appointments = Appointment.objects.filter(appointment_date__gte=today).count()
-    pending_appointments = Appointment.objects.filter(status='pending').count()
-    total_appointments = Appointment.objects.count()
-    completed_appointments = Appointment.objects.filter(status='completed').count()
-    completed_this_month = Appointment.objects.filter(
-        status='completed',
-        appointment_date__gte=month_start,
-        appointment_date__lte=today
-    ).count()
-
-    status_counts = Appointment.objects.values('status').annotate(total=Count('id'))
-    status_totals = {item['status']: item['total'] for item in status_counts}
-    status_summary = [
-        {
-            'value': value,
-            'label': label,
-            'count': status_totals.get(value, 0)
-        }
-        for value, label in Appointment.STATUS_CHOICES
-    ]
-    status_palette = {
-        'pending': '#F4B740',
-        'confirmed': '#4C6EF5',
-        'completed': '#0BA57A',
-        'cancelled': '#EF4444'
-    }
-    chart_max = max([item['count'] for item in status_summary], default=0)
-    chart_data = [
-        {
-            'value': item['value'],
-            'label': item['label'],
-            'count': item['count'],
-            'height': int((item['count'] / chart_max) * 100) if chart_max else 0,
-            'color': status_palette.get(item['value'], '#1B3A4B')
-        }
-        for item in status_summary
-    ]
-    has_chart_data = any(item['count'] for item in chart_data)
+def _percentage(part, whole):
+    return int((part / whole) * 100) if whole else 0
+
+def _doctor_rows(doctors_list):
+    # Only the totals are shown per row; the records drawer loads from admin_doctor_records
+    doctor_records_total = consultation_totals([doctor.id for doctor in doctors_list]) if doctors_list else {}
+    doctor_rows = []
+    for doctor in doctors_list:
+        profile = getattr(doctor, 'doctor_profile', None)
+        doctor_rows.append({
+            'id': doctor.id,
+            'name': doctor.get_full_name() or doctor.username or 'Unknown Doctor',
+            'specialization': profile.get_specialization_display() if profile else 'Not specified',
+            'hospital': profile.hospital_name if profile and profile.hospital_name else 'Not provided',
+            'email': doctor.email or 'Not provided',
+            'phone': doctor.phone or 'Not provided',
+            'status': 'Approved' if profile and profile.is_approved else 'Pending',
+            'status_class': 'approved' if profile and profile.is_approved else 'pending',
+            'records_total': doctor_records_total.get(doctor.id, 0),
+            'initials': _initials(doctor),
+            'can_approve': not (profile and profile.is_approved)
+        })
+    return doctor_rows
 
+def _patient_rows(patients_list):
+    patient_rows = []
+    for patient in patients_list:
+        profile = getattr(patient, 'patient_profile', None)
+        patient_rows.append({
+            'id': patient.id,
+            'name': patient.get_full_name() or patient.username or 'Unknown Patient',
+            'email': patient.email or 'Not provided',
+            'phone': patient.phone or 'Not provided',
+            'dob': profile.date_of_birth if profile and profile.date_of_birth else None,
+            'joined': patient.date_joined,
+            'status': 'Active' if patient.is_active else 'Inactive',
+            'status_class': 'active' if patient.is_active else 'inactive',
+            'initials': _initials(patient)
+        })
+    return patient_rows
+
+def _hospital_rows():
+    """Hospitals named on doctor profiles, grouped case-insensitively, and the number of linked doctors"""
     hospital_profiles = list(
         DoctorProfile.objects.select_related('user')
         .exclude(hospital_name__isnull=True)
@@ -365,188 +229,173 @@ def admin_dashboard(request):
         if profile.user.email:
             entry['emails'].add(profile.user.email)
 
-    hospital_list_full = []
+    hospital_rows = []
     for key in hospital_order:
         entry = hospital_map[key]
-        hospital_list_full.append({
+        hospital_rows.append({
             'name': entry['name'],
             'count': entry['doctors'],
             'contact': ', '.join(sorted(entry['emails'])) if entry['emails'] else 'Not provided'
         })
-    total_hospitals = len(hospital_list_full)
-    hospital_list = hospital_list_full[:5]
-    doctors_with_hospital = len(hospital_profiles)
-
-    # Get doctor IDs explicitly to avoid annotation conflicts
-    # Create a fresh queryset without prefetch_related for values_list
-    doctor_ids = list(CustomUser.objects.filter(role='doctor').values_list('id', flat=True))
-    doctor_records_map = defaultdict(list)
-    doctor_records_total = defaultdict(int)
-    if doctor_ids:
-        current_time = timezone.localtime().time()
-        doctor_appointments = Appointment.objects.filter(doctor_id__in=doctor_ids).filter(
-            Q(appointment_date__lt=today) |
-            Q(appointment_date=today, appointment_time__lte=current_time)
-        ).select_related('patient').order_by('-appointment_date', '-appointment_time')
-        for appointment in doctor_appointments:
-            doctor_records_total[appointment.doctor_id] += 1
-            if len(doctor_records_map[appointment.doctor_id]) < 5:
-                doctor_records_map[appointment.doctor_id].append({
-                    'patient': appointment.patient.get_full_name() or appointment.patient.username,
-                    'date': appointment.appointment_date.strftime('%Y-%m-%d'),
-                    'time': appointment.appointment_time.strftime('%H:%M'),
-                    'status': appointment.get_status_display()
-                })
+    return hospital_rows, len(hospital_profiles)
 
-    doctor_rows = []
-    # CRITICAL: Fetch doctors and profiles separately to avoid annotation conflicts
-    if has_doctor_search:
-        # Use the pre-computed IDs to fetch doctors - this completely avoids annotation conflicts
-        if all_doctor_ids:
-            doctors_list = list(
-                CustomUser.objects.filter(id__in=all_doctor_ids)
-                .select_related('doctor_profile')
-                .order_by('-date_joined')
-            )
-        else:
-            doctors_list = []
-    else:
-        # When no search, we can safely use select_related
-        doctors_list = list(
+# Snapshot builders, one per section, so opening a section only computes its own data
+
+def _overview_snapshot():
+    today = timezone.now().date()
+    counters = get_platform_counters()
+    appointment_totals = stats.appointment_counts(today)
+    status_summary = [
+        {
+            'value': value,
+            'label': label,
+            'count': getattr(counters, f'appointments_{value}')
+        }
+        for value, label in Appointment.STATUS_CHOICES
+    ]
+    chart_max = max([item['count'] for item in status_summary], default=0)
+    chart_data = [
+        {
+            'value': item['value'],
+            'label': item['label'],
+            'count': item['count'],
+            'height': int((item['count'] / chart_max) * 100) if chart_max else 0,
+            'color': STATUS_PALETTE.get(item['value'], '#1B3A4B')
+        }
+        for item in status_summary
+    ]
+    hospital_rows, doctors_with_hospital = _hospital_rows()
+    return {
+        'users': stats.user_counts(),
+        'appointment_totals': {
+            'total': counters.appointments_total,
+            'pending': counters.appointments_pending,
+            'completed': counters.appointments_completed,
+            'upcoming': appointment_totals['upcoming'],
+            'completed_this_month': appointment_totals['completed_this_month'],
+        },
+        'status_summary': status_summary,
+        'chart_data': chart_data,
+        'has_chart_data': any(item['count'] for item in chart_data),
+        'hospital_list': hospital_rows[:5],
+        'total_hospitals': len(hospital_rows),
+        'doctors_with_hospital': doctors_with_hospital,
+    }
+
+def _manage_data_snapshot():
+    from accounts.models import CustomUser
+    hospital_rows, doctors_with_hospital = _hospital_rows()
+    return {
+        'users': stats.user_counts(),
+        'doctor_rows': _doctor_rows(list(
             CustomUser.objects.filter(role='doctor')
             .select_related('doctor_profile')
             .order_by('-date_joined')
-        )
-    for doctor in doctors_list:
-        profile = getattr(doctor, 'doctor_profile', None)
-        records = doctor_records_map.get(doctor.id, [])
-        if not isinstance(records, list):
-            records = []
-        full_name = doctor.get_full_name()
-        initials = ''.join([part[0] for part in full_name.split() if part]) if full_name else (doctor.username[:1] if doctor.username else '')
-        initials = initials.upper()
-        doctor_rows.append({
-            'id': doctor.id,
-            'name': full_name or doctor.username or 'Unknown Doctor',
-            'specialization': profile.get_specialization_display() if profile else 'Not specified',
-            'hospital': profile.hospital_name if profile and profile.hospital_name else 'Not provided',
-            'email': doctor.email or 'Not provided',
-            'phone': doctor.phone or 'Not provided',
-            'status': 'Approved' if profile and profile.is_approved else 'Pending',
-            'status_class': 'approved' if profile and profile.is_approved else 'pending',
-            'records_json': json.dumps(records),
-            'records_total': doctor_records_total.get(doctor.id, 0),
-            'initials': initials or '?',
-            'can_approve': not (profile and profile.is_approved)
-        })
-
-    patient_rows = []
-    # CRITICAL: Fetch patients and profiles separately to avoid annotation conflicts
-    if has_patient_search:
-        # Use the pre-computed IDs to fetch patients - this completely avoids annotation conflicts
-        if all_patient_ids:
-            patients_list = list(
-                CustomUser.objects.filter(id__in=all_patient_ids)
-                .select_related('patient_profile')
-                .order_by('-date_joined')
-            )
-        else:
-            patients_list = []
-    else:
-        # When no search, we can safely use select_related
-        patients_list = list(
-            CustomUser.objects.filter(role='patient')
-            .select_related('patient_profile')
-            .order_by('-date_joined')
-        )
-    for patient in patients_list:
-        profile = getattr(patient, 'patient_profile', None)
-        full_name = patient.get_full_name()
-        initials = ''.join([part[0] for part in full_name.split() if part]) if full_name else (patient.username[:1] if patient.username else '')
-        initials = initials.upper()
-        patient_rows.append({
-            'id': patient.id,
-            'name': full_name or patient.username or 'Unknown Patient',
-            'email': patient.email or 'Not provided',
-            'phone': patient.phone or 'Not provided',
-            'dob': profile.date_of_birth if profile and profile.date_of_birth else None,
-            'joined': patient.date_joined,
-            'status': 'Active' if patient.is_active else 'Inactive',
-            'status_class': 'active' if patient.is_active else 'inactive',
-            'initials': initials or '?'
-        })
+        )),
+        'hospital_rows': hospital_rows,
+        'doctors_with_hospital': doctors_with_hospital,
+    }
 
+def _users_snapshot():
+    from accounts.models import CustomUser
     admin_rows = []
-    for admin_user in admin_qs.order_by('first_name', 'last_name'):
-        full_name = admin_user.get_full_name()
-        initials = ''.join([part[0] for part in full_name.split() if part]) if full_name else (admin_user.username[:1] if admin_user.username else '')
-        initials = initials.upper()
+    for admin_user in CustomUser.objects.filter(role='admin').order_by('first_name', 'last_name'):
         admin_rows.append({
-            'name': full_name or admin_user.username or 'Unknown Admin',
+            'name': admin_user.get_full_name() or admin_user.username or 'Unknown Admin',
             'email': admin_user.email or 'Not provided',
             'phone': admin_user.phone or 'Not provided',
             'status': 'Active' if admin_user.is_active else 'Inactive',
             'status_class': 'active' if admin_user.is_active else 'inactive',
             'joined': admin_user.date_joined,
-            'initials': initials or '?'
+            'initials': _initials(admin_user)
         })
-
-    appointments_recent = list(
-        Appointment.objects.select_related('doctor', 'patient').order_by('-appointment_date', '-appointment_time')[:8]
-    )
-    appointments_pending_list = list(
-        Appointment.objects.filter(status='pending').select_related('doctor', 'patient').order_by('appointment_date', 'appointment_time')[:8]
-    )
-    appointments_upcoming_list = list(
-        Appointment.objects.filter(appointment_date__gte=today).select_related('doctor', 'patient').order_by('appointment_date', 'appointment_time')[:8]
-    )
-
-    notification_total = Notification.objects.count()
-    notification_unread = Notification.objects.filter(is_read=False).count()
-    notification_read = notification_total - notification_unread
-    notifications_recent = list(
-        Notification.objects.select_related('user').order_by('-created_at')[:10]
-    )
-
-    total_admins = admin_qs.count()
-
-    doctor_metrics = {
-        'total': total_doctors,
-        'approved': approved_doctors,
-        'pending': pending_doctors
-    }
-    hospital_metrics = {
-        'total': total_hospitals,
-        'with_doctors': doctors_with_hospital
+    return {
+        'users': stats.user_counts(),
+        'patient_rows': _patient_rows(list(
+            CustomUser.objects.filter(role='patient')
+            .select_related('patient_profile')
+            .order_by('-date_joined')
+        )),
+        'admin_rows': admin_rows,
     }
-    user_metrics = {
-        'patients_total': total_patients,
-        'patients_active': active_patients,
-        'patients_inactive': total_patients - active_patients,
-        'admins_total': total_admins
+
+def _appointments_snapshot():
+    today = timezone.now().date()
+    counters = get_platform_counters()
+    appointments = Appointment.objects.select_related('doctor', 'patient')
+    return {
+        'appointment_counts': {
+            'total': counters.appointments_total,
+            'pending': counters.appointments_pending,
+            'upcoming': stats.appointment_counts(today)['upcoming'],
+            'completed': counters.appointments_completed
+        },
+        'appointments_recent': list(appointments.order_by('-appointment_date', '-appointment_time')[:8]),
+        'appointments_pending_list': list(appointments.filter(status='pending').order_by('appointment_date', 'appointment_time')[:8]),
+        'appointments_upcoming_list': list(appointments.filter(appointment_date__gte=today).order_by('appointment_date', 'appointment_time')[:8]),
     }
-    appointment_counts = {
-        'total': total_appointments,
-        'pending': pending_appointments,
-        'upcoming': upcoming_appointments,
-        'completed': completed_appointments
+
+def _notifications_snapshot():
+    return {
+        'notification_metrics': stats.notification_counts(),
+        'notifications_recent': list(Notification.objects.select_related('user').order_by('-created_at')[:10]),
     }
-    notification_metrics = {
-        'total': notification_total,
-        'unread': notification_unread,
-        'read': notification_read
+
+def _analytics_snapshot():
+    today = timezone.now().date()
+    # Trend charts read the daily rollup kept by rollup_appointment_stats and
+    # the doctor table the counters maintained on DoctorProfile
+    return {
+        'monthly_appointments': monthly_appointment_stats(today),
+        'weekly_appointments': weekly_appointment_stats(today),
+        'doctor_performance': [
+            {
+                'doctor': profile,
+                'appointment_count': profile.total_appointments,
+                'completed_appointments': profile.completed_appointments
+            }
+            for profile in DoctorProfile.objects.filter(is_approved=True).select_related('user').order_by('-total_appointments')[:10]
+        ],
+        'prescription_templates': PrescriptionTemplate.objects.filter(is_active=True).count(),
     }
 
-    def percentage(part, whole):
-        return int((part / whole) * 100) if whole else 0
+ADMIN_SECTION_SNAPSHOTS = {
+    'overview': _overview_snapshot,
+    'manage-data': _manage_data_snapshot,
+    'users': _users_snapshot,
+    'appointments': _appointments_snapshot,
+    'notifications': _notifications_snapshot,
+    'analytics': _analytics_snapshot,
+}
+
+def _section_snapshot(section):
+    # Served from a shared snapshot that is refreshed in the background once
+    # it is older than DASHBOARD_SNAPSHOT_SOFT_TTL
+    return cached_snapshot(f'{ADMIN_SNAPSHOT}:{section}', ADMIN_SECTION_SNAPSHOTS[section])
+
+def invalidate_admin_dashboard():
+    """Make the next admin dashboard view rebuild every section snapshot"""
+    for section in ADMIN_SECTIONS:
+        invalidate_snapshot(f'{ADMIN_SNAPSHOT}:{section}')
+
+# Section contexts add what depends on the request, such as searches, to the snapshots
 
+def _overview_context(request):
+    snapshot = _section_snapshot('overview')
+    users = snapshot['users']
+    totals = snapshot['appointment_totals']
+    total_doctors = users['total_doctors']
+    total_patients = users['total_patients']
+    active_patients = users['active_patients']
+    approved_doctors = users['approved_doctors']
+    pending_doctors = users['pending_doctors']
     stat_cards = [
         {
             'label': 'Total Doctors',
             'count': total_doctors,
             'icon': 'bi-people-fill',
             'accent': '#0BA57A',
-            'progress': percentage(approved_doctors, total_doctors),
+            'progress': _percentage(approved_doctors, total_doctors),
             'hint': f'{approved_doctors} approved'
         },
         {
@@ -554,15 +403,15 @@ def admin_dashboard(request):
             'count': total_patients,
             'icon': 'bi-person-heart',
             'accent': '#36B37E',
-            'progress': percentage(active_patients, total_patients),
+            'progress': _percentage(active_patients, total_patients),
             'hint': f'{active_patients} active'
         },
         {
             'label': 'Hospitals on Platform',
-            'count': total_hospitals,
+            'count': snapshot['total_hospitals'],
             'icon': 'bi-building',
             'accent': '#4C6EF5',
-            'progress': percentage(doctors_with_hospital, total_doctors),
+            'progress': _percentage(snapshot['doctors_with_hospital'], total_doctors),
             'hint': 'Linked to doctor profiles'
         },
         {
@@ -570,121 +419,284 @@ def admin_dashboard(request):
             'count': pending_doctors,
             'icon': 'bi-person-check',
             'accent': '#F4B740',
-            'progress': percentage(pending_doctors, total_doctors),
+            'progress': _percentage(pending_doctors, total_doctors),
             'hint': 'Awaiting review'
         },
     ]
-
     overview_cards = [
         {
             'label': 'Upcoming appointments',
-            'value': upcoming_appointments,
+            'value': totals['upcoming'],
             'icon': 'bi-calendar-event',
             'accent': '#0BA57A',
             'description': 'Scheduled from today onwards'
         },
         {
             'label': 'Pending appointments',
-            'value': pending_appointments,
+            'value': totals['pending'],
             'icon': 'bi-hourglass-split',
             'accent': '#F59E0B',
             'description': 'Awaiting confirmation'
         },
         {
             'label': 'Completed this month',
-            'value': completed_this_month,
+            'value': totals['completed_this_month'],
             'icon': 'bi-check2-circle',
             'accent': '#4C6EF5',
             'description': 'Month to date'
         },
     ]
-
     appointment_overview = {
-        'total': total_appointments,
-        'completed': completed_appointments,
-        'completed_percent': percentage(completed_appointments, total_appointments),
-        'pending': pending_appointments,
-        'upcoming': upcoming_appointments,
+        'total': totals['total'],
+        'completed': totals['completed'],
+        'completed_percent': _percentage(totals['completed'], totals['total']),
+        'pending': totals['pending'],
+        'upcoming': totals['upcoming'],
+    }
+    return {
+        'stat_cards': stat_cards,
+        'overview_cards': overview_cards,
+        'appointment_overview': appointment_overview,
+        'hospital_headers': ['Hospital', 'Doctors', 'Primary Contact'],
+        'hospital_list': snapshot['hospital_list'],
+        'total_hospitals': snapshot['total_hospitals'],
+        'chart_data': snapshot['chart_data'],
+        'status_summary': snapshot['status_summary'],
+        'has_chart_data': snapshot['has_chart_data'],
+        'total_users': users['total_users'],
+        'pending_doctors': pending_doctors,
     }
 
-    # Analytics data for charts
-    from django.db.models.functions import TruncMonth
-    # Evaluate queryset immediately to avoid any lazy evaluation issues
-    monthly_appointments = list(
-        Appointment.objects.annotate(
-            month=TruncMonth('appointment_date')
-        ).values('month').annotate(
-            total=Count('id'),
-            completed=Count('id', filter=Q(status='completed')),
-            cancelled=Count('id', filter=Q(status='cancelled'))
-        ).order_by('month')[:12]
-    )
+def _manage_data_context(request):
+    from accounts.models import CustomUser
+    doctor_search_query = request.GET.get('doctor_search', '').strip()
+    snapshot = _section_snapshot('manage-data')
+    users = snapshot['users']
+    doctor_rows = snapshot['doctor_rows']
+    total_doctors = users['total_doctors']
+    # Build doctors queryset - COMPLETELY avoid filtering on related fields to prevent annotation conflicts
+    if doctor_search_query:
+        # Filter on user fields only, then filter profiles in Python to avoid annotation conflicts
+        doctors_qs_user_fields = CustomUser.objects.filter(role='doctor').filter(
+            Q(first_name__icontains=doctor_search_query) |
+            Q(last_name__icontains=doctor_search_query) |
+            Q(username__icontains=doctor_search_query) |
+            Q(email__icontains=doctor_search_query) |
+            Q(phone__icontains=doctor_search_query)
+        )
+        # Get IDs from user field search
+        doctor_ids_from_user_search = list(doctors_qs_user_fields.values_list('id', flat=True))
+        
+        # For related field searches, fetch separately and filter in Python
+        # Search in doctor profiles separately
+        matching_profiles = DoctorProfile.objects.filter(
+            Q(hospital_name__icontains=doctor_search_query) |
+            Q(specialization__icontains=doctor_search_query)
+        ).values_list('user_id', flat=True)
+        doctor_ids_from_profile_search = list(matching_profiles)
+        # Combine and deduplicate
+        all_doctor_ids = list(dict.fromkeys(doctor_ids_from_user_search + doctor_ids_from_profile_search))
+        # Use the pre-computed IDs to fetch doctors - this completely avoids annotation conflicts
+        doctor_rows = _doctor_rows(list(
+            CustomUser.objects.filter(id__in=all_doctor_ids)
+            .select_related('doctor_profile')
+            .order_by('-date_joined')
+        ) if all_doctor_ids else [])
+        # Searches narrow the doctor total to the matches
+        total_doctors = len(all_doctor_ids)
+    return {
+        'doctor_rows': doctor_rows,
+        'hospital_rows': snapshot['hospital_rows'],
+        'doctor_metrics': {
+            'total': total_doctors,
+            'approved': users['approved_doctors'],
+            'pending': users['pending_doctors']
+        },
+        'hospital_metrics': {
+            'total': len(snapshot['hospital_rows']),
+            'with_doctors': snapshot['doctors_with_hospital']
+        },
+        'doctor_search_query': doctor_search_query,
+        'patient_search_query': request.GET.get('patient_search', '').strip(),
+        'manage_tab': 'doctors',
+    }
 
-    doctor_performance = []
-    # Efficiently fetch doctor performance data using annotations
-    # Note: Cannot use 'total_appointments' as annotation name since it's a field on DoctorProfile
-    doctors_with_performance = DoctorProfile.objects.filter(is_approved=True).select_related('user').annotate(
-        appt_count=Count('user__doctor_appointments'),
-        completed_appts=Count('user__doctor_appointments', filter=Q(user__doctor_appointments__status='completed'))
-    ).order_by('-appt_count')[:10]
-
-    for doctor in doctors_with_performance:
-        doctor_performance.append({
-            'doctor': doctor,
-            'appointment_count': doctor.appt_count,
-            'completed_appointments': doctor.completed_appts
-        })
+def _users_context(request):
+    from accounts.models import CustomUser, PatientProfile
+    patient_search_query = request.GET.get('patient_search', '').strip()
+    snapshot = _section_snapshot('users')
+    users = snapshot['users']
+    patient_rows = snapshot['patient_rows']
+    total_patients = users['total_patients']
+    active_patients = users['active_patients']
+    # Build patients queryset - COMPLETELY avoid filtering on related fields to prevent annotation conflicts
+    if patient_search_query:
+        # Filter on user fields only, then filter profiles in Python to avoid annotation conflicts
+        patients_qs_user_fields = CustomUser.objects.filter(role='patient').filter(
+            Q(first_name__icontains=patient_search_query) |
+            Q(last_name__icontains=patient_search_query) |
+            Q(username__icontains=patient_search_query) |
+            Q(email__icontains=patient_search_query) |
+            Q(phone__icontains=patient_search_query)
+        )
+        # Get IDs from user field search
+        patient_ids_from_user_search = list(patients_qs_user_fields.values_list('id', flat=True))
+        
+        # For related field searches, fetch separately and filter in Python
+        # Search in patient profiles separately
+        matching_profiles = PatientProfile.objects.filter(
+            Q(medical_history__icontains=patient_search_query)
+        ).values_list('user_id', flat=True)
+        patient_ids_from_profile_search = list(matching_profiles)
+        # Combine and deduplicate
+        all_patient_ids = list(dict.fromkeys(patient_ids_from_user_search + patient_ids_from_profile_search))
+        # Use the pre-computed IDs to fetch patients - this completely avoids annotation conflicts
+        patients_list = list(
+            CustomUser.objects.filter(id__in=all_patient_ids)
+            .select_related('patient_profile')
+            .order_by('-date_joined')
+        ) if all_patient_ids else []
+        patient_rows = _patient_rows(patients_list)
+        # Searches narrow the patient totals to the matches
+        total_patients = len(all_patient_ids)
+        active_patients = sum(1 for patient in patients_list if patient.is_active)
+    return {
+        'patient_rows': patient_rows,
+        'admin_rows': snapshot['admin_rows'],
+        'user_metrics': {
+            'patients_total': total_patients,
+            'patients_active': active_patients,
+            'patients_inactive': total_patients - active_patients,
+            'admins_total': users['total_admins']
+        },
+        'doctor_search_query': request.GET.get('doctor_search', '').strip(),
+        'patient_search_query': patient_search_query,
+        'users_tab': 'patients',
+    }
+
+def _snapshot_context(section):
+    def context(request):
+        return _section_snapshot(section)
+    return context
 
-    # Prescription templates count
-    prescription_templates = PrescriptionTemplate.objects.filter(is_active=True).count()
+ADMIN_SECTION_CONTEXTS = {
+    'overview': _overview_context,
+    'manage-data': _manage_data_context,
+    'users': _users_context,
+    'appointments': _snapshot_context('appointments'),
+    'notifications': _snapshot_context('notifications'),
+    'analytics': _snapshot_context('analytics'),
+}
 
+def _section_template(section):
+    return f"dashboard/admin_sections/{section.replace('-', '_')}.html"
+
+@login_required(login_url='login')
+def admin_dashboard(request):
+    """Admin dashboard"""
+    if request.user.role != 'admin':
+        return redirect('dashboard')
+    from accounts.models import CustomUser
+    if request.method == 'POST':
+        action = request.POST.get('action')
+        if action == 'mark_all_notifications_read':
+            Notification.objects.filter(is_read=False).update(is_read=True)
+            invalidate_admin_dashboard()
+            messages.success(request, 'All notifications marked as read.')
+            return redirect('admin_dashboard')
+        if action == 'delete_patient':
+            user_id = request.POST.get('user_id')
+            patient = get_object_or_404(CustomUser, id=user_id, role='patient')
+            patient.delete()
+            invalidate_admin_dashboard()
+            messages.success(request, 'Patient removed successfully.')
+            return redirect('admin_dashboard')
+        if action == 'approve_doctor':
+            user_id = request.POST.get('user_id')
+            doctor = get_object_or_404(CustomUser, id=user_id, role='doctor')
+            profile = getattr(doctor, 'doctor_profile', None)
+            if not profile:
+                messages.error(request, 'Doctor profile not found.')
+            elif profile.is_approved:
+                messages.info(request, 'Doctor already approved.')
+            else:
+                profile.is_approved = True
+                profile.save(update_fields=['is_approved'])
+                invalidate_admin_dashboard()
+                messages.success(request, 'Doctor approved successfully.')
+            return redirect('admin_dashboard')
+        if action == 'delete_doctor':
+            user_id = request.POST.get('user_id')
+            doctor = get_object_or_404(CustomUser, id=user_id, role='doctor')
+            doctor.delete()
+            invalidate_admin_dashboard()
+            messages.success(request, 'Doctor removed successfully.')
+            return redirect('admin_dashboard')
+
+    active_section = 'overview'
+    if request.GET.get('doctor_search', '').strip():
+        active_section = 'manage-data'
+    if request.GET.get('patient_search', '').strip():
+        active_section = 'users'
+    focus = request.GET.get('focus', '').strip()
+    if focus in ADMIN_SECTIONS:
+        active_section = focus
+
+    # The page carries the overview and the section being shown; the other
+    # sections are fetched from admin_dashboard_section when first opened
+    context = _overview_context(request)
+    if active_section != 'overview':
+        context.update(ADMIN_SECTION_CONTEXTS[active_section](request))
+    context['admin_sections'] = [
+        {
+            'id': section,
+            'template': _section_template(section),
+            'loaded': section in ('overview', active_section),
+            'url': f"{reverse('admin_dashboard_section', args=[section])}?v={snapshot_version(f'{ADMIN_SNAPSHOT}:{section}')}",
+        }
+        for section in ADMIN_SECTIONS
+    ]
+
+    upcoming_appointments = context['appointment_overview']['upcoming']
     user_name = request.user.get_full_name() or request.user.username
-    user_summary = {
+    context['user_summary'] = {
         'name': user_name,
         'role': request.user.get_role_display(),
         'status_text': f'{upcoming_appointments} upcoming appointments' if upcoming_appointments else 'No upcoming appointments scheduled',
-        'notifications': request.user.notifications.filter(is_read=False).count(),
-        'pending_doctors': pending_doctors,
+        'notifications': Notification.objects.filter(user=request.user, is_read=False).count(),
+        'pending_doctors': context['pending_doctors'],
         'initials': ''.join([part[0] for part in user_name.split()[:2]]).upper()
     }
-
-    context = {
-        'stat_cards': stat_cards,
-        'hospital_headers': ['Hospital', 'Doctors', 'Primary Contact'],
-        'hospital_list': hospital_list,
-        'total_hospitals': total_hospitals,
-        'chart_data': chart_data,
-        'status_summary': status_summary,
-        'appointment_overview': appointment_overview,
-        'overview_cards': overview_cards,
-        'user_summary': user_summary,
-        'total_users': total_users,
-        'pending_doctors': pending_doctors,
-        'has_chart_data': has_chart_data,
-        'doctor_rows': doctor_rows,
-        'hospital_rows': hospital_list_full,
-        'doctor_metrics': doctor_metrics,
-        'hospital_metrics': hospital_metrics,
-        'patient_rows': patient_rows,
-        'admin_rows': admin_rows,
-        'user_metrics': user_metrics,
-        'appointments_recent': appointments_recent,
-        'appointments_pending_list': appointments_pending_list,
-        'appointments_upcoming_list': appointments_upcoming_list,
-        'appointment_counts': appointment_counts,
-        'notifications_recent': notifications_recent,
-        'notification_metrics': notification_metrics,
-        'doctor_search_query': doctor_search_query,
-        'patient_search_query': patient_search_query,
-        'active_section': focus or active_section,
-        'manage_tab': manage_tab,
-        'users_tab': users_tab,
-        'monthly_appointments': monthly_appointments,
-        'doctor_performance': doctor_performance,
-        'prescription_templates': prescription_templates,
-    }
+    context['active_section'] = active_section
     return render(request, 'dashboard/admin_dashboard.html', context)
 
+@login_required(login_url='login')
+@require_GET
+def admin_dashboard_section(request, section):
+    """HTML fragment of one admin dashboard section, fetched when its tab is opened"""
+    if request.user.role != 'admin':
+        return JsonResponse({'status': 'error', 'message': 'Permission denied.'}, status=403)
+    if section not in ADMIN_SECTIONS:
+        raise Http404('Unknown dashboard section.')
+    response = render(request, _section_template(section), ADMIN_SECTION_CONTEXTS[section](request))
+    patch_cache_control(response, private=True, max_age=ADMIN_SECTION_MAX_AGE[section])
+    return response
+
+@login_required(login_url='login')
+@require_GET
+def admin_doctor_records(request, doctor_id):
+    """JSON list of a doctor's latest past appointments for the admin records drawer"""
+    if request.user.role != 'admin':
+        return JsonResponse({'status': 'error', 'message': 'Permission denied.'}, status=403)
+    from accounts.models import CustomUser
+    doctor = get_object_or_404(CustomUser, id=doctor_id, role='doctor')
+    return JsonResponse({
+        'status': 'success',
+        'name': doctor.get_full_name() or doctor.username,
+        'total': consultation_totals([doctor.id]).get(doctor.id, 0),
+        'records': latest_consultations([doctor.id]).get(doctor.id, []),
+    })
+
 @login_required(login_url='login')
 @require_POST
 def admin_update_appointment_status(request, appointment_id):
@@ -721,5 +733,6 @@ def admin_update_appointment_status(request, appointment_id):
             description=f'Appointment with {appointment.patient.get_full_name()} on {appointment.appointment_date} is now {status}.',
             related_appointment=appointment
         )
+    invalidate_admin_dashboard()
     messages.success(request, 'Appointment status updated successfully.')
     return redirect('admin_dashboard')
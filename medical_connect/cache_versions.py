@@ -0,0 +1,20 @@
+import time
+from django.core.cache import cache
+
+
+def get_cache_version(key):
+    """Current value of a version counter stored under key, creating it when missing"""
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so a lost counter never revives older entries
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_cache_version(key):
+    """Move a version counter on, so every entry keyed by the old value is retired"""
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), None)
@@ -0,0 +1,114 @@
+import math
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'30/m' -> (30, 60): tokens per period in seconds"""
+    count, _, period = rate.partition('/')
+    return int(count), PERIODS[period[:1].lower() or 's']
+
+
+class TokenBucket:
+    """Token bucket kept in the configured cache as (tokens, updated_at).
+
+    Reads and writes are not atomic across workers, so a burst racing the
+    same key can slip a few extra requests through; that is acceptable for
+    abuse protection and keeps each check to one cache round trip per key.
+    """
+
+    def __init__(self, key, rate, burst=None):
+        self.key = key
+        count, self.period = parse_rate(rate)
+        self.capacity = burst or count
+        self.refill_rate = count / self.period
+
+    def available(self, state, now):
+        tokens, updated_at = state if state else (self.capacity, now)
+        return min(self.capacity, tokens + (now - updated_at) * self.refill_rate)
+
+    def retry_after(self, tokens):
+        return math.ceil((1 - tokens) / self.refill_rate)
+
+
+def client_ip(request):
+    """Address of the client as seen by the outermost trusted proxy.
+
+    Each of the RATELIMIT_TRUSTED_PROXY_COUNT proxies appends the address
+    it received the request from to X-Forwarded-For, so the entry that
+    many hops from the right is the client; anything further left is
+    whatever the client chose to send.
+    """
+    proxies = getattr(settings, 'RATELIMIT_TRUSTED_PROXY_COUNT', 0)
+    if proxies > 0:
+        forwarded = [entry.strip() for entry in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if entry.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR', '')
+
+
+def _wants_json(request):
+    return request.content_type == 'application/json' or 'application/json' in request.headers.get('Accept', '')
+
+
+def too_many_requests(request, retry_after):
+    message = 'Too many requests. Please wait a moment and try again.'
+    if _wants_json(request):
+        response = JsonResponse({'status': 'error', 'message': message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type='text/plain')
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limit(scope, ip=None, user=None, anonymous=None, burst=None, methods=('POST',), user_field=None):
+    """Throttle a view with token buckets per client IP and per user.
+
+    ``ip`` and ``user`` are rates such as '20/m'; ``anonymous`` replaces the
+    IP rate for visitors who are not signed in. Anonymous requests are
+    bucketed by the value of ``user_field`` in the POST data when given
+    (e.g. the username on login forms), so one account cannot be
+    hammered from many addresses. Limited requests get a 429 before the
+    view runs.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped(request, *args, **kwargs):
+            if not getattr(settings, 'RATELIMIT_ENABLED', True) or request.method not in methods:
+                return view_func(request, *args, **kwargs)
+            buckets = []
+            ip_rate = anonymous if anonymous and not request.user.is_authenticated else ip
+            if ip_rate:
+                buckets.append(TokenBucket(f'ratelimit:{scope}:ip:{client_ip(request)}', ip_rate, burst))
+            if user:
+                if request.user.is_authenticated:
+                    identity = f'id:{request.user.pk}'
+                elif user_field and request.POST.get(user_field):
+                    identity = f'name:{request.POST[user_field].strip().lower()[:150]}'
+                else:
+                    identity = None
+                if identity:
+                    buckets.append(TokenBucket(f'ratelimit:{scope}:user:{identity}', user, burst))
+            if not buckets:
+                return view_func(request, *args, **kwargs)
+            now = time.time()
+            states = cache.get_many([bucket.key for bucket in buckets])
+            tokens = {bucket.key: bucket.available(states.get(bucket.key), now) for bucket in buckets}
+            retry_after = max(
+                (bucket.retry_after(tokens[bucket.key]) for bucket in buckets if tokens[bucket.key] < 1),
+                default=0
+            )
+            if not retry_after:
+                # Only spend tokens when every bucket admits the request
+                tokens = {key: value - 1 for key, value in tokens.items()}
+            cache.set_many({key: (value, now) for key, value in tokens.items()}, max(bucket.period for bucket in buckets))
+            if retry_after:
+                return too_many_requests(request, retry_after)
+            return view_func(request, *args, **kwargs)
+        return wrapped
+    return decorator
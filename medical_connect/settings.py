@@ -99,6 +99,29 @@ else:
     }
 
 
+# Cache
+# Slot suggestions, dashboard snapshots, availability calendars and rate-limit
+# buckets are invalidated by whichever worker made the change, so every worker
+# must read the same cache. REDIS_URL selects Redis (install the redis package);
+# production otherwise uses the database cache table made by `createcachetable`
+# in the release step. Development keeps the per-process default.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+elif config('ENV', default='development') == 'production':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'django_cache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -152,6 +175,25 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'dashboard'
 
+# Appointments
+# Number of days ahead kept in the open-slot index (see refresh_open_slots)
+OPEN_SLOT_HORIZON_DAYS = config('OPEN_SLOT_HORIZON_DAYS', default=30, cast=int)
+# How long slots suggested by the booking assistant stay reserved for the patient
+SLOT_HOLD_SECONDS = config('SLOT_HOLD_SECONDS', default=300, cast=int)
+
+# Dashboards
+# Seconds before the admin dashboard snapshot is recomputed in the background (stale copies are served meanwhile)
+DASHBOARD_SNAPSHOT_SOFT_TTL = config('DASHBOARD_SNAPSHOT_SOFT_TTL', default=60, cast=int)
+
+# Rate limiting (token buckets in the default cache, shared across workers; see Cache above)
+RATELIMIT_ENABLED = config('RATELIMIT_ENABLED', default=True, cast=bool)
+# Reverse proxies in front of the app that append to X-Forwarded-For (Render has one); 0 uses REMOTE_ADDR
+RATELIMIT_TRUSTED_PROXY_COUNT = config(
+    'RATELIMIT_TRUSTED_PROXY_COUNT',
+    default=1 if config('ENV', default='development') == 'production' else 0,
+    cast=int
+)
+
 # Email Configuration
 if config('ENV', default='development') == 'production':
     EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
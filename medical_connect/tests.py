@@ -0,0 +1,62 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from .cache_versions import bump_cache_version, get_cache_version
+from .ratelimit import client_ip, rate_limit
+
+
+@rate_limit('test', ip='1/m')
+def limited_view(request):
+    return HttpResponse('ok')
+
+
+class ClientIpTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+
+    def request(self, forwarded=None):
+        extra = {'REMOTE_ADDR': '10.0.0.1'}
+        if forwarded is not None:
+            extra['HTTP_X_FORWARDED_FOR'] = forwarded
+        request = self.factory.post('/', **extra)
+        request.user = AnonymousUser()
+        return request
+
+    @override_settings(RATELIMIT_TRUSTED_PROXY_COUNT=0)
+    def test_without_proxies_the_header_is_ignored(self):
+        self.assertEqual(client_ip(self.request('203.0.113.9')), '10.0.0.1')
+
+    @override_settings(RATELIMIT_TRUSTED_PROXY_COUNT=1)
+    def test_spoofed_entries_left_of_the_proxy_are_ignored(self):
+        self.assertEqual(client_ip(self.request('198.51.100.7')), '198.51.100.7')
+        self.assertEqual(client_ip(self.request('1.2.3.4, 198.51.100.7')), '198.51.100.7')
+        self.assertEqual(client_ip(self.request()), '10.0.0.1')
+
+    @override_settings(RATELIMIT_TRUSTED_PROXY_COUNT=2)
+    def test_entry_is_taken_as_many_hops_from_the_right_as_there_are_proxies(self):
+        self.assertEqual(client_ip(self.request('1.2.3.4, 198.51.100.7, 172.16.0.2')), '198.51.100.7')
+        self.assertEqual(client_ip(self.request('198.51.100.7')), '10.0.0.1')
+
+    @override_settings(RATELIMIT_TRUSTED_PROXY_COUNT=1, RATELIMIT_ENABLED=True)
+    def test_clients_behind_the_proxy_get_their_own_buckets(self):
+        self.assertEqual(limited_view(self.request('198.51.100.7')).status_code, 200)
+        self.assertEqual(limited_view(self.request('198.51.100.8')).status_code, 200)
+        self.assertEqual(limited_view(self.request('9.9.9.9, 198.51.100.7')).status_code, 429)
+
+
+class CacheVersionTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bump_and_lost_counter_never_reuse_a_version(self):
+        first = get_cache_version('test_version')
+        self.assertEqual(get_cache_version('test_version'), first)
+        bump_cache_version('test_version')
+        bumped = get_cache_version('test_version')
+        self.assertGreater(bumped, first)
+        cache.delete('test_version')
+        self.assertGreater(get_cache_version('test_version'), bumped)
@@ -10,7 +10,7 @@ from datetime import datetime, timedelta
 import requests
 from .models import Conversation, Message, Notification
 from .forms import MessageForm
-from appointments.models import Appointment, AvailabilitySlot
+from appointments.suggestions import doctor_scope, suggested_open_slots
 
 def generate_llm_reply(prompt):
     try:
@@ -68,60 +68,23 @@ def conversation_detail(request, conversation_id):
     partner_initials = build_initials(partner_name)
     booking_url = reverse('book_appointment', args=[doctor.id]) if is_patient_view else None
     def build_slot_suggestions(prefill_as_patient):
-        slot_qs = AvailabilitySlot.objects.filter(doctor=doctor, is_active=True).order_by('day_of_week', 'start_time')
-        slot_list = list(slot_qs)
-        if not slot_list:
-            return []
-        now_local = timezone.localtime()
-        start_date = now_local.date()
+        start_date = timezone.localdate()
         window_days = 7
         max_items = 5
         end_date = start_date + timedelta(days=window_days - 1)
-        existing_qs = Appointment.objects.filter(
-            doctor=doctor,
-            appointment_date__gte=start_date,
-            appointment_date__lte=end_date,
-            status__in=['pending', 'confirmed']
-        ).values('appointment_date', 'appointment_time')
-        taken_map = {}
-        for item in existing_qs:
-            date_key = item['appointment_date']
-            time_value = item['appointment_time']
-            taken_map.setdefault(date_key, set()).add(time_value)
-        slots_by_day = {}
-        for slot in slot_list:
-            slots_by_day.setdefault(slot.day_of_week, []).append(slot)
+        open_slots = suggested_open_slots(doctor_scope(doctor.id), [doctor.id], start_date, end_date, max_items, request.user)
         suggestions = []
-        for offset in range(window_days):
-            target_date = start_date + timedelta(days=offset)
-            day_slots = slots_by_day.get(target_date.weekday(), [])
-            if not day_slots:
-                continue
-            taken = taken_map.get(target_date, set())
-            for slot in day_slots:
-                duration = slot.slot_duration if slot.slot_duration and slot.slot_duration > 0 else 30
-                cursor = datetime.combine(target_date, slot.start_time)
-                slot_end = datetime.combine(target_date, slot.end_time)
-                while cursor < slot_end:
-                    end_cursor = cursor + timedelta(minutes=duration)
-                    if end_cursor > slot_end:
-                        break
-                    if offset == 0 and cursor.time() <= now_local.time():
-                        cursor = end_cursor
-                        continue
-                    if cursor.time() not in taken:
-                        label = cursor.strftime('%a, %b %d • %I:%M %p')
-                        if prefill_as_patient:
-                            message_text = f"I would like to book an appointment on {cursor.strftime('%A, %B %d at %I:%M %p')} with you. Waiting for confirmation."
-                        else:
-                            message_text = f"I can offer {cursor.strftime('%A, %B %d at %I:%M %p')} for your visit."
-                        suggestions.append({
-                            'label': label,
-                            'message': message_text,
-                        })
-                        if len(suggestions) >= max_items:
-                            return suggestions
-                    cursor = end_cursor
+        for open_slot in open_slots:
+            cursor = datetime.combine(open_slot.date, open_slot.start_time)
+            label = cursor.strftime('%a, %b %d • %I:%M %p')
+            if prefill_as_patient:
+                message_text = f"I would like to book an appointment on {cursor.strftime('%A, %B %d at %I:%M %p')} with you. Waiting for confirmation."
+            else:
+                message_text = f"I can offer {cursor.strftime('%A, %B %d at %I:%M %p')} for your visit."
+            suggestions.append({
+                'label': label,
+                'message': message_text,
+            })
         return suggestions
     appointment_suggestions = build_slot_suggestions(is_patient_view)
     assistant_topics = [